@@ -0,0 +1,12 @@
+"""Benchmarks for the generation and remix pipelines.
+
+Everything here runs against replayed LLM fixtures (`pipeline/replay.py`), so
+no network access or API credit is needed. Run from `modal_functions/`:
+
+    python -m benchmarks.e2e --help
+
+`fixtures/` holds one hand-written response per stage (a two-object projectile
+scene, plus remix edits of `src/simulations/tossBall.json`). They are matched by
+stage signature, so any prompt replays through the whole pipeline. Record real
+ones with `PIPELINE_LLM_MODE=record` when you need production-shaped payloads.
+"""
@@ -0,0 +1,408 @@
+"""End-to-end pipeline benchmark against the replayed LLM backend.
+
+Drives the pipelines at a fixed concurrency and reports, per target:
+
+- end-to-end latency p50/p95/p99 (and time to first SSE event),
+- a critical-path breakdown per stage, derived from the progress events
+  (stages whose `started` events arrive back-to-back ran in parallel; the one
+  that finished last is on the critical path),
+- CPU time spent in our own code, from the `pipeline.metrics` sections
+  (prompt_build, json_loads, extract_json, parse, assemble, validate, json_dumps),
+- everything as JSON via `--out` for regression tracking.
+
+Targets:
+    sim          run_sim_pipeline_sse (with stage breakdown)
+    sim-call     run_sim_pipeline (non-streaming wrapper; latency only)
+    remix        run_remix_pipeline_sse (with stage breakdown)
+    remix-call   run_remix_pipeline (latency only)
+    generate-http / remix-http
+                 the FastAPI apps in generate_simulation.py / remix_simulation.py
+                 through an in-process ASGI transport (needs modal, fastapi, httpx)
+
+Example:
+    python -m benchmarks.e2e --target sim --target remix --requests 50 \\
+        --concurrency 10 --latency "ttft=lognormal:-0.5,0.4;tps=150;seed=0" \\
+        --out bench_e2e.json
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from dataclasses import dataclass, field
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_MODAL_FUNCTIONS = os.path.dirname(_HERE)
+_REPO_SIMULATIONS = os.path.join(_MODAL_FUNCTIONS, "..", "src", "simulations")
+
+DEFAULT_PROMPTS = [
+    "Launch a soccer ball at a crate and show its velocity over time.",
+    "Two boxes colliding on a frictionless floor.",
+    "Drop a bowling ball and a feather from the same height.",
+    "A projectile fired from a cannon at 45 degrees.",
+]
+
+DEFAULT_EDITS = [
+    "Let the initial velocity slider go up to 40 m/s.",
+    "Only plot the vertical velocity.",
+    "Make the ball bouncier.",
+]
+
+TARGETS = ("sim", "sim-call", "remix", "remix-call", "generate-http", "remix-http")
+
+CPU_SECTIONS = (
+    "compile",
+    "prompt_build",
+    "json_loads",
+    "extract_json",
+    "parse",
+    "assemble",
+    "validate",
+    "presim",
+    "overlap",
+    "templates",
+    "json_dumps",
+)
+
+
+@dataclass
+class RunResult:
+    latency_s: float
+    first_event_s: float | None = None
+    error: str | None = None
+    # (stage, started_at, done_at) relative to the request start, in event order.
+    stages: list[tuple[str, float, float]] = field(default_factory=list)
+    groups: list[list[str]] = field(default_factory=list)
+
+
+class EventClock:
+    """Timestamps SSE frames and reconstructs stage intervals and parallel groups."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.first_event_s: float | None = None
+        self._open: dict[str, float] = {}
+        self._stages: list[tuple[str, float, float]] = []
+        self._groups: list[list[str]] = []
+        self._group_open = False
+        self.error: str | None = None
+
+    def feed(self, frame: str) -> None:
+        now = time.monotonic() - self.started
+        if self.first_event_s is None:
+            self.first_event_s = now
+        for line in frame.splitlines():
+            if not line.startswith("data: "):
+                continue
+            try:
+                event = json.loads(line[len("data: ") :])
+            except json.JSONDecodeError:
+                continue
+            kind = event.get("type")
+            if kind == "error":
+                self.error = event.get("error", "unknown error")
+            if kind != "progress":
+                continue
+            stage = event.get("stage", "?")
+            if event.get("status") == "started":
+                if self._group_open and self._groups:
+                    self._groups[-1].append(stage)
+                else:
+                    self._groups.append([stage])
+                self._group_open = True
+                self._open[stage] = now
+            elif event.get("status") == "done":
+                self._group_open = False
+                self._stages.append((stage, self._open.pop(stage, now), now))
+
+    def result(self) -> RunResult:
+        return RunResult(
+            latency_s=time.monotonic() - self.started,
+            first_event_s=self.first_event_s,
+            error=self.error,
+            stages=self._stages,
+            groups=self._groups,
+        )
+
+
+def critical_path(run: RunResult) -> list[tuple[str, float]]:
+    """(stage, duration) for the slowest member of each sequential/parallel group."""
+    intervals = {name: (start, end) for name, start, end in run.stages}
+    path = []
+    for group in run.groups:
+        members = [g for g in group if g in intervals]
+        if not members:
+            continue
+        last = max(members, key=lambda g: intervals[g][1])
+        start = min(intervals[g][0] for g in members)
+        path.append((last, intervals[last][1] - start))
+    return path
+
+
+def _load_parents() -> list[dict]:
+    parents = []
+    for path in sorted(glob.glob(os.path.join(_REPO_SIMULATIONS, "*.json"))):
+        with open(path) as f:
+            parents.append(json.load(f))
+    if not parents:
+        raise SystemExit(f"benchmarks.e2e: no parent simulations in {_REPO_SIMULATIONS}")
+    return parents
+
+
+def _request(i: int, prompts: list[str], edits: list[str], parents: list[dict]) -> dict:
+    return {
+        "messages": [{"role": "user", "content": prompts[i % len(prompts)]}],
+        "edit": [{"role": "user", "content": edits[i % len(edits)]}],
+        "parent_json": parents[i % len(parents)],
+    }
+
+
+async def _run_one(target: str, req: dict, model: str, provider: str | None, apps: dict) -> RunResult:
+    clock = EventClock()
+    try:
+        if target == "sim":
+            from sim_pipeline import run_sim_pipeline_sse
+
+            async for frame in run_sim_pipeline_sse(req["messages"], model=model, provider=provider):
+                clock.feed(frame)
+        elif target == "remix":
+            from sim_pipeline_remix import run_remix_pipeline_sse
+
+            async for frame in run_remix_pipeline_sse(
+                req["edit"], req["parent_json"], model=model, provider=provider
+            ):
+                clock.feed(frame)
+        elif target == "sim-call":
+            from sim_pipeline import run_sim_pipeline
+
+            await run_sim_pipeline(req["messages"], model=model, provider=provider)
+        elif target == "remix-call":
+            from sim_pipeline_remix import run_remix_pipeline
+
+            await run_remix_pipeline(
+                req["edit"], req["parent_json"], model=model, provider=provider
+            )
+        else:
+            client = apps[target]
+            body = {"messages": req["messages"], "model": model}
+            if target == "remix-http":
+                body = {"messages": req["edit"], "parent_json": req["parent_json"], "model": model}
+            if provider:
+                body["provider"] = provider
+            async with client.stream("POST", "/", json=body) as response:
+                if response.status_code >= 400:
+                    clock.error = f"HTTP {response.status_code}"
+                async for chunk in response.aiter_text():
+                    clock.feed(chunk)
+    except Exception as e:  # a failed request is a data point, not a crash
+        clock.error = f"{type(e).__name__}: {e}"
+    result = clock.result()
+    if target.endswith("-http"):
+        # httpx's ASGITransport hands over the body only once the app finishes,
+        # so client-side event timings are meaningless here. The server-side
+        # `stage.*.wall_s` observations still cover these targets.
+        result.stages, result.groups = [], []
+    return result
+
+
+def _http_clients(targets: list[str]) -> dict:
+    clients = {}
+    wanted = {"generate-http": "generate_simulation", "remix-http": "remix_simulation"}
+    for target, module_name in wanted.items():
+        if target not in targets:
+            continue
+        import importlib
+
+        import httpx
+
+        module = importlib.import_module(module_name)
+        clients[target] = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=module.create_web_app()),
+            base_url="http://bench",
+            timeout=None,
+        )
+    return clients
+
+
+async def run_target(
+    target: str,
+    *,
+    requests: int,
+    concurrency: int,
+    model: str,
+    provider: str | None,
+    prompts: list[str],
+    edits: list[str],
+    parents: list[dict],
+    apps: dict,
+) -> dict:
+    from pipeline import metrics
+
+    metrics.reset()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(i: int) -> RunResult:
+        async with semaphore:
+            return await _run_one(target, _request(i, prompts, edits, parents), model, provider, apps)
+
+    cpu_started = time.process_time()
+    wall_started = time.monotonic()
+    runs = await asyncio.gather(*(bounded(i) for i in range(requests)))
+    wall = time.monotonic() - wall_started
+    process_cpu = time.process_time() - cpu_started
+
+    ok = [r for r in runs if r.error is None]
+    stage_durations: dict[str, list[float]] = {}
+    on_path: dict[str, list[float]] = {}
+    for run in ok:
+        for name, start, end in run.stages:
+            stage_durations.setdefault(name, []).append(end - start)
+        for name, duration in critical_path(run):
+            on_path.setdefault(name, []).append(duration)
+
+    snap = metrics.snapshot()
+    n = max(1, len(runs))
+    cpu = {
+        name: {
+            "seconds": snap["cpu"].get(name, {}).get("seconds", 0.0),
+            "calls": snap["cpu"].get(name, {}).get("calls", 0),
+            "per_request_ms": 1000 * snap["cpu"].get(name, {}).get("seconds", 0.0) / n,
+        }
+        for name in CPU_SECTIONS
+    }
+    return {
+        "requests": len(runs),
+        "errors": len(runs) - len(ok),
+        "error_samples": sorted({r.error for r in runs if r.error})[:5],
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "throughput_rps": len(ok) / wall if wall > 0 else 0.0,
+        "latency_s": metrics.summarize([r.latency_s for r in ok]),
+        "first_event_s": metrics.summarize(
+            [r.first_event_s for r in ok if r.first_event_s is not None]
+        ),
+        "stages": {k: metrics.summarize(v) for k, v in stage_durations.items()},
+        "critical_path": {
+            k: {
+                "on_path_pct": 100.0 * len(v) / max(1, len(ok)),
+                **metrics.summarize(v),
+            }
+            for k, v in on_path.items()
+        },
+        "cpu": cpu,
+        "process_cpu_s": process_cpu,
+        "counters": snap["counters"],
+        "server_observations": snap["observations"],
+    }
+
+
+def _print_report(results: dict) -> None:
+    for target, r in results["targets"].items():
+        lat = r["latency_s"]
+        print(
+            f"\n== {target}: {r['requests']} req, {r['errors']} err, "
+            f"conc={r['concurrency']}, {r['throughput_rps']:.2f} req/s"
+        )
+        if lat.get("count"):
+            print(
+                f"   latency  p50={lat['p50']:.3f}s p95={lat['p95']:.3f}s "
+                f"p99={lat['p99']:.3f}s max={lat['max']:.3f}s"
+            )
+        for name, cp in r["critical_path"].items():
+            print(
+                f"   path     {name:<10} on-path={cp['on_path_pct']:5.1f}% "
+                f"p50={cp['p50']:.3f}s p95={cp['p95']:.3f}s"
+            )
+        own = sum(c["seconds"] for k, c in r["cpu"].items() if k != "parse")
+        print(f"   cpu      own={1000 * own / max(1, r['requests']):.2f} ms/req "
+              f"process={r['process_cpu_s']:.2f}s")
+        for name, c in r["cpu"].items():
+            if c["calls"]:
+                print(f"            {name:<13} {c['per_request_ms']:.3f} ms/req ({c['calls']} calls)")
+        for err in r["error_samples"]:
+            print(f"   error    {err}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark (replayed LLM).")
+    parser.add_argument("--target", action="append", choices=TARGETS, help="repeatable; default sim+remix")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--model", default="gpt-5-mini")
+    parser.add_argument("--provider", default=None)
+    parser.add_argument("--fixtures", default=os.path.join(_HERE, "fixtures"))
+    parser.add_argument(
+        "--latency",
+        default="ttft=lognormal:-1.0,0.3;tps=400;seed=0",
+        help="replay latency spec (see pipeline.replay.LatencyModel.from_spec)",
+    )
+    parser.add_argument("--prompts", help="JSON file with a list of prompt strings")
+    parser.add_argument("--out", help="write machine-readable results here")
+    args = parser.parse_args(argv)
+
+    # Replay settings are read lazily from the environment by pipeline.replay,
+    # so they must be in place before the first LLM call.
+    os.environ["PIPELINE_LLM_MODE"] = "replay"
+    os.environ["PIPELINE_LLM_FIXTURES"] = args.fixtures
+    os.environ["PIPELINE_REPLAY_LATENCY"] = args.latency
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING"))
+    if _MODAL_FUNCTIONS not in sys.path:
+        sys.path.insert(0, _MODAL_FUNCTIONS)
+
+    targets = args.target or ["sim", "remix"]
+    prompts = DEFAULT_PROMPTS
+    if args.prompts:
+        with open(args.prompts) as f:
+            prompts = json.load(f)
+    parents = _load_parents()
+
+    async def run_all() -> dict:
+        apps = _http_clients(targets)
+        out = {}
+        try:
+            for target in targets:
+                out[target] = await run_target(
+                    target,
+                    requests=args.requests,
+                    concurrency=args.concurrency,
+                    model=args.model,
+                    provider=args.provider,
+                    prompts=prompts,
+                    edits=DEFAULT_EDITS,
+                    parents=parents,
+                    apps=apps,
+                )
+        finally:
+            for client in apps.values():
+                await client.aclose()
+        return out
+
+    results = {
+        "schema_version": 1,
+        "kind": "e2e",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "model": args.model,
+            "provider": args.provider,
+            "latency": args.latency,
+            "fixtures": os.path.relpath(args.fixtures),
+        },
+        "targets": asyncio.run(run_all()),
+    }
+    _print_report(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Cold import-time budgets, measured with `python -X importtime`.
+
+Each module is imported in a fresh interpreter `--runs` times; the median
+cumulative import time is checked against `baselines/import_budgets.json`.
+The same file lists modules that must NOT be pulled in at import time
+(openai alone costs ~0.7 s; it belongs in the container's enter hook, not on
+the import path). Exits 1 if any budget or import rule is violated:
+
+    python -m benchmarks.import_time            # check against the budgets
+    python -m benchmarks.import_time --top 15   # also show the slowest imports
+
+Budgets carry generous headroom because absolute times vary by machine; the
+forbidden-import rules are exact and catch most regressions on their own.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_MODAL_FUNCTIONS = os.path.dirname(_HERE)
+DEFAULT_BUDGETS = os.path.join(_HERE, "baselines", "import_budgets.json")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def profile_import(module: str) -> dict[str, tuple[int, int]]:
+    """Return {module_name: (self_us, cumulative_us)} for one cold import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=_MODAL_FUNCTIONS,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    timings: dict[str, tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            timings[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return timings
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Check cold import-time budgets.")
+    parser.add_argument("--budgets", default=DEFAULT_BUDGETS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="show N slowest imports per module")
+    parser.add_argument("--out", help="write measured medians as JSON here")
+    args = parser.parse_args(argv)
+
+    with open(args.budgets) as f:
+        budgets = json.load(f)["modules"]
+
+    failures: list[str] = []
+    measured: dict[str, float] = {}
+    for module, rule in budgets.items():
+        runs = []
+        try:
+            for _ in range(args.runs):
+                runs.append(profile_import(module))
+        except RuntimeError as e:
+            if rule.get("optional"):
+                print(f"{module:<24} skipped ({str(e).splitlines()[-1]})")
+                continue
+            raise
+        median_ms = statistics.median(r[module][1] for r in runs) / 1000
+        measured[module] = median_ms
+        budget_ms = rule["budget_ms"]
+        status = "ok" if median_ms <= budget_ms else "OVER BUDGET"
+        print(f"{module:<24} {median_ms:8.1f} ms  (budget {budget_ms:g} ms)  {status}")
+        if median_ms > budget_ms:
+            failures.append(f"{module}: {median_ms:.1f} ms > {budget_ms:g} ms")
+        pulled = [m for m in rule.get("forbidden", []) if m in runs[0]]
+        for name in pulled:
+            failures.append(f"{module}: imports {name} at module load")
+            print(f"{'':<24} forbidden import: {name}")
+        if args.top:
+            slowest = sorted(runs[0].items(), key=lambda kv: kv[1][0], reverse=True)
+            for name, (self_us, _) in slowest[: args.top]:
+                print(f"{'':<24}   {self_us / 1000:7.1f} ms self  {name}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"schema_version": 1, "kind": "import_time", "median_ms": measured}, f, indent=2)
+    if failures:
+        print(f"\n{len(failures)} import-time violation(s):")
+        for line in failures:
+            print(f"  {line}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
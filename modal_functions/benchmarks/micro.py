@@ -0,0 +1,367 @@
+"""Micro-benchmarks for the pure-Python hot paths, with a regression guard.
+
+Each case is timed at scene sizes from 1 to 500 objects (intents, controls,
+graph lines and history turns scale with it). The report shows time per call
+and the fitted log-log scaling exponent — ~1.0 is linear, ~2.0 means
+the code went quadratic somewhere.
+
+    python -m benchmarks.micro                         # print the table
+    python -m benchmarks.micro --save-baseline         # write benchmarks/baselines/micro.json
+    python -m benchmarks.micro --check --threshold 25  # exit 1 on a >25% regression
+
+Timings are the best of `--repeat` autoranged runs, which keeps noise low
+enough to compare runs on the same machine; baselines are not portable
+across machines, so none is committed — save one on the CI host (and re-save
+after moving hosts). `--check` fails immediately when there is no baseline.
+"""
+
+import argparse
+import copy
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import time
+import timeit
+from typing import Callable
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_MODAL_FUNCTIONS = os.path.dirname(_HERE)
+DEFAULT_BASELINE = os.path.join(_HERE, "baselines", "micro.json")
+
+SIZES = (1, 10, 50, 100, 250, 500)
+
+_SVGS = ("soccer_ball", "crate", "bowling_ball", "brick_block", "feather", "boat")
+
+
+# ---------------------------------------------------------------------------
+# Synthetic scenes
+# ---------------------------------------------------------------------------
+
+
+def make_objects(n: int) -> list[dict]:
+    return [
+        {
+            "id": f"obj_{i}",
+            "x": 1.0 + (i % 25) * 2.0,
+            "y": 1.0 + (i // 25) * 2.0,
+            "width": 0.5,
+            "height": 0.5,
+            "svg": _SVGS[i % len(_SVGS)],
+            "velocity": {"x": float(i % 7), "y": float(i % 5)},
+            "mass": 1.0 + i % 3,
+            "restitution": 0.8,
+        }
+        for i in range(n)
+    ]
+
+
+def make_config(n: int) -> dict:
+    objects = make_objects(n)
+    return {
+        "title": f"Scene with {n} bodies",
+        "description": "Synthetic benchmark scene.",
+        "environment": {
+            "walls": ["bottom"],
+            "gravity": 9.8,
+            "unit": "m",
+            "pixelsPerUnit": 10,
+            "physicsEngine": "rapier",
+        },
+        "objects": objects,
+        "controls": [
+            {
+                "type": "slider",
+                "label": f"Velocity {o['id']} (m/s)",
+                "targetObj": o["id"],
+                "property": "velocity.x",
+                "min": -30,
+                "max": 30,
+                "step": 0.1,
+                "defaultValue": o["velocity"]["x"],
+            }
+            for o in objects
+        ],
+        "graphs": [
+            {
+                "type": "line",
+                "title": "Velocities",
+                "yAxisRange": {"min": -30, "max": 30},
+                "yAxisLabel": "Velocity (m/s)",
+                "lines": [
+                    {
+                        "label": o["id"],
+                        "color": "#ff6bff",
+                        "targetObj": o["id"],
+                        "property": "velocity.y",
+                    }
+                    for o in objects
+                ],
+            }
+        ],
+        "outputs": [
+            {
+                "title": "Readouts",
+                "values": [
+                    {"label": o["id"], "targetObj": o["id"], "property": "position.y"}
+                    for o in objects
+                ],
+            }
+        ],
+    }
+
+
+def make_skeleton(n: int) -> dict:
+    objects = make_objects(n)
+    return {
+        "title": "Synthetic",
+        "description": "Synthetic benchmark scene.",
+        "environment": {"walls": ["bottom"], "gravity": 9.8, "unit": "m", "pixelsPerUnit": 10},
+        "scene_dimension": {"axis": "width", "size": 80},
+        "object_skeletons": [
+            {"id": o["id"], "role": "body", "svg": o["svg"], "x": o["x"], "y": o["y"]}
+            for o in objects
+        ],
+        "control_intents": [
+            {"name": f"c_{o['id']}", "target_id": o["id"], "intent": "initial velocity"}
+            for o in objects
+        ],
+        "graph_intents": [
+            {
+                "name": "velocities",
+                "intent": "velocity vs time",
+                "tracks": [{"target_id": o["id"], "property": "velocity.y"} for o in objects],
+            }
+        ],
+        "output_intents": [
+            {
+                "name": "readouts",
+                "intent": "heights",
+                "values": [{"target_id": o["id"], "property": "position.y"} for o in objects],
+            }
+        ],
+    }
+
+
+def make_history(n: int) -> list[dict]:
+    history = [{"role": "system", "content": "You are a helpful assistant. " * 20}]
+    for i in range(n):
+        role = "user" if i % 2 == 0 else "assistant"
+        history.append({"role": role, "content": f"turn {i}: " + "lorem ipsum " * 40})
+    return history
+
+
+def model_response(n: int) -> str:
+    """A typical fenced reply with prose around it, like the models send."""
+    body = json.dumps({"objects": make_objects(n)}, indent=2)
+    return f"Here is the updated slice:\n\n```json\n{body}\n```\n\nLet me know if you need changes."
+
+
+# ---------------------------------------------------------------------------
+# Cases: name -> setup(n) returning a zero-arg callable
+# ---------------------------------------------------------------------------
+
+
+def _cases() -> dict[str, Callable[[int], Callable[[], object]]]:
+    from pipeline import Scratch, content_event, fit, progress_event
+    from sim_pipeline import ControlsFillStage, ObjectsFillStage
+    from sim_pipeline._base import extract_json
+    from sim_pipeline_remix import assemble_remix_config
+    from sim_pipeline_remix._base import parent_summary_for_router
+    from sim_pipeline.validate import validate_config
+    from sim_pipeline_remix.assemble import _drop_orphaned_references
+
+    def scratch_for(n: int) -> Scratch:
+        scratch = Scratch(history=[{"role": "user", "content": "make a scene"}])
+        scratch.artifacts["skeleton"] = make_skeleton(n)
+        scratch.artifacts["objects"] = {"objects": make_objects(n)}
+        return scratch
+
+    def case_extract_json(n):
+        text = model_response(n)
+        return lambda: extract_json(text)
+
+    def case_system_prompt(n):
+        stage, scratch = ObjectsFillStage(), scratch_for(n)
+        return lambda: stage.system_prompt(scratch)
+
+    def case_objects_build_messages(n):
+        stage, scratch = ObjectsFillStage(), scratch_for(n)
+        return lambda: stage.build_messages(scratch)
+
+    def case_controls_build_messages(n):
+        stage, scratch = ControlsFillStage(), scratch_for(n)
+        return lambda: stage.build_messages(scratch)
+
+    def case_parent_summary(n):
+        parent = make_config(n)
+        return lambda: parent_summary_for_router(parent)
+
+    def case_assemble_remix(n):
+        parent = make_config(n)
+        # Remix drops every other object, leaving orphans for the sanity pass.
+        artifacts = {"objects": {"objects": parent["objects"][::2]}}
+        return lambda: assemble_remix_config(parent, artifacts, ["objects"])
+
+    def case_drop_orphans(n):
+        config = make_config(n)
+        config["objects"] = config["objects"][::2]
+        return lambda: _drop_orphaned_references(copy.deepcopy(config))
+
+    def case_validate_config(n):
+        config = make_config(n)
+        validate_config(config)  # compile outside the timed loop
+        return lambda: validate_config(config)
+
+    def case_budget_fit(n):
+        history = make_history(n)
+        # Budget that forces trimming roughly half of the turns.
+        budget = max(200, 60 * n)
+        return lambda: fit(history, budget)
+
+    def case_content_event(n):
+        payload = json.dumps(make_config(n))
+        return lambda: content_event(payload)
+
+    def case_progress_events(n):
+        return lambda: [progress_event(f"stage_{i}", "done", label="Label") for i in range(n)]
+
+    return {
+        "extract_json": case_extract_json,
+        "system_prompt.objects": case_system_prompt,
+        "build_messages.objects": case_objects_build_messages,
+        "build_messages.controls": case_controls_build_messages,
+        "parent_summary_for_router": case_parent_summary,
+        "assemble_remix_config": case_assemble_remix,
+        "_drop_orphaned_references": case_drop_orphans,
+        "validate_config": case_validate_config,
+        "budget.fit": case_budget_fit,
+        "sse.content_event": case_content_event,
+        "sse.progress_event": case_progress_events,
+    }
+
+
+def time_call(fn: Callable[[], object], repeat: int) -> float:
+    """Best-of-`repeat` seconds per call, autoranged to ≥0.05 s per run."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, number // 4)
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(sizes: tuple[int, ...], repeat: int, only: list[str] | None) -> dict:
+    results: dict[str, dict[str, float]] = {}
+    for name, setup in _cases().items():
+        if only and not any(o in name for o in only):
+            continue
+        results[name] = {str(n): time_call(setup(n), repeat) for n in sizes}
+    return results
+
+
+def scaling_exponent(timings: dict[str, float]) -> float:
+    """Least-squares slope of log(time) vs log(n), ignoring n=1 (call overhead).
+
+    A single fitted exponent is much less noisy than pairwise slopes.
+    """
+    points = [
+        (math.log(int(k)), math.log(v)) for k, v in timings.items() if int(k) > 1 and v > 0
+    ]
+    if len(points) < 2:
+        return 0.0
+    mx = sum(x for x, _ in points) / len(points)
+    my = sum(y for _, y in points) / len(points)
+    var = sum((x - mx) ** 2 for x, _ in points)
+    return sum((x - mx) * (y - my) for x, y in points) / var if var else 0.0
+
+
+def compare(current: dict, baseline: dict, threshold_pct: float) -> list[str]:
+    regressions = []
+    for name, timings in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for size, seconds in timings.items():
+            ref = base.get(size)
+            if not ref:
+                continue
+            change = 100.0 * (seconds - ref) / ref
+            if change > threshold_pct:
+                regressions.append(
+                    f"{name} n={size}: {ref * 1e6:.1f}µs → {seconds * 1e6:.1f}µs (+{change:.0f}%)"
+                )
+    return regressions
+
+
+def _print_table(results: dict, sizes: tuple[int, ...]) -> None:
+    header = f"{'case':<28}" + "".join(f"{'n=' + str(n):>11}" for n in sizes) + "   exponent"
+    print(header)
+    print("-" * len(header))
+    for name, timings in results.items():
+        cells = "".join(f"{timings[str(n)] * 1e6:>9.1f}µs" for n in sizes)
+        exponent = scaling_exponent(timings)
+        flag = "  <-- nonlinear" if exponent > 1.3 else ""
+        print(f"{name:<28}{cells}   {exponent:5.2f}{flag}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for pipeline hot paths.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", action="append", help="substring filter on case names")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="fail on regression vs --baseline")
+    parser.add_argument("--threshold", type=float, default=25.0, help="allowed slowdown, percent")
+    parser.add_argument("--out", help="write machine-readable results here")
+    args = parser.parse_args(argv)
+    if args.check and args.save_baseline:
+        parser.error("--check compares against the saved baseline; don't combine it with --save-baseline")
+    baseline = None
+    if args.check:
+        # Before the run: a check with nothing to check against must fail, not time everything first.
+        if not os.path.exists(args.baseline):
+            raise SystemExit(f"no baseline at {args.baseline}; run with --save-baseline first")
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    if _MODAL_FUNCTIONS not in sys.path:
+        sys.path.insert(0, _MODAL_FUNCTIONS)
+    # The orphan-dropping pass logs one warning per dropped entry; writing
+    # those to a terminal would dominate the timings we're trying to measure.
+    logging.disable(logging.WARNING)
+    sizes = tuple(int(s) for s in args.sizes.split(","))
+
+    results = run(sizes, args.repeat, args.only)
+    _print_table(results, sizes)
+
+    doc = {
+        "schema_version": 1,
+        "kind": "micro",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+        "exponents": {name: scaling_exponent(t) for name, t in results.items()},
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(doc, f, indent=2)
+        print(f"\nsaved baseline to {args.baseline}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:g}%:")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print(f"\nno regressions over {args.threshold:g}% vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
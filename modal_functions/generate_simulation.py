@@ -2,14 +2,24 @@
 Modal serverless function for generating simulations from natural-language prompts.
 
 The FastAPI handler streams SSE events from `sim_pipeline.run_sim_pipeline_sse`
-directly. The wire format on the response stream is:
+directly — or, when a new request is close to an existing simulation
+(`sim_pipeline.templates`), from `sim_pipeline_remix.run_template_pipeline_sse`,
+which remixes that simulation and falls back to the full pipeline when the
+remix can't cover the request. The wire format on the response stream is:
 
+    data: {"type":"run","run_id":"<id>"}\n\n
     data: {"type":"progress","stage":"<id>","status":"started"|"done","label":"..."}\n\n
+    data: {"type":"plan","fills":[...],"total_stages":N}\n\n        # template remixes only
     ...
+    data: {"type":"stage_failed","stage":"<id>","error":"...","run_id":"<id>"}\n\n   # slice ships empty
     data: {"type":"content","content":"<stringified SimulationConfig JSON>"}\n\n
     data: {"type":"done"}\n\n
 
-On failure, a single `{"type":"error","error":"..."}` event closes the stream.
+On failure, a single `{"type":"error","error":"..."}` event closes the stream;
+posting again with `"resume_run_id": "<id>"` re-runs only the stages that had
+not finished (see `pipeline.checkpoint`) — likewise after a `stage_failed`.
+Identical requests arriving while one is in flight (a class typing the same
+prompt) share its run and receive the same events (`pipeline.singleflight`).
 The frontend at `src/components/CreateSimulation.tsx` parses these events to
 drive the live progress bar and stage-status text.
 """
@@ -18,17 +28,11 @@ import logging
 import os
 
 import modal
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
 
+# Only `modal` is imported at module load: this file is also imported locally by
+# `modal deploy`, and inside the container everything else is imported (and
+# snapshotted) by the `@modal.enter` hook below, before the first request.
 
-# Configure root logging once at import time so every module's `logging.getLogger(__name__)`
-# inherits a useful format. Modal captures stdout/stderr — INFO+ goes to the function logs.
-logging.basicConfig(
-    level=os.environ.get("LOG_LEVEL", "INFO"),
-    format="%(asctime)s %(levelname)s %(name)s :: %(message)s",
-)
 logger = logging.getLogger("generate_simulation")
 
 
@@ -42,81 +46,169 @@ _renderables_manifest_local_path = os.path.join(
 )
 _pipeline_local_dir = os.path.join(_current_dir, "pipeline")
 _sim_pipeline_local_dir = os.path.join(_current_dir, "sim_pipeline")
+_sim_pipeline_remix_local_dir = os.path.join(_current_dir, "sim_pipeline_remix")
+_templates_local_dir = os.path.join(_current_dir, "..", "src", "simulations")
 
 image = (
     modal.Image.debian_slim()
-    .pip_install("openai", "aiohttp", "fastapi[standard]")
-    .add_local_file(local_path=_schema_local_path, remote_path="/root/simulation_schema.json")
-    .add_local_file(local_path=_instructions_local_path, remote_path="/root/gist_instructions.py")
+    .pip_install("openai", "aiohttp", "fastapi[standard]", "fastjsonschema", "numpy")
+    .add_local_file(
+        local_path=_schema_local_path, remote_path="/root/simulation_schema.json", copy=True
+    )
+    .add_local_file(
+        local_path=_instructions_local_path, remote_path="/root/gist_instructions.py", copy=True
+    )
     .add_local_file(
         local_path=_renderables_manifest_local_path,
         remote_path="/root/renderables_manifest.json",
+        copy=True,
+    )
+    .add_local_dir(local_path=_pipeline_local_dir, remote_path="/root/pipeline", copy=True)
+    .add_local_dir(
+        local_path=_sim_pipeline_local_dir, remote_path="/root/sim_pipeline", copy=True
+    )
+    .add_local_dir(
+        local_path=_sim_pipeline_remix_local_dir,
+        remote_path="/root/sim_pipeline_remix",
+        copy=True,
+    )
+    # Simulations /generate may start from (see sim_pipeline/templates.py).
+    .add_local_dir(
+        local_path=_templates_local_dir,
+        remote_path="/root/simulation_templates",
+        copy=True,
+        ignore=["*.tsx"],
+    )
+    # Sources are copied into the image (copy=True) rather than mounted so this
+    # build step can see them: it renders every static prompt block once, at
+    # build time, into an importable module (see sim_pipeline/prompt_artifacts.py).
+    .run_commands(
+        "cd /root && python -m sim_pipeline.prompt_artifacts --out /root/_prompt_artifacts.py"
     )
-    .add_local_dir(local_path=_pipeline_local_dir, remote_path="/root/pipeline")
-    .add_local_dir(local_path=_sim_pipeline_local_dir, remote_path="/root/sim_pipeline")
 )
 
 
-web_app = FastAPI()
-web_app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=False,
-    allow_methods=["POST", "OPTIONS"],
-    allow_headers=["*"],
-    expose_headers=["Content-Type"],
-)
-
+def _configure_logging() -> None:
+    # Root logging for the container, so every module's `logging.getLogger(__name__)`
+    # inherits a useful format. Modal captures stdout/stderr — INFO+ goes to the function logs.
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO"),
+        format="%(asctime)s %(levelname)s %(name)s :: %(message)s",
+    )
 
-@web_app.post("/")
-async def chat_endpoint(request: dict):
-    """
-    Expected payload:
-    {
-        "messages": [{"role": "...", "content": "..."}],
-        "model":    "gpt-5-mini" | "skolegpt-v3" | ...,
-        "provider": "openai" | "skolegpt"   // optional; auto-detected from model when omitted
-    }
 
-    Returns: text/event-stream of SSE events (see module docstring).
-    """
+def create_web_app():
+    """Build the FastAPI app. Called once per container from the enter hook."""
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, StreamingResponse
+    from pipeline import coalesce, request_key
     from sim_pipeline import run_sim_pipeline_sse
-
-    messages = request.get("messages", [])
-    model = request.get("model")
-    provider = request.get("provider")
-
-    if not messages:
-        return JSONResponse(content={"error": "No messages provided"}, status_code=400)
-    if not model:
-        return JSONResponse(content={"error": "model is required"}, status_code=400)
-
-    logger.info(
-        "endpoint: incoming request (provider=%s, model=%s, n_messages=%d, last_user_chars=%d)",
-        provider,
-        model,
-        len(messages),
-        len((messages[-1] or {}).get("content", "")),
+    from sim_pipeline._context import prompt_asset_hash
+    from sim_pipeline.templates import nearest_template
+    from sim_pipeline_remix import run_template_pipeline_sse
+
+    web_app = FastAPI()
+    web_app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=False,
+        allow_methods=["POST", "OPTIONS"],
+        allow_headers=["*"],
+        expose_headers=["Content-Type"],
     )
 
-    return StreamingResponse(
-        run_sim_pipeline_sse(messages, model=model, provider=provider),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",  # disable proxy buffering so events flush in real time
-        },
-    )
+    @web_app.post("/")
+    async def chat_endpoint(request: dict):
+        """
+        Expected payload:
+        {
+            "messages": [{"role": "...", "content": "..."}],
+            "model":    "gpt-5-mini" | "skolegpt-v3" | ...,
+            "provider": "openai" | "skolegpt",  // optional; auto-detected from model when omitted
+            "resume_run_id": "<id>"             // optional; the `run` event of a failed stream
+        }
+
+        Returns: text/event-stream of SSE events (see module docstring).
+        """
+        messages = request.get("messages", [])
+        model = request.get("model")
+        provider = request.get("provider")
+        resume_run_id = request.get("resume_run_id")
+
+        if not messages:
+            return JSONResponse(content={"error": "No messages provided"}, status_code=400)
+        if not model:
+            return JSONResponse(content={"error": "model is required"}, status_code=400)
+
+        logger.info(
+            "endpoint: incoming request (provider=%s, model=%s, n_messages=%d, last_user_chars=%d, resume=%s)",
+            provider,
+            model,
+            len(messages),
+            len((messages[-1] or {}).get("content", "")),
+            resume_run_id,
+        )
+
+        def start():
+            if resume_run_id:
+                return run_sim_pipeline_sse(
+                    messages, model=model, provider=provider, resume_run_id=str(resume_run_id)
+                )
+            match = nearest_template(messages)
+            if match is None:
+                return run_sim_pipeline_sse(messages, model=model, provider=provider)
+            template, score = match
+            logger.info(
+                "endpoint: starting from template %r (score %.3f)", template.get("title"), score
+            )
+            return run_template_pipeline_sse(messages, template, model=model, provider=provider)
+
+        key = request_key(messages, model, provider, prompt_asset_hash(), resume_run_id or "")
+        return StreamingResponse(
+            coalesce(key, start),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",  # disable proxy buffering so events flush in real time
+            },
+        )
+
+    return web_app
 
 
-@app.function(
+@app.cls(
     image=image,
     secrets=[
         modal.Secret.from_name("gist-openai-key"),
         modal.Secret.from_name("gist-skolegpt-key"),
     ],
     timeout=600,
+    enable_memory_snapshot=True,
 )
-@modal.asgi_app()
-def fastapi_app():
-    return web_app
+class GenerateSimulation:
+    @modal.enter(snap=True)
+    def prewarm(self):
+        """Pay import and cache-loading costs at container start, not on the first request.
+
+        Runs before the memory snapshot is taken, so restored containers start
+        with openai/aiohttp imported and the schema/manifest prompt blocks built.
+        numpy (for the scene pre-simulation) is imported and the template
+        index built here too.
+        """
+        _configure_logging()
+        from pipeline.llm import prewarm
+        from sim_pipeline._context import warm_caches
+        from sim_pipeline.presim import load_numpy
+        from sim_pipeline.templates import template_index
+
+        prewarm()
+        warm_caches()
+        load_numpy()
+        template_index()
+        self.web_app = create_web_app()
+
+    # The label keeps the pre-existing `...--gist-generate-simulation-fastapi-app.modal.run` URL.
+    @modal.asgi_app(label="gist-generate-simulation-fastapi-app")
+    def fastapi_app(self):
+        return self.web_app
@@ -196,6 +196,29 @@ OutputGroupConfig has no `id` field. OutputValueConfig has no `precision` field.
 """
 
 
+# Small scenes fill the detail slices that need the LLM in one call instead of
+# one call each (see sim_pipeline/details_fill.py). The per-slice fragments come
+# first as the rules for each key; this stage's heading must come last.
+details_fill_fragment = (
+    controls_fill_fragment
+    + graphs_fill_fragment
+    + outputs_fill_fragment
+    + """
+## STAGE: FILL DETAILS
+
+You are producing several detail slices in ONE response — some or all of `controls`, `graphs` and `outputs`; the user message says which. Follow the rules for each slice in the sections above, but ignore their individual "Output JSON with this exact shape" blocks: return a single object holding exactly the requested keys, each with its full array.
+
+```json
+{
+  "controls": [ ... ],
+  "graphs": [ ... ],
+  "outputs": [ ... ]
+}
+```
+"""
+)
+
+
 # ---------------------------------------------------------------------------
 # Remix-mode fragments
 #
@@ -313,3 +336,27 @@ Output JSON with this exact shape (no other top-level fields):
 { "outputs": [ ... ] }
 ```
 """
+
+
+# ---------------------------------------------------------------------------
+# History summary
+#
+# Used by `pipeline/history.py` (via the sim pipeline) to condense the turns
+# before the current request when a chat grows long.
+# ---------------------------------------------------------------------------
+
+
+history_summary_prompt = """
+You condense a conversation between a teacher or student and a physics-simulation generator so the generator can handle the next request without the full transcript.
+
+## STAGE: SUMMARIZE HISTORY
+
+Write plain prose, at most 150 words, no markdown. Keep:
+- what simulation currently exists (scenario, the objects by name, units and scale);
+- every change the user asked for that still applies, and any they reverted;
+- explicit constraints or preferences (values, labels, language, grade level).
+
+Drop pleasantries, restated configs, and anything later superseded. Never invent details.
+
+The transcript may open with a summary of even earlier turns. Treat it as part of the conversation: fold the new turns into it and return one updated summary.
+"""
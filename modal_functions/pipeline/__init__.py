@@ -4,7 +4,9 @@ Compose Stages with Linear/FanOut, share state via Scratch, emit SSE-shaped even
 that match the {type: content|progress|done|error} wire format.
 """
 
+from . import metrics
 from .budget import count_messages_tokens, count_tokens, fit, summarize_if_over
+from .checkpoint import Checkpointer, PipelineRunError
 from .extras import DocRouter, to_danish
 from .llm import (
     call_gemma,
@@ -14,8 +16,17 @@ from .llm import (
     stream_llm,
     stream_openai,
 )
-from .pipeline import FanOut, Linear
-from .sse import as_sse, content_event, done_event, error_event, progress_event
+from .pipeline import FanOut, Linear, cancel_pending
+from .singleflight import SingleFlight, coalesce, request_key
+from .sse import (
+    as_sse,
+    content_event,
+    done_event,
+    error_event,
+    progress_event,
+    run_event,
+    stage_failed_event,
+)
 from .stage import Scratch, Stage
 
 __all__ = [
@@ -23,6 +34,10 @@ __all__ = [
     "Scratch",
     "Linear",
     "FanOut",
+    "cancel_pending",
+    "SingleFlight",
+    "coalesce",
+    "request_key",
     "call_llm",
     "stream_llm",
     "call_openai",
@@ -34,10 +49,15 @@ __all__ = [
     "done_event",
     "error_event",
     "progress_event",
+    "run_event",
+    "stage_failed_event",
+    "Checkpointer",
+    "PipelineRunError",
     "count_tokens",
     "count_messages_tokens",
     "fit",
     "summarize_if_over",
     "DocRouter",
     "to_danish",
+    "metrics",
 ]
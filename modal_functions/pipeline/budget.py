@@ -29,15 +29,22 @@ def fit(messages: list[dict], budget: int) -> list[dict]:
     """
     system = [m for m in messages if m.get("role") == "system"]
     rest = [m for m in messages if m.get("role") != "system"]
-    while count_messages_tokens(system + rest) > budget and rest:
-        rest.pop(0)
-    if count_messages_tokens(system + rest) > budget:
+    system_tokens = count_messages_tokens(system)
+    # Count each message once and drop from the front with a running total;
+    # recounting the whole list per pop made this quadratic in history length.
+    rest_tokens = [count_messages_tokens([m]) for m in rest]
+    total = system_tokens + sum(rest_tokens)
+    start = 0
+    while total > budget and start < len(rest):
+        total -= rest_tokens[start]
+        start += 1
+    if total > budget:
         logger.warning(
             "fit: system messages alone exceed budget=%d (tokens=%d)",
             budget,
-            count_messages_tokens(system),
+            system_tokens,
         )
-    return system + rest
+    return system + rest[start:]
 
 
 async def summarize_if_over(
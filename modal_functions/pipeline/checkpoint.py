@@ -0,0 +1,196 @@
+"""Per-stage checkpoints so a failed or interrupted run can be resumed.
+
+A pipeline saves its `Scratch` (history + artifacts, see
+`Scratch.checkpoint`) under a run id after every stage that finishes. If a
+later stage fails or the client disconnects, calling the pipeline again with
+`resume_run_id` restores the scratch and re-executes only the stages whose
+artifacts are missing. The checkpoint is discarded once the run succeeds.
+
+Stores are pluggable (`CheckpointStore`). `checkpoint_store()` returns the
+process default: `FileCheckpointStore` under `PIPELINE_CHECKPOINT_DIR` when
+set — e.g. a volume shared by the containers — and an `InMemoryCheckpointStore`
+(bounded, `PIPELINE_CHECKPOINT_TTL_S`) otherwise, which only resumes on the
+same container. `PIPELINE_CHECKPOINTS=0` turns checkpointing off.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Protocol
+
+from . import metrics
+from .stage import Scratch
+
+logger = logging.getLogger(__name__)
+
+_MAX_IN_MEMORY = 256
+
+
+class PipelineRunError(RuntimeError):
+    """A pipeline run failed; `run_id` resumes it (None when nothing was saved)."""
+
+    def __init__(self, message: str, run_id: str | None = None) -> None:
+        super().__init__(message)
+        self.run_id = run_id
+
+
+def checkpoints_enabled() -> bool:
+    return os.environ.get("PIPELINE_CHECKPOINTS", "1").lower() not in ("0", "false", "off")
+
+
+def _ttl_s() -> float:
+    return float(os.environ.get("PIPELINE_CHECKPOINT_TTL_S", "3600"))
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+
+class CheckpointStore(Protocol):
+    async def load(self, run_id: str) -> dict | None:
+        ...
+
+    async def save(self, run_id: str, checkpoint: dict) -> None:
+        ...
+
+    async def discard(self, run_id: str) -> None:
+        ...
+
+
+class InMemoryCheckpointStore:
+    """Checkpoints in process memory: the most recent `max_runs`, each for `ttl_s`."""
+
+    def __init__(self, max_runs: int = _MAX_IN_MEMORY, ttl_s: float | None = None) -> None:
+        self.max_runs = max_runs
+        self.ttl_s = ttl_s if ttl_s is not None else _ttl_s()
+        self._runs: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def load(self, run_id: str) -> dict | None:
+        entry = self._runs.get(run_id)
+        if entry is None:
+            return None
+        saved_at, payload = entry
+        if time.monotonic() - saved_at > self.ttl_s:
+            del self._runs[run_id]
+            return None
+        return json.loads(payload)
+
+    async def save(self, run_id: str, checkpoint: dict) -> None:
+        # Serialized, so later in-place edits to the scratch don't leak in.
+        self._runs[run_id] = (time.monotonic(), json.dumps(checkpoint))
+        self._runs.move_to_end(run_id)
+        while len(self._runs) > self.max_runs:
+            self._runs.popitem(last=False)
+
+    async def discard(self, run_id: str) -> None:
+        self._runs.pop(run_id, None)
+
+
+class FileCheckpointStore:
+    """One JSON file per run under `directory`, replaced atomically on each save."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, run_id: str) -> str:
+        # Run ids come from clients; keep them to a plain file name.
+        safe = "".join(c for c in run_id if c.isalnum() or c in "-_")[:64]
+        return os.path.join(self.directory, f"{safe}.json")
+
+    async def load(self, run_id: str) -> dict | None:
+        try:
+            with open(self._path(run_id)) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    async def save(self, run_id: str, checkpoint: dict) -> None:
+        path = self._path(run_id)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp, path)
+
+    async def discard(self, run_id: str) -> None:
+        try:
+            os.remove(self._path(run_id))
+        except OSError:
+            pass
+
+
+_store: CheckpointStore | None = None
+
+
+def checkpoint_store() -> CheckpointStore:
+    """The process-wide default store (see the module docstring)."""
+    global _store
+    if _store is None:
+        directory = os.environ.get("PIPELINE_CHECKPOINT_DIR")
+        _store = FileCheckpointStore(directory) if directory else InMemoryCheckpointStore()
+    return _store
+
+
+class Checkpointer:
+    """Saves one pipeline run's scratch under its run id.
+
+    `pipeline` tags the checkpoint so a run id from one pipeline can't resume
+    another. All store errors are logged and swallowed — checkpoints never fail
+    a run.
+    """
+
+    def __init__(self, pipeline: str, run_id: str | None = None, store: CheckpointStore | None = None) -> None:
+        self.pipeline = pipeline
+        self.run_id = run_id or new_run_id()
+        self.enabled = checkpoints_enabled()
+        self.store = store if store is not None else (checkpoint_store() if self.enabled else None)
+
+    async def restore(self, resume_run_id: str | None) -> Scratch | None:
+        """The saved scratch for `resume_run_id` (and adopt that id), or None."""
+        if not resume_run_id or self.store is None:
+            return None
+        try:
+            saved = await self.store.load(resume_run_id)
+        except Exception:
+            logger.exception("checkpoint: loading %s failed", resume_run_id)
+            saved = None
+        if not saved or saved.get("pipeline") != self.pipeline:
+            metrics.incr(f"checkpoint.{self.pipeline}.resume_missed")
+            logger.warning("checkpoint: no %s checkpoint for run %s, starting over", self.pipeline, resume_run_id)
+            return None
+        self.run_id = resume_run_id
+        metrics.incr(f"checkpoint.{self.pipeline}.resumed")
+        scratch = Scratch.from_checkpoint(saved)
+        logger.info("checkpoint: resuming %s run %s with %s", self.pipeline, self.run_id, sorted(scratch.artifacts))
+        return scratch
+
+    async def save(self, scratch: Scratch) -> None:
+        if self.store is None:
+            return
+        try:
+            await self.store.save(self.run_id, {"pipeline": self.pipeline, **scratch.checkpoint()})
+        except Exception:
+            logger.exception("checkpoint: saving run %s failed", self.run_id)
+
+    async def discard(self) -> None:
+        if self.store is None:
+            return
+        try:
+            await self.store.discard(self.run_id)
+        except Exception:
+            logger.exception("checkpoint: discarding run %s failed", self.run_id)
+
+
+__all__ = [
+    "CheckpointStore",
+    "Checkpointer",
+    "FileCheckpointStore",
+    "InMemoryCheckpointStore",
+    "PipelineRunError",
+    "checkpoint_store",
+    "checkpoints_enabled",
+    "new_run_id",
+]
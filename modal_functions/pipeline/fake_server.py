@@ -0,0 +1,174 @@
+"""OpenAI-compatible stand-in server that replays recorded fixtures.
+
+Serves `POST /v1/chat/completions` in both the OpenAI shape (streaming and
+non-streaming) and the SkoleGPT SSE shape, which is the same wire format. The
+real HTTP clients in `llm.py` run unchanged against it:
+
+    python -m pipeline.fake_server --fixtures ./llm_fixtures --port 8787 \\
+        --latency "ttft=lognormal:-0.7,0.5;tps=80;seed=1"
+
+    export OPENAI_BASE_URL=http://127.0.0.1:8787/v1 OPENAI_API_KEY=fake
+    export SKOLEGPT_API_URL=http://127.0.0.1:8787/v1/chat/completions SKOLEGPT_API_KEY=fake
+
+`GET /stats` reports request/completion/cancellation counts and peak
+concurrency, which is what load and cancellation tests assert against.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from .replay import (
+    FixtureStore,
+    LatencyModel,
+    fixture_key,
+    replay_tokens,
+    stage_signature,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ServerStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.misses = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def _provider_for(model: str | None) -> str:
+    return "skolegpt" if (model or "").lower().startswith("skolegpt") else "openai"
+
+
+def _chunk_frame(completion_id: str, model: str, delta: dict, finish: str | None) -> bytes:
+    body = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }
+    return f"data: {json.dumps(body)}\n\n".encode("utf-8")
+
+
+def create_app(store: FixtureStore, latency: LatencyModel):
+    """Build the aiohttp application. Imported lazily so the pipeline package
+    doesn't need aiohttp.web at import time."""
+    from aiohttp import web
+
+    stats = ServerStats()
+
+    async def chat_completions(request: "web.Request") -> "web.StreamResponse":
+        payload = await request.json()
+        messages = payload.get("messages") or []
+        model = payload.get("model")
+        max_tokens = payload.get("max_completion_tokens", payload.get("max_tokens"))
+        key = fixture_key(_provider_for(model), model, messages, max_tokens)
+        fixture = store.lookup(key, stage_signature(messages))
+
+        stats.requests += 1
+        if fixture is None:
+            stats.misses += 1
+            return web.json_response(
+                {"error": {"message": f"no fixture for {stage_signature(messages)!r}"}},
+                status=404,
+            )
+
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        completion_id = f"chatcmpl-fake-{uuid.uuid4().hex[:12]}"
+        model_name = model or fixture.model or "fake"
+        try:
+            if not payload.get("stream"):
+                content = "".join([t async for t in replay_tokens(fixture, latency)])
+                stats.completed += 1
+                return web.json_response(
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model_name,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": content},
+                                "finish_reason": fixture.finish_reason or "stop",
+                            }
+                        ],
+                        "usage": fixture.usage,
+                    }
+                )
+
+            response = web.StreamResponse(
+                headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+            )
+            await response.prepare(request)
+            await response.write(
+                _chunk_frame(completion_id, model_name, {"role": "assistant"}, None)
+            )
+            async for token in replay_tokens(fixture, latency):
+                await response.write(
+                    _chunk_frame(completion_id, model_name, {"content": token}, None)
+                )
+            await response.write(
+                _chunk_frame(completion_id, model_name, {}, fixture.finish_reason or "stop")
+            )
+            if (payload.get("stream_options") or {}).get("include_usage") and fixture.usage:
+                usage_frame = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model_name,
+                    "choices": [],
+                    "usage": fixture.usage,
+                }
+                await response.write(f"data: {json.dumps(usage_frame)}\n\n".encode("utf-8"))
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+            stats.completed += 1
+            return response
+        except (asyncio.CancelledError, ConnectionResetError):
+            stats.cancelled += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+
+    async def get_stats(request: "web.Request") -> "web.Response":
+        return web.json_response(stats.to_dict())
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/chat/completions", chat_completions)
+    app.router.add_get("/stats", get_stats)
+    app["stats"] = stats
+    return app
+
+
+def main(argv: list[str] | None = None) -> None:
+    from aiohttp import web
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", default="llm_fixtures")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", default="", help="see LatencyModel.from_spec")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    app = create_app(FixtureStore(args.fixtures), LatencyModel.from_spec(args.latency))
+    # handler_cancellation: like a real provider, stop generating when the
+    # client disconnects, so `/stats` shows cancelled requests as they happen.
+    web.run_app(app, host=args.host, port=args.port, handler_cancellation=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Conversation history projection: the part of a chat each stage is sent.
+
+A pipeline used to append the whole conversation to every stage's request, so
+a 20-turn chat went out verbatim once per stage. `condense` runs once per
+request, before the stages:
+
+- the last user turn is the request and is always kept verbatim;
+- the turns before it are kept as they are while they total at most
+  `threshold` tokens, and otherwise replaced by a rolling summary, folded
+  into the request turn (a second system message is rejected by chat
+  templates such as Gemma's).
+
+Summaries are incremental and outlive the request. Each is saved in a
+`SummaryStore` under the hash of the conversation prefix it covers, with
+that prefix's length as its watermark; prefix hashes are chained turn by turn,
+so the next request finds the longest summarized prefix of its own history
+and only the turns after the watermark are new. Those stay verbatim while the
+summary plus them fit under `threshold`; past that, the summarizer gets just
+the old summary and the new turns and the result is saved at the new
+watermark. A long classroom chat therefore costs a bounded number of input
+tokens per turn, and one summarizer call every few turns.
+
+The default store is `InMemorySummaryStore`: LRU over
+`PIPELINE_SUMMARY_MAX_ENTRIES` (1024) conversations, each kept for
+`PIPELINE_SUMMARY_TTL_S` (6 h) after it was last saved. A summarizer that
+fails leaves the unsummarized turns verbatim.
+
+`project(condensed, budget)` then trims the condensed history to a stage's
+`input_budget` with `budget.fit`, dropping the oldest turns first and never
+the request itself.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Protocol
+
+from . import metrics
+from .budget import count_messages_tokens, fit
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADING = "Earlier conversation summary:"
+
+
+def _ttl_s() -> float:
+    return float(os.environ.get("PIPELINE_SUMMARY_TTL_S", "21600"))
+
+
+def _max_entries() -> int:
+    return int(os.environ.get("PIPELINE_SUMMARY_MAX_ENTRIES", "1024"))
+
+
+class SummaryStore(Protocol):
+    async def load(self, key: str) -> dict | None:
+        """`{"summary": str, "watermark": int}` saved under `key`, or None."""
+        ...
+
+    async def save(self, key: str, entry: dict) -> None:
+        ...
+
+
+class InMemorySummaryStore:
+    """Summaries in process memory: least recently used evicted first, each for `ttl_s`."""
+
+    def __init__(self, max_entries: int | None = None, ttl_s: float | None = None) -> None:
+        self.max_entries = max_entries if max_entries is not None else _max_entries()
+        self.ttl_s = ttl_s if ttl_s is not None else _ttl_s()
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    async def load(self, key: str) -> dict | None:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        saved_at, entry = item
+        if time.monotonic() - saved_at > self.ttl_s:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return dict(entry)
+
+    async def save(self, key: str, entry: dict) -> None:
+        self._entries[key] = (time.monotonic(), dict(entry))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_store: SummaryStore | None = None
+
+
+def summary_store() -> SummaryStore:
+    """The process-wide default store."""
+    global _store
+    if _store is None:
+        _store = InMemorySummaryStore()
+    return _store
+
+
+def split_request(history: list[dict]) -> tuple[list[dict], dict | None]:
+    """(turns before the last user turn, the last user turn or None)."""
+    for i in range(len(history) - 1, -1, -1):
+        if history[i].get("role") == "user":
+            return history[:i], history[i]
+    return list(history), None
+
+
+def prefix_keys(turns: list[dict]) -> list[str]:
+    """keys[i] identifies turns[: i + 1]; each hash chains the previous one."""
+    keys: list[str] = []
+    previous = ""
+    for m in turns:
+        digest = hashlib.sha256()
+        digest.update(previous.encode())
+        digest.update(f"\0{m.get('role', '')}\0{m.get('content', '')}".encode())
+        previous = digest.hexdigest()
+        keys.append(previous)
+    return keys
+
+
+async def _latest_summary(store: SummaryStore, keys: list[str]) -> tuple[str | None, int]:
+    """The summary of the longest stored prefix and its watermark, or (None, 0)."""
+    for watermark in range(len(keys), 0, -1):
+        entry = await store.load(keys[watermark - 1])
+        if entry and isinstance(entry.get("summary"), str):
+            return entry["summary"], watermark
+    return None, 0
+
+
+async def condense(
+    history: list[dict],
+    *,
+    threshold: int,
+    summarize: Callable[[list[dict]], Awaitable[str]],
+    store: SummaryStore | None = None,
+) -> list[dict]:
+    """`history` with the turns before the request rolled into a summary when they're long.
+
+    `summarize` gets the turns to condense; when an earlier summary exists it
+    comes first, as a system turn, followed by only the turns after it.
+    """
+    earlier, request = split_request(history)
+    if request is None or count_messages_tokens(earlier) <= threshold:
+        return list(history)
+    store = store if store is not None else summary_store()
+    keys = prefix_keys(earlier)
+    summary, watermark = await _latest_summary(store, keys)
+    carried = [{"role": "system", "content": f"{SUMMARY_HEADING}\n{summary}"}] if summary else []
+    pending = earlier[watermark:]
+    if summary is None or count_messages_tokens([*carried, *pending]) > threshold:
+        try:
+            folded = await summarize([*carried, *pending])
+        except Exception:
+            logger.exception("history: summarizing %d turns failed; sending them as-is", len(pending))
+            metrics.incr("history.summary_failed")
+            if summary is None:
+                return list(history)
+        else:
+            metrics.incr("history.summary_folds" if summary else "history.summaries")
+            logger.info(
+                "history: summarized turns %d-%d (~%d tokens in)",
+                watermark,
+                len(earlier),
+                count_messages_tokens([*carried, *pending]),
+            )
+            summary, watermark, pending = folded, len(earlier), []
+            try:
+                await store.save(keys[-1], {"summary": summary, "watermark": watermark})
+            except Exception:
+                logger.exception("history: saving the summary failed")
+    else:
+        metrics.incr("history.summary_hits")
+    metrics.observe("history.unsummarized_turns", len(pending))
+    content = f"{SUMMARY_HEADING}\n{summary}\n\n{request.get('content', '')}"
+    return [*pending, {**request, "content": content}]
+
+
+def project(history: list[dict], budget: int) -> list[dict]:
+    """`history` trimmed oldest-first to `budget` tokens, always keeping the request."""
+    earlier, request = split_request(history)
+    if request is None:
+        return fit(list(history), budget)
+    trailing = history[len(earlier) + 1 :]
+    room = budget - count_messages_tokens([request, *trailing])
+    kept = fit(earlier, room) if room > 0 else [m for m in earlier if m.get("role") == "system"]
+    if len(kept) < len(earlier):
+        metrics.incr("history.trimmed_turns", len(earlier) - len(kept))
+    return [*kept, request, *trailing]
+
+
+__all__ = [
+    "InMemorySummaryStore",
+    "SUMMARY_HEADING",
+    "SummaryStore",
+    "condense",
+    "prefix_keys",
+    "project",
+    "split_request",
+    "summary_store",
+]
@@ -7,13 +7,43 @@ The wire format on both sides is OpenAI-compatible (`messages` in, streamed
 Stages should call `call_llm` / `stream_llm`. Those pick the backend from
 `PIPELINE_LLM_PROVIDER` (default `openai`) and the model from the call's `model`
 arg, falling back to `OPENAI_MODEL` / `SKOLEGPT_MODEL` env vars.
+
+`PIPELINE_LLM_MODE=record|replay` routes both dispatchers through the fixture
+store in `replay.py` — see that module for the offline workflow.
+
+Concurrency: every call (and every stream, for as long as it is open) holds a
+slot in a per-provider limiter, so fan-outs and sharded stages queue instead
+of tripping provider rate limits. The limit is `PIPELINE_<PROVIDER>_CONCURRENCY`
+(e.g. `PIPELINE_OPENAI_CONCURRENCY`), else `PIPELINE_LLM_CONCURRENCY`, else 32
+for OpenAI and 4 for SkoleGPT; 0 means unlimited. Time spent waiting for a
+slot is observed as `llm.<provider>.queue_wait_s`.
+
+Every call/stream function accepts an optional `meta` dict. When given, it is
+filled with the response's `finish_reason` ("stop", "length", ...) and `usage`
+(when the backend reports it), so callers can detect truncation at
+`max_tokens`. For streams it is filled once the stream ends. `call_gemma`
+also sets `first_token_at` (monotonic), since it streams underneath; record
+mode uses it as the fixture's time to first token.
 """
 
+import asyncio
 import json
 import logging
 import os
 import time
-from typing import AsyncIterator
+import weakref
+from contextlib import aclosing, asynccontextmanager
+from typing import Any, AsyncIterator
+
+from . import metrics
+from .replay import (
+    Recorder,
+    default_latency,
+    default_store,
+    find_fixture,
+    llm_mode,
+    replay_tokens,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +61,9 @@ async def stream_gemma(
     *,
     max_tokens: int | None = None,
     temperature: float = 0.7,
+    stop: list[str] | None = None,
+    response_format: dict | None = None,
+    meta: dict | None = None,
 ) -> AsyncIterator[str]:
     """Stream Gemma's response one content delta at a time.
 
@@ -55,6 +88,9 @@ async def stream_gemma(
     }
     if max_tokens is not None:
         payload["max_tokens"] = max_tokens
+    if stop:
+        payload["stop"] = list(stop)
+    _apply_skolegpt_response_format(payload, response_format)
 
     headers = {
         "Content-Type": "application/json",
@@ -91,6 +127,8 @@ async def stream_gemma(
                             f"SkoleGPT stream: failed to parse JSON {data_str[:100]}: {e}"
                         )
                         continue
+                    if meta is not None and data.get("usage"):
+                        meta["usage"] = data["usage"]
                     choices = data.get("choices") or []
                     if not choices:
                         continue
@@ -99,20 +137,52 @@ async def stream_gemma(
                     if content:
                         yield content
                     if choice.get("finish_reason"):
+                        if meta is not None:
+                            meta["finish_reason"] = choice["finish_reason"]
                         return
 
 
+def _apply_skolegpt_response_format(payload: dict, response_format: dict | None) -> None:
+    """Map an OpenAI-style `response_format` onto what SkoleGPT accepts.
+
+    SKOLEGPT_STRUCTURED_OUTPUT picks the mechanism: "off" (default; prompt-only
+    JSON as before), "json_object" (JSON mode), or "guided_json" (vLLM's
+    schema-guided decoding; falls back to JSON mode for schema-less formats).
+    """
+    if not response_format:
+        return
+    mode = os.environ.get("SKOLEGPT_STRUCTURED_OUTPUT", "off").lower()
+    if mode == "json_object":
+        payload["response_format"] = {"type": "json_object"}
+    elif mode == "guided_json":
+        schema = (response_format.get("json_schema") or {}).get("schema")
+        if schema is not None:
+            payload["guided_json"] = schema
+        else:
+            payload["response_format"] = {"type": "json_object"}
+
+
 async def call_gemma(
     messages: list[dict],
     *,
     max_tokens: int | None = None,
     temperature: float = 0.7,
+    stop: list[str] | None = None,
+    response_format: dict | None = None,
+    meta: dict | None = None,
 ) -> str:
     """Call Gemma and return the full response as a single string."""
     chunks: list[str] = []
     async for token in stream_gemma(
-        messages, max_tokens=max_tokens, temperature=temperature
+        messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stop=stop,
+        response_format=response_format,
+        meta=meta,
     ):
+        if not chunks and meta is not None:
+            meta["first_token_at"] = time.monotonic()
         chunks.append(token)
     return "".join(chunks)
 
@@ -120,6 +190,40 @@ async def call_gemma(
 # ---------- OpenAI ----------
 
 
+# (event loop, api key, client). Building an AsyncOpenAI client loads the CA
+# bundle into a fresh SSL context (~40 ms) and opens a new connection pool, so
+# reuse one per loop. Keyed on the loop because httpx pools can't cross loops.
+_openai_client_cache: tuple[Any, str, Any] | None = None
+
+
+def _openai_client() -> Any:
+    global _openai_client_cache
+    from openai import AsyncOpenAI
+
+    api_key = os.environ["OPENAI_API_KEY"]
+    loop = asyncio.get_running_loop()
+    cached = _openai_client_cache
+    if cached is not None and cached[0] is loop and cached[1] == api_key:
+        return cached[2]
+    client = AsyncOpenAI(api_key=api_key)
+    _openai_client_cache = (loop, api_key, client)
+    return client
+
+
+def prewarm() -> None:
+    """Import the HTTP client libraries ahead of the first request.
+
+    `openai` alone takes ~0.7 s to import, and both backends import lazily so
+    that the pipeline package stays importable without them. Call this from a
+    container startup hook so the first LLM call doesn't pay for it.
+    """
+    started = time.monotonic()
+    import aiohttp  # noqa: F401
+    import openai  # noqa: F401
+
+    logger.info("llm.prewarm: imported openai+aiohttp in %.2fs", time.monotonic() - started)
+
+
 def _openai_default_model() -> str:
     return os.environ.get("OPENAI_MODEL", "gpt-5-mini")
 
@@ -130,6 +234,11 @@ def _supports_reasoning_effort(model: str) -> bool:
     return m.startswith(("o1", "o3", "o4", "gpt-5"))
 
 
+def _supports_stop(model: str) -> bool:
+    """Reasoning models (gpt-5/o-series) reject `stop`; older chat models accept it."""
+    return not _supports_reasoning_effort(model)
+
+
 def _default_reasoning_effort() -> str | None:
     """Default reasoning effort for OpenAI calls.
 
@@ -152,6 +261,9 @@ async def call_openai(
     temperature: float | None = None,
     model: str | None = None,
     reasoning_effort: str | None | object = ...,
+    stop: list[str] | None = None,
+    response_format: dict | None = None,
+    meta: dict | None = None,
 ) -> str:
     """Call OpenAI Chat Completions and return the full response as a string.
 
@@ -159,14 +271,13 @@ async def call_openai(
     request when None — gpt-5/o-series only accept the default and reject custom
     values. `reasoning_effort` is sent only for models that support it; pass
     None to suppress, omit to use the default (`PIPELINE_REASONING_EFFORT`).
+    `stop` is likewise dropped for models that reject it.
     """
-    from openai import AsyncOpenAI
-
     actual_model = model or _openai_default_model()
     actual_effort = (
         _default_reasoning_effort() if reasoning_effort is ... else reasoning_effort
     )
-    client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    client = _openai_client()
     kwargs: dict = {
         "model": actual_model,
         "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
@@ -177,6 +288,10 @@ async def call_openai(
         kwargs["temperature"] = temperature
     if actual_effort and _supports_reasoning_effort(actual_model):
         kwargs["reasoning_effort"] = actual_effort
+    if stop and _supports_stop(actual_model):
+        kwargs["stop"] = list(stop)
+    if response_format:
+        kwargs["response_format"] = response_format
 
     logger.info(
         "openai.call: model=%s messages=%d approx_in_tokens=%d max_completion_tokens=%s reasoning_effort=%s",
@@ -199,6 +314,9 @@ async def call_openai(
     elapsed = time.monotonic() - started
     content = completion.choices[0].message.content or ""
     usage = getattr(completion, "usage", None)
+    if meta is not None:
+        meta["finish_reason"] = completion.choices[0].finish_reason
+        meta["usage"] = usage.model_dump() if usage is not None else None
     logger.info(
         "openai.call: done in %.2fs model=%s out_chars=%d usage=%s",
         elapsed,
@@ -217,19 +335,22 @@ async def stream_openai(
     temperature: float | None = None,
     model: str | None = None,
     reasoning_effort: str | None | object = ...,
+    stop: list[str] | None = None,
+    response_format: dict | None = None,
+    meta: dict | None = None,
 ) -> AsyncIterator[str]:
     """Stream OpenAI Chat Completions one content delta at a time."""
-    from openai import AsyncOpenAI
-
     actual_model = model or _openai_default_model()
     actual_effort = (
         _default_reasoning_effort() if reasoning_effort is ... else reasoning_effort
     )
-    client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    client = _openai_client()
     kwargs: dict = {
         "model": actual_model,
         "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
         "stream": True,
+        # Final chunk carries token usage (with empty `choices`).
+        "stream_options": {"include_usage": True},
     }
     if max_tokens is not None:
         kwargs["max_completion_tokens"] = max_tokens
@@ -237,6 +358,10 @@ async def stream_openai(
         kwargs["temperature"] = temperature
     if actual_effort and _supports_reasoning_effort(actual_model):
         kwargs["reasoning_effort"] = actual_effort
+    if stop and _supports_stop(actual_model):
+        kwargs["stop"] = list(stop)
+    if response_format:
+        kwargs["response_format"] = response_format
 
     logger.info(
         "openai.stream: model=%s messages=%d approx_in_tokens=%d reasoning_effort=%s",
@@ -248,19 +373,32 @@ async def stream_openai(
     started = time.monotonic()
     chunks_count = 0
     out_chars = 0
+    stream = None
+    finished = False
     try:
         stream = await client.chat.completions.create(**kwargs)
         async for chunk in stream:
+            if meta is not None and getattr(chunk, "usage", None) is not None:
+                meta["usage"] = chunk.usage.model_dump()
             if not chunk.choices:
                 continue
+            if meta is not None and chunk.choices[0].finish_reason:
+                meta["finish_reason"] = chunk.choices[0].finish_reason
             delta = chunk.choices[0].delta
             if delta and delta.content:
                 chunks_count += 1
                 out_chars += len(delta.content)
                 yield delta.content
+        finished = True
     finally:
+        if stream is not None and not finished:
+            # Consumer went away (or errored) mid-stream: drop the HTTP response
+            # now so OpenAI stops generating, rather than draining it.
+            metrics.incr("llm.stream.aborted")
+            await stream.close()
         logger.info(
-            "openai.stream: done in %.2fs model=%s chunks=%d out_chars=%d",
+            "openai.stream: %s in %.2fs model=%s chunks=%d out_chars=%d",
+            "done" if finished else "aborted",
             time.monotonic() - started,
             actual_model,
             chunks_count,
@@ -268,10 +406,49 @@ async def stream_openai(
         )
 
 
+# ---------- Concurrency limiter ----------
+
+_DEFAULT_CONCURRENCY = {"openai": 32, "skolegpt": 4}
+
+# Semaphores bind to the loop they're first awaited on, so keep one set per loop.
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore | None]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def concurrency_limit(provider: str) -> int:
+    for name in (f"PIPELINE_{provider.upper()}_CONCURRENCY", "PIPELINE_LLM_CONCURRENCY"):
+        value = os.environ.get(name)
+        if value:
+            return int(value)
+    return _DEFAULT_CONCURRENCY.get(provider, 8)
+
+
+def _limiter(provider: str) -> asyncio.Semaphore | None:
+    per_loop = _limiters.setdefault(asyncio.get_running_loop(), {})
+    if provider not in per_loop:
+        limit = concurrency_limit(provider)
+        per_loop[provider] = asyncio.Semaphore(limit) if limit > 0 else None
+    return per_loop[provider]
+
+
+@asynccontextmanager
+async def provider_slot(provider: str):
+    """Hold one of `provider`'s concurrent-request slots for the block."""
+    semaphore = _limiter(provider)
+    if semaphore is None:
+        yield
+        return
+    started = time.monotonic()
+    async with semaphore:
+        metrics.observe(f"llm.{provider}.queue_wait_s", time.monotonic() - started)
+        yield
+
+
 # ---------- Dispatcher ----------
 
 
-def _resolve_provider(provider: str | None, model: str | None) -> str:
+def resolve_provider(provider: str | None, model: str | None) -> str:
     """Per-call provider selection.
 
     Precedence: explicit `provider` arg > `PIPELINE_LLM_PROVIDER` env var > model
@@ -291,6 +468,17 @@ def _resolve_provider(provider: str | None, model: str | None) -> str:
     return "openai"
 
 
+def accepts_reasoning_effort(provider: str | None, model: str | None) -> bool:
+    """Whether a call with this provider/model sends `reasoning_effort` at all.
+
+    SkoleGPT ignores it and `call_openai` drops it for models that reject it,
+    so changing the effort changes nothing for those.
+    """
+    if resolve_provider(provider, model) == "skolegpt":
+        return False
+    return _supports_reasoning_effort(model or _openai_default_model())
+
+
 async def call_llm(
     messages: list[dict],
     *,
@@ -299,26 +487,82 @@ async def call_llm(
     model: str | None = None,
     reasoning_effort: str | None | object = ...,
     provider: str | None = None,
+    stop: list[str] | None = None,
+    response_format: dict | None = None,
+    meta: dict | None = None,
 ) -> str:
     """Provider-agnostic non-streaming call.
 
-    Picks backend via `_resolve_provider` (explicit arg > env var > model autodetect).
+    Picks backend via `resolve_provider` (explicit arg > env var > model autodetect).
+    `stop` sequences are forwarded where the backend accepts them (SkoleGPT,
+    non-reasoning OpenAI models) and silently dropped otherwise.
+    `response_format` (OpenAI shape) is sent to OpenAI as-is; for SkoleGPT see
+    `_apply_skolegpt_response_format`.
     """
-    backend = _resolve_provider(provider, model)
-    logger.info("call_llm: provider=%s model=%s", backend, model)
+    backend = resolve_provider(provider, model)
+    mode = llm_mode()
+    logger.info("call_llm: provider=%s model=%s mode=%s", backend, model, mode)
+    if meta is None:
+        meta = {}
+    async with provider_slot(backend):
+        return await _call_backend(
+            backend,
+            mode,
+            messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            model=model,
+            reasoning_effort=reasoning_effort,
+            stop=stop,
+            response_format=response_format,
+            meta=meta,
+        )
+
+
+async def _call_backend(
+    backend: str,
+    mode: str,
+    messages: list[dict],
+    *,
+    max_tokens: int | None,
+    temperature: float | None,
+    model: str | None,
+    reasoning_effort: str | None | object,
+    stop: list[str] | None,
+    response_format: dict | None,
+    meta: dict,
+) -> str:
+    if mode == "replay":
+        fixture = find_fixture(backend, model, messages, max_tokens)
+        meta.update(finish_reason=fixture.finish_reason, usage=fixture.usage)
+        return "".join([t async for t in replay_tokens(fixture, default_latency())])
+    # Created before the call: its start time is the fixture's latency origin.
+    recorder = Recorder(default_store(), backend, model, messages, max_tokens) if mode == "record" else None
     if backend == "skolegpt":
-        return await call_gemma(
+        content = await call_gemma(
             messages,
             max_tokens=max_tokens,
             temperature=temperature if temperature is not None else 0.7,
+            stop=stop,
+            response_format=response_format,
+            meta=meta,
         )
-    return await call_openai(
-        messages,
-        max_tokens=max_tokens,
-        temperature=temperature,
-        model=model,
-        reasoning_effort=reasoning_effort,
-    )
+    else:
+        content = await call_openai(
+            messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            model=model,
+            reasoning_effort=reasoning_effort,
+            stop=stop,
+            response_format=response_format,
+            meta=meta,
+        )
+    if recorder is not None:
+        # A non-streamed OpenAI reply arrives whole, so its first token is now.
+        recorder.add(content, at=meta.get("first_token_at"))
+        recorder.finish(finish_reason=meta.get("finish_reason"), usage=meta.get("usage"))
+    return content
 
 
 async def stream_llm(
@@ -329,23 +573,82 @@ async def stream_llm(
     model: str | None = None,
     reasoning_effort: str | None | object = ...,
     provider: str | None = None,
+    stop: list[str] | None = None,
+    response_format: dict | None = None,
+    meta: dict | None = None,
 ) -> AsyncIterator[str]:
     """Provider-agnostic streaming call. See `call_llm` for selection rules."""
-    backend = _resolve_provider(provider, model)
-    logger.info("stream_llm: provider=%s model=%s", backend, model)
-    if backend == "skolegpt":
-        async for token in stream_gemma(
-            messages,
-            max_tokens=max_tokens,
-            temperature=temperature if temperature is not None else 0.7,
-        ):
-            yield token
-        return
-    async for token in stream_openai(
+    backend = resolve_provider(provider, model)
+    mode = llm_mode()
+    logger.info("stream_llm: provider=%s model=%s mode=%s", backend, model, mode)
+    if meta is None:
+        meta = {}
+    tokens = _stream_backend(
+        backend,
+        mode,
         messages,
         max_tokens=max_tokens,
         temperature=temperature,
         model=model,
         reasoning_effort=reasoning_effort,
-    ):
-        yield token
+        stop=stop,
+        response_format=response_format,
+        meta=meta,
+    )
+    async with provider_slot(backend), aclosing(tokens):
+        async for token in tokens:
+            yield token
+
+
+async def _stream_backend(
+    backend: str,
+    mode: str,
+    messages: list[dict],
+    *,
+    max_tokens: int | None,
+    temperature: float | None,
+    model: str | None,
+    reasoning_effort: str | None | object,
+    stop: list[str] | None,
+    response_format: dict | None,
+    meta: dict,
+) -> AsyncIterator[str]:
+    if mode == "replay":
+        fixture = find_fixture(backend, model, messages, max_tokens)
+        async for token in replay_tokens(fixture, default_latency()):
+            yield token
+        meta.update(finish_reason=fixture.finish_reason, usage=fixture.usage)
+        return
+    if backend == "skolegpt":
+        tokens = stream_gemma(
+            messages,
+            max_tokens=max_tokens,
+            temperature=temperature if temperature is not None else 0.7,
+            stop=stop,
+            response_format=response_format,
+            meta=meta,
+        )
+    else:
+        tokens = stream_openai(
+            messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            model=model,
+            reasoning_effort=reasoning_effort,
+            stop=stop,
+            response_format=response_format,
+            meta=meta,
+        )
+    # aclosing: when our consumer closes us, close the backend stream (and its
+    # HTTP response) immediately instead of leaving it to the garbage collector.
+    async with aclosing(tokens):
+        if mode != "record":
+            async for token in tokens:
+                yield token
+            return
+        # Only complete streams are recorded; an abandoned one would replay truncated.
+        recorder = Recorder(default_store(), backend, model, messages, max_tokens)
+        async for token in tokens:
+            recorder.add(token)
+            yield token
+        recorder.finish(finish_reason=meta.get("finish_reason"), usage=meta.get("usage"))
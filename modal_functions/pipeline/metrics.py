@@ -0,0 +1,88 @@
+"""In-process metrics: counters, sampled observations, and CPU-time sections.
+
+Deliberately tiny — a module-level registry the pipelines write into and the
+benchmarks (or a debug endpoint) read back with `snapshot()`. Nothing here is
+exported off-box; the numbers live for the lifetime of the container.
+
+`cpu_section(name)` measures process CPU time, which is only meaningful around
+synchronous code (prompt building, parsing, assembly). Don't wrap an `await`.
+"""
+
+import math
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Iterator
+
+# Bound per-name sample memory; percentiles over the most recent window are
+# what matters for a long-lived container.
+_MAX_SAMPLES = 10_000
+
+_counters: dict[str, float] = defaultdict(float)
+_samples: dict[str, deque] = defaultdict(lambda: deque(maxlen=_MAX_SAMPLES))
+_cpu_seconds: dict[str, float] = defaultdict(float)
+_cpu_calls: dict[str, int] = defaultdict(int)
+
+
+def incr(name: str, value: float = 1) -> None:
+    _counters[name] += value
+
+
+def observe(name: str, value: float) -> None:
+    _samples[name].append(value)
+
+
+@contextmanager
+def cpu_section(name: str) -> Iterator[None]:
+    started = time.process_time()
+    try:
+        yield
+    finally:
+        _cpu_seconds[name] += time.process_time() - started
+        _cpu_calls[name] += 1
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]. Returns 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "min": min(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def samples(name: str) -> list[float]:
+    return list(_samples.get(name, ()))
+
+
+def snapshot() -> dict:
+    """Plain-dict view of everything recorded so far (JSON-serializable)."""
+    return {
+        "counters": dict(_counters),
+        "observations": {k: summarize(list(v)) for k, v in _samples.items()},
+        "cpu": {
+            k: {"seconds": _cpu_seconds[k], "calls": _cpu_calls[k]}
+            for k in _cpu_seconds
+        },
+    }
+
+
+def reset() -> None:
+    _counters.clear()
+    _samples.clear()
+    _cpu_seconds.clear()
+    _cpu_calls.clear()
@@ -6,12 +6,20 @@ so the caller can pass the generator straight to a FastAPI StreamingResponse.
 Composition: a FanOut may be placed anywhere inside a Linear's stage list. A FanOut
 as the final stage of a Linear is supported but the assembled output is emitted as
 a single content event rather than streamed token-by-token.
+
+Cancellation: when the consumer goes away (the SSE client disconnects, so the
+server closes the generator or cancels the task driving it), in-flight LLM
+calls are cancelled rather than left to finish. Fan-out work is started as
+tasks and always torn down in a `finally:` via `cancel_pending`, not only on
+`Exception` — GeneratorExit and CancelledError are BaseExceptions.
 """
 
 import asyncio
 import logging
-from typing import AsyncIterator, Callable
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Iterable
 
+from . import metrics
 from .llm import call_llm, stream_llm
 from .sse import content_event, done_event, error_event, progress_event
 from .stage import Scratch, Stage
@@ -19,6 +27,22 @@ from .stage import Scratch, Stage
 logger = logging.getLogger(__name__)
 
 
+async def cancel_pending(tasks: Iterable[asyncio.Task]) -> int:
+    """Cancel every unfinished task and wait for all of them to unwind.
+
+    Safe to call from a `finally:` block of an async generator that is being
+    closed. Finished tasks are awaited too, so their exceptions are retrieved
+    rather than reported as "never retrieved". Returns how many were cancelled.
+    """
+    tasks = list(tasks)
+    pending = [t for t in tasks if not t.done()]
+    for t in pending:
+        t.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return len(pending)
+
+
 class FanOut:
     """Run N stages in parallel against the same scratch, then assemble their outputs.
 
@@ -49,7 +73,14 @@ class FanOut:
             )
             return stage.name, stage.parse(response)
 
-        results = await asyncio.gather(*(run_one(s) for s in self.stages))
+        # Not a bare gather: one failing child would leave its siblings running.
+        tasks = [asyncio.create_task(run_one(s)) for s in self.stages]
+        try:
+            results = [await t for t in tasks]
+        finally:
+            cancelled = await cancel_pending(tasks)
+            if cancelled:
+                metrics.incr("fanout.cancelled_stages", cancelled)
         section_outputs = dict(results)
         for k, v in section_outputs.items():
             scratch.artifacts[k] = v
@@ -80,14 +111,19 @@ class Linear:
                 elif is_final and self.stream_final:
                     messages = stage.build_messages(scratch)
                     chunks: list[str] = []
-                    async for token in stream_llm(
-                        messages,
-                        max_tokens=stage.output_budget,
-                        model=stage.model,
-                        provider=stage.provider,
-                    ):
-                        chunks.append(token)
-                        yield content_event(token)
+                    # aclosing: if our consumer closes us mid-stream, close the
+                    # upstream stream now instead of whenever it is collected.
+                    async with aclosing(
+                        stream_llm(
+                            messages,
+                            max_tokens=stage.output_budget,
+                            model=stage.model,
+                            provider=stage.provider,
+                        )
+                    ) as tokens:
+                        async for token in tokens:
+                            chunks.append(token)
+                            yield content_event(token)
                     scratch.artifacts[stage.name] = stage.parse("".join(chunks))
                 else:
                     messages = stage.build_messages(scratch)
@@ -100,6 +136,10 @@ class Linear:
                     scratch.artifacts[stage.name] = stage.parse(response)
                     yield progress_event(stage.name)
             yield done_event()
+        except (GeneratorExit, asyncio.CancelledError):
+            metrics.incr("pipeline.linear.cancelled")
+            logger.info("Linear.execute: consumer went away, stopping")
+            raise
         except Exception as e:
             logger.exception("Linear.execute: pipeline failed")
             yield error_event(str(e))
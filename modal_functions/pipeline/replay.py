@@ -0,0 +1,344 @@
+"""Record/replay fixtures for LLM calls.
+
+Lets the pipelines run offline: `PIPELINE_LLM_MODE=record` captures every real
+response to a fixture directory, `PIPELINE_LLM_MODE=replay` serves them back
+with a configurable latency model instead of touching the network. The same
+fixture store backs `pipeline.fake_server`, an OpenAI/SkoleGPT-compatible HTTP
+stand-in for exercising the real HTTP clients.
+
+Fixtures are matched first by an exact request key (provider, model, messages,
+max_tokens). On a miss, replay falls back to the stage signature — the last
+`## STAGE: ...` heading in the system prompt — so one recording per stage is
+enough to drive any user prompt through the pipeline. Lookups are deterministic:
+for a given signature the fixture is chosen by hashing the request key.
+
+Env vars:
+    PIPELINE_LLM_MODE         "live" (default) | "record" | "replay"
+    PIPELINE_LLM_FIXTURES     fixture directory (default ./llm_fixtures)
+    PIPELINE_REPLAY_LATENCY   latency spec, see `LatencyModel.from_spec`
+"""
+
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+_STAGE_HEADING = re.compile(r"^## STAGE: (.+)$", re.MULTILINE)
+
+# Replayed content is re-chunked into pieces of this many characters, which is
+# roughly one token each — close enough to how the real streams arrive.
+_CHUNK_CHARS = 4
+
+
+def llm_mode() -> str:
+    return os.environ.get("PIPELINE_LLM_MODE", "live").lower()
+
+
+def fixture_key(
+    provider: str, model: str | None, messages: list[dict], max_tokens: int | None
+) -> str:
+    """Stable hash of everything that determines a response."""
+    canonical = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "messages": [
+                {"role": m.get("role"), "content": m.get("content")} for m in messages
+            ],
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def stage_signature(messages: list[dict]) -> str:
+    """Identify which stage a request came from, independent of the user prompt.
+
+    Uses the last `## STAGE: ...` heading in the system prompt (remix stages
+    carry both the fill and the remix heading; the remix one comes last).
+    Falls back to a hash of the system prompt when there is no heading.
+    """
+    system = "\n".join(
+        m.get("content", "") for m in messages if m.get("role") == "system"
+    )
+    headings = _STAGE_HEADING.findall(system)
+    if headings:
+        return headings[-1].strip()
+    return "system:" + hashlib.sha256(system.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class Fixture:
+    key: str
+    signature: str
+    provider: str
+    model: str | None
+    content: str
+    finish_reason: str | None = "stop"
+    usage: dict | None = None
+    # Observed latencies at record time, used by the "recorded" latency model.
+    ttft_s: float | None = None
+    total_s: float | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "signature": self.signature,
+            "provider": self.provider,
+            "model": self.model,
+            "response": {
+                "content": self.content,
+                "finish_reason": self.finish_reason,
+                "usage": self.usage,
+            },
+            "timing": {"ttft_s": self.ttft_s, "total_s": self.total_s},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Fixture":
+        response = data.get("response") or {}
+        timing = data.get("timing") or {}
+        return cls(
+            key=data["key"],
+            signature=data.get("signature", ""),
+            provider=data.get("provider", "openai"),
+            model=data.get("model"),
+            content=response.get("content", ""),
+            finish_reason=response.get("finish_reason", "stop"),
+            usage=response.get("usage"),
+            ttft_s=timing.get("ttft_s"),
+            total_s=timing.get("total_s"),
+        )
+
+
+class FixtureStore:
+    """A directory of `<key>.json` fixture files, indexed by key and signature."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._by_key: dict[str, Fixture] = {}
+        self._by_signature: dict[str, list[Fixture]] = {}
+        self._loaded = False
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            try:
+                with open(path) as f:
+                    self._index(Fixture.from_dict(json.load(f)))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("replay: skipping unreadable fixture %s: %s", path, e)
+        logger.info(
+            "replay: loaded %d fixtures (%d signatures) from %s",
+            len(self._by_key),
+            len(self._by_signature),
+            self.directory,
+        )
+
+    def _index(self, fixture: Fixture) -> None:
+        if fixture.key not in self._by_key:
+            self._by_signature.setdefault(fixture.signature, []).append(fixture)
+        self._by_key[fixture.key] = fixture
+
+    def lookup(self, key: str, signature: str) -> Fixture | None:
+        self._load()
+        hit = self._by_key.get(key)
+        if hit is not None:
+            return hit
+        candidates = self._by_signature.get(signature)
+        if not candidates:
+            return None
+        return candidates[int(key[:8], 16) % len(candidates)]
+
+    def save(self, fixture: Fixture) -> None:
+        self._load()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{fixture.key}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(fixture.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+        self._index(fixture)
+        logger.info("replay: recorded fixture %s (signature=%r)", path, fixture.signature)
+
+
+@dataclass
+class LatencyModel:
+    """Time-to-first-token distribution plus a steady token rate.
+
+    `ttft` is (kind, params): ("fixed", [s]), ("uniform", [lo, hi]),
+    ("lognormal", [mu, sigma]) in seconds, or ("recorded", []) to reuse the
+    latency observed when the fixture was recorded. `tokens_per_s=0` emits
+    the whole body immediately after the first token.
+    """
+
+    ttft: tuple[str, list[float]] = ("fixed", [0.0])
+    tokens_per_s: float = 0.0
+    seed: int | None = None
+    _rng: random.Random = field(default_factory=random.Random, repr=False)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+
+    @classmethod
+    def from_spec(cls, spec: str | None) -> "LatencyModel":
+        """Parse e.g. `ttft=lognormal:-0.7,0.5;tps=80;seed=1`.
+
+        Empty or missing spec means zero latency.
+        """
+        model = cls()
+        if not spec:
+            return model
+        for part in spec.split(";"):
+            if not part.strip():
+                continue
+            name, _, value = part.partition("=")
+            name = name.strip().lower()
+            value = value.strip()
+            if name == "ttft":
+                kind, _, params = value.partition(":")
+                kind = kind.lower()
+                if kind not in ("fixed", "uniform", "lognormal", "recorded"):
+                    raise ValueError(f"replay: unknown latency distribution {kind!r}")
+                model.ttft = (
+                    kind,
+                    [float(p) for p in params.split(",") if p.strip()],
+                )
+            elif name == "tps":
+                model.tokens_per_s = float(value)
+            elif name == "seed":
+                model.seed = int(value)
+            else:
+                raise ValueError(f"replay: unknown latency option {name!r}")
+        model.__post_init__()
+        return model
+
+    def sample_ttft(self, fixture: Fixture) -> float:
+        kind, params = self.ttft
+        if kind == "uniform":
+            return self._rng.uniform(params[0], params[1])
+        if kind == "lognormal":
+            return self._rng.lognormvariate(params[0], params[1])
+        if kind == "recorded":
+            return fixture.ttft_s or 0.0
+        return params[0] if params else 0.0
+
+    def chunk_delay(self) -> float:
+        if self.tokens_per_s <= 0:
+            return 0.0
+        return 1.0 / self.tokens_per_s
+
+
+def chunk_content(content: str) -> list[str]:
+    return [content[i : i + _CHUNK_CHARS] for i in range(0, len(content), _CHUNK_CHARS)]
+
+
+async def replay_tokens(
+    fixture: Fixture, latency: LatencyModel
+) -> AsyncIterator[str]:
+    """Yield a fixture's content in token-sized chunks on the latency schedule.
+
+    Uses asyncio.sleep throughout, so cancellation behaves like a real stream.
+    """
+    ttft = latency.sample_ttft(fixture)
+    if ttft > 0:
+        await asyncio.sleep(ttft)
+    delay = latency.chunk_delay()
+    for i, chunk in enumerate(chunk_content(fixture.content)):
+        if i and delay:
+            await asyncio.sleep(delay)
+        yield chunk
+
+
+class Recorder:
+    """Accumulates one streamed response and saves it as a fixture when done."""
+
+    def __init__(
+        self,
+        store: FixtureStore,
+        provider: str,
+        model: str | None,
+        messages: list[dict],
+        max_tokens: int | None,
+    ):
+        self.store = store
+        self.provider = provider
+        self.model = model
+        self.key = fixture_key(provider, model, messages, max_tokens)
+        self.signature = stage_signature(messages)
+        self.started = time.monotonic()
+        self.first_token_at: float | None = None
+        self.chunks: list[str] = []
+
+    def add(self, token: str, at: float | None = None) -> None:
+        """Append `token`; `at` is when it arrived (monotonic), if earlier than now."""
+        if self.first_token_at is None:
+            self.first_token_at = at if at is not None else time.monotonic()
+        self.chunks.append(token)
+
+    def finish(
+        self, *, finish_reason: str | None = "stop", usage: dict | None = None
+    ) -> None:
+        ended = time.monotonic()
+        self.store.save(
+            Fixture(
+                key=self.key,
+                signature=self.signature,
+                provider=self.provider,
+                model=self.model,
+                content="".join(self.chunks),
+                finish_reason=finish_reason,
+                usage=usage,
+                ttft_s=(self.first_token_at or ended) - self.started,
+                total_s=ended - self.started,
+            )
+        )
+
+
+_default_store: FixtureStore | None = None
+_default_latency: LatencyModel | None = None
+
+
+def default_store() -> FixtureStore:
+    global _default_store
+    directory = os.environ.get("PIPELINE_LLM_FIXTURES", "llm_fixtures")
+    if _default_store is None or _default_store.directory != directory:
+        _default_store = FixtureStore(directory)
+    return _default_store
+
+
+def default_latency() -> LatencyModel:
+    global _default_latency
+    if _default_latency is None:
+        _default_latency = LatencyModel.from_spec(
+            os.environ.get("PIPELINE_REPLAY_LATENCY")
+        )
+    return _default_latency
+
+
+def find_fixture(
+    provider: str, model: str | None, messages: list[dict], max_tokens: int | None
+) -> Fixture:
+    """Look up the fixture for a request, raising RuntimeError on a miss."""
+    store = default_store()
+    key = fixture_key(provider, model, messages, max_tokens)
+    signature = stage_signature(messages)
+    fixture = store.lookup(key, signature)
+    if fixture is None:
+        raise RuntimeError(
+            f"replay: no fixture for signature {signature!r} in {store.directory}"
+        )
+    return fixture
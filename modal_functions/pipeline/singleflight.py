@@ -0,0 +1,273 @@
+"""Single-flight: identical concurrent requests share one pipeline run.
+
+When a class types the same projected prompt at once, every request after the
+first attaches to the run already in flight instead of starting its own.
+`SingleFlight.stream(key, start)` returns an SSE stream for `key`: the first
+caller starts `start()` in a background task; every caller (first included)
+gets its own queue, pre-filled with the events emitted so far and then fed
+live, so a late or slow subscriber never holds up the others. The run is
+cancelled only when its last subscriber goes away, and the key is released
+when it finishes — this is coalescing, not a cache.
+
+Keys come from `request_key` (normalized messages, model, provider, plus any
+salt such as the prompt-asset hash). Across containers, an optional
+`FlightBackend` decides who leads: the leader publishes every event, the
+others replay them from the backend. `InMemoryFlightBackend` is the stand-in
+used for tests and local runs; a follower that sees nothing from the backend
+for `PIPELINE_SINGLEFLIGHT_IDLE_S` seconds runs the request itself (or errors,
+if it had already started streaming). `PIPELINE_SINGLEFLIGHT=0` turns
+coalescing off.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import AsyncIterator, Callable, Protocol
+
+from . import metrics
+from .sse import error_event
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+def singleflight_enabled() -> bool:
+    return os.environ.get("PIPELINE_SINGLEFLIGHT", "1").lower() not in ("0", "false", "off")
+
+
+def _idle_timeout() -> float:
+    return float(os.environ.get("PIPELINE_SINGLEFLIGHT_IDLE_S", "120"))
+
+
+def request_key(messages: list[dict], model: str | None, provider: str | None, *salt: str) -> str:
+    """Stable key for a request: case- and whitespace-insensitive message text."""
+    normalized = [
+        [str(m.get("role", "")), " ".join(str(m.get("content", "")).split()).casefold()]
+        for m in messages
+        if isinstance(m, dict)
+    ]
+    payload = json.dumps(
+        [normalized, model or "", (provider or "").lower(), list(salt)],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class FlightBackend(Protocol):
+    """Cross-container coordination for `SingleFlight`."""
+
+    async def claim(self, key: str) -> bool:
+        """True if the caller should lead `key` (no live run elsewhere)."""
+        ...
+
+    async def publish(self, key: str, event: str) -> None:
+        ...
+
+    def follow(self, key: str) -> AsyncIterator[str]:
+        """Every event of the live run for `key`, from the first, until it finishes."""
+        ...
+
+    async def finish(self, key: str) -> None:
+        ...
+
+
+class _Log:
+    def __init__(self) -> None:
+        self.events: list[str] = []
+        self.finished = False
+        self.changed = asyncio.Condition()
+
+
+class InMemoryFlightBackend:
+    """`FlightBackend` over process memory — a stand-in for a shared store."""
+
+    def __init__(self) -> None:
+        self._logs: dict[str, _Log] = {}
+
+    async def claim(self, key: str) -> bool:
+        if key in self._logs:
+            return False
+        self._logs[key] = _Log()
+        return True
+
+    async def publish(self, key: str, event: str) -> None:
+        log = self._logs.get(key)
+        if log is None:
+            return
+        async with log.changed:
+            log.events.append(event)
+            log.changed.notify_all()
+
+    async def follow(self, key: str) -> AsyncIterator[str]:
+        log = self._logs.get(key)
+        if log is None:
+            return
+        seen = 0
+        while True:
+            async with log.changed:
+                await log.changed.wait_for(lambda: len(log.events) > seen or log.finished)
+                fresh = log.events[seen:]
+                finished = log.finished
+            seen += len(fresh)
+            for event in fresh:
+                yield event
+            if finished and seen == len(log.events):
+                return
+
+    async def finish(self, key: str) -> None:
+        log = self._logs.pop(key, None)
+        if log is None:
+            return
+        async with log.changed:
+            log.finished = True
+            log.changed.notify_all()
+
+
+class _Flight:
+    """One in-flight run: its event log so far and a queue per subscriber."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.log: list[str] = []
+        self.queues: set[asyncio.Queue] = set()
+        self.finished = False
+        self.task: asyncio.Task | None = None
+
+    def emit(self, event: str) -> None:
+        self.log.append(event)
+        for queue in self.queues:
+            queue.put_nowait(event)
+
+    def close(self) -> None:
+        self.finished = True
+        for queue in self.queues:
+            queue.put_nowait(_END)
+
+    def attach(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.log:
+            queue.put_nowait(event)
+        if self.finished:
+            queue.put_nowait(_END)
+        self.queues.add(queue)
+        return queue
+
+
+class SingleFlight:
+    """Coalesces concurrent runs by key. See the module docstring."""
+
+    def __init__(self, backend: FlightBackend | None = None) -> None:
+        self.backend = backend
+        self._flights: dict[str, _Flight] = {}
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def stream(
+        self, key: str, start: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(key)
+            flight.task = asyncio.create_task(self._run(flight, start))
+            metrics.incr("singleflight.started")
+        else:
+            metrics.incr("singleflight.joined")
+            logger.info("singleflight: joined in-flight run %s (%d events so far)", key[:12], len(flight.log))
+        queue = flight.attach()
+        try:
+            while True:
+                event = await queue.get()
+                if event is _END:
+                    return
+                yield event
+        finally:
+            flight.queues.discard(queue)
+            if not flight.queues and not flight.finished and flight.task is not None:
+                # Last subscriber gone: stop the pipeline like a lone disconnect would.
+                flight.task.cancel()
+
+    async def _run(self, flight: _Flight, start: Callable[[], AsyncIterator[str]]) -> None:
+        backend = self.backend
+        try:
+            if backend is not None and not await backend.claim(flight.key):
+                metrics.incr("singleflight.remote_joined")
+                if await self._follow(flight, backend):
+                    return
+                metrics.incr("singleflight.remote_abandoned")
+                logger.warning("singleflight: remote run %s went quiet, running it here", flight.key[:12])
+                backend = None
+            await self._lead(flight, start, backend)
+        except asyncio.CancelledError:
+            metrics.incr("singleflight.cancelled")
+            raise
+        except Exception as e:
+            logger.exception("singleflight: run %s failed", flight.key[:12])
+            flight.emit(error_event(str(e)))
+        finally:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            flight.close()
+
+    async def _lead(self, flight: _Flight, start, backend: FlightBackend | None) -> None:
+        completed = False
+        try:
+            async for event in start():
+                flight.emit(event)
+                if backend is not None:
+                    await backend.publish(flight.key, event)
+            completed = True
+        finally:
+            if backend is not None:
+                if not completed:
+                    await backend.publish(flight.key, error_event("The shared generation run stopped."))
+                await backend.finish(flight.key)
+
+    async def _follow(self, flight: _Flight, backend: FlightBackend) -> bool:
+        """Relay the remote run. False if it produced nothing before going quiet."""
+        events = backend.follow(flight.key).__aiter__()
+        timeout = _idle_timeout()
+        while True:
+            try:
+                event = await asyncio.wait_for(events.__anext__(), timeout)
+            except StopAsyncIteration:
+                return bool(flight.log)
+            except asyncio.TimeoutError:
+                if not flight.log:
+                    return False
+                flight.emit(error_event("The shared generation run stopped responding."))
+                return True
+            flight.emit(event)
+
+
+_default: SingleFlight | None = None
+
+
+def single_flight() -> SingleFlight:
+    """The process-wide in-memory `SingleFlight`."""
+    global _default
+    if _default is None:
+        _default = SingleFlight()
+    return _default
+
+
+def coalesce(key: str, start: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """`single_flight().stream(key, start)`, or just `start()` when coalescing is off."""
+    if not singleflight_enabled():
+        return start()
+    return single_flight().stream(key, start)
+
+
+__all__ = [
+    "FlightBackend",
+    "InMemoryFlightBackend",
+    "SingleFlight",
+    "coalesce",
+    "request_key",
+    "single_flight",
+    "singleflight_enabled",
+]
@@ -24,6 +24,19 @@ def error_event(message: str) -> str:
     return f"data: {json.dumps({'type': 'error', 'error': message})}\n\n"
 
 
+def run_event(run_id: str) -> str:
+    """Names the run so a failed stream can be resumed (`resume_run_id`)."""
+    return f"data: {json.dumps({'type': 'run', 'run_id': run_id})}\n\n"
+
+
+def stage_failed_event(stage: str, error: str, run_id: str | None = None) -> str:
+    """A stage gave up; the config ships without its slice. Resuming `run_id` re-runs it."""
+    payload: dict = {"type": "stage_failed", "stage": stage, "error": error}
+    if run_id is not None:
+        payload["run_id"] = run_id
+    return f"data: {json.dumps(payload)}\n\n"
+
+
 def progress_event(
     stage: str, status: str = "done", *, label: str | None = None
 ) -> str:
@@ -17,6 +17,14 @@ class Scratch:
     artifacts: dict[str, Any] = field(default_factory=dict)
     meta: dict[str, Any] = field(default_factory=dict)
 
+    def checkpoint(self) -> dict[str, Any]:
+        """JSON-serializable state to resume from: history and artifacts (not meta)."""
+        return {"history": self.history, "artifacts": self.artifacts}
+
+    @classmethod
+    def from_checkpoint(cls, data: dict[str, Any]) -> "Scratch":
+        return cls(history=list(data.get("history") or []), artifacts=dict(data.get("artifacts") or {}))
+
 
 class Stage:
     """Base class for a single LLM step.
@@ -24,8 +32,9 @@ class Stage:
     Subclasses set `name` and override `build_messages`. They may override `parse`
     to post-process the model's text response before it is stored in scratch.
 
-    `output_budget` is passed to the LLM as max_tokens. `input_budget` is advisory —
-    stages can use it inside `build_messages` to trim history (see budget.fit).
+    `output_budget` is passed to the LLM as max_tokens. `input_budget` caps the
+    conversation history a stage sends; stages apply it inside `build_messages`
+    (see history.project).
     """
 
     name: str = "stage"
@@ -37,6 +46,35 @@ class Stage:
     # (PIPELINE_REASONING_EFFORT env var, falling back to "low"). Set to e.g.
     # "minimal" on a router stage so reasoning doesn't eat the output budget.
     reasoning_effort: str | None = None
+    # Forwarded as the request's `stop` where the provider accepts it (see
+    # call_llm); an empty tuple sends none.
+    stop_sequences: tuple[str, ...] = ()
+    # When True, runners that support it stream the response and end the request
+    # as soon as `parse` would have everything it needs (see sim_pipeline/_runner.py).
+    early_stop: bool = False
+    # Extra attempts after a failed call, for runners that retry (see
+    # sim_pipeline/_runner.py). None means PIPELINE_STAGE_RETRIES.
+    max_retries: int | None = None
+
+    def compile(self, scratch: Scratch) -> Any:
+        """Deterministic replacement for the LLM call.
+
+        Return the artifact to store under `name`, or None to call the LLM. Only
+        runners that support it check this (see sim_pipeline/_runner.py).
+        """
+        return None
+
+    def usage_units(self, scratch: Scratch) -> int:
+        """How many output items this call will produce, e.g. objects to fill.
+
+        Observed output tokens are normalised by it, so budgets learned from
+        small scenes scale to large ones (see pipeline/usage.py).
+        """
+        return 1
+
+    def response_format(self) -> dict | None:
+        """OpenAI-style `response_format` for this stage's calls, or None for free text."""
+        return None
 
     def build_messages(self, scratch: Scratch) -> list[dict]:
         raise NotImplementedError(f"{self.__class__.__name__}.build_messages")
@@ -0,0 +1,194 @@
+"""Per-stage output budgets learned from observed token usage.
+
+Hand-picked `output_budget`s are either too tight (a truncation, then a
+continuation round trip) or too loose (a large max_tokens the provider has to
+schedule for). Runners that support it (see sim_pipeline/_runner.py) call
+`record_usage` after each LLM stage and `tuned` before the next one:
+
+- every call records its visible output tokens divided by the stage's
+  `usage_units` (objects, intents, ...) and, when the provider reported them,
+  its reasoning tokens — keyed by stage and reasoning effort, in a rolling
+  window of `PIPELINE_USAGE_WINDOW` (500) calls per key;
+- once a key has `PIPELINE_AUTOBUDGET_MIN_SAMPLES` (20) calls, the budget is
+  `PIPELINE_AUTOBUDGET_HEADROOM` (1.3) × (p99 output per unit × this request's
+  units + p99 reasoning), clamped to `PIPELINE_AUTOBUDGET_MIN`/`_MAX`
+  (512/16000). Early-stopped streams (the default) never see the usage
+  chunk, so until reasoning has been observed
+  `PIPELINE_AUTOBUDGET_REASONING_RESERVE` (1000) stands in for it — and since
+  that is a guess, the budget is then never set below the stage's static
+  `output_budget`; only measured reasoning lets it go lower;
+- before then the stage's own `output_budget` is used.
+
+`PIPELINE_BUDGET_OVERRIDES` names a JSON file ops can edit to pin values,
+re-read when it changes:
+
+    {"controls": {"output_budget": 3000, "reasoning_effort": "low"}}
+
+A pinned `output_budget` beats the learned one; a pinned `reasoning_effort`
+applies when the stage (or a cascade tier) doesn't set its own. Effort is
+only ever pinned, never learned: lowering it trades quality, not just tokens.
+`PIPELINE_AUTOBUDGET=0` keeps the static budgets (overrides still apply).
+Statistics live for the lifetime of the process, like `metrics`.
+"""
+
+import copy
+import json
+import logging
+import math
+import os
+from collections import defaultdict, deque
+from typing import Any
+
+from . import metrics
+from .budget import count_tokens
+from .stage import Scratch, Stage
+
+logger = logging.getLogger(__name__)
+
+
+def autobudget_enabled() -> bool:
+    return os.environ.get("PIPELINE_AUTOBUDGET", "1").lower() not in ("0", "false", "off")
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, str(default)))
+
+
+def _headroom() -> float:
+    return float(os.environ.get("PIPELINE_AUTOBUDGET_HEADROOM", "1.3"))
+
+
+class UsageStats:
+    """Rolling per-(stage, effort) output and reasoning samples."""
+
+    def __init__(self, window: int | None = None) -> None:
+        self.window = window if window is not None else _env_int("PIPELINE_USAGE_WINDOW", 500)
+        self._output: dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._reasoning: dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, key: str, output_per_unit: float, reasoning: int | None) -> None:
+        self._output[key].append(output_per_unit)
+        if reasoning is not None:
+            self._reasoning[key].append(reasoning)
+
+    def budget(self, key: str, units: int, floor: int | None = None) -> int | None:
+        """Learned budget for `units` items, or None with too few samples.
+
+        `floor` bounds it from below unless reasoning usage has been measured.
+        """
+        min_samples = _env_int("PIPELINE_AUTOBUDGET_MIN_SAMPLES", 20)
+        output = list(self._output.get(key, ()))
+        if len(output) < min_samples:
+            return None
+        reasoning = list(self._reasoning.get(key, ()))
+        measured = len(reasoning) >= min_samples
+        if measured:
+            reserve = metrics.percentile(reasoning, 99)
+        else:
+            reserve = _env_int("PIPELINE_AUTOBUDGET_REASONING_RESERVE", 1000)
+        wanted = _headroom() * (metrics.percentile(output, 99) * max(1, units) + reserve)
+        low = _env_int("PIPELINE_AUTOBUDGET_MIN", 512)
+        if floor is not None and not measured:
+            low = max(low, floor)
+        high = _env_int("PIPELINE_AUTOBUDGET_MAX", 16000)
+        return min(high, max(low, math.ceil(wanted)))
+
+
+_stats: UsageStats | None = None
+_overrides: tuple[tuple[str, float], dict] | None = None
+
+
+def usage_stats() -> UsageStats:
+    global _stats
+    if _stats is None:
+        _stats = UsageStats()
+    return _stats
+
+
+def budget_overrides() -> dict[str, dict]:
+    """The `PIPELINE_BUDGET_OVERRIDES` file, re-read when its mtime changes."""
+    global _overrides
+    path = os.environ.get("PIPELINE_BUDGET_OVERRIDES")
+    if not path:
+        return {}
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if _overrides is None or _overrides[0] != (path, mtime):
+        try:
+            with open(path) as f:
+                loaded = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("usage: ignoring budget overrides %s (%s)", path, e)
+            loaded = {}
+        if not isinstance(loaded, dict):
+            loaded = {}
+        _overrides = ((path, mtime), {k: v for k, v in loaded.items() if isinstance(v, dict)})
+    return _overrides[1]
+
+
+def _key(name: str, effort: str | None) -> str:
+    return f"{name}:{effort or 'default'}"
+
+
+def tuned(stage: Stage, scratch: Scratch) -> Stage:
+    """`stage`, or a copy with its pinned or learned budget and pinned effort applied."""
+    pinned = budget_overrides().get(stage.name) or {}
+    effort = stage.reasoning_effort or pinned.get("reasoning_effort")
+    budget = pinned.get("output_budget")
+    if not isinstance(budget, int) and autobudget_enabled():
+        budget = usage_stats().budget(
+            _key(stage.name, effort), stage.usage_units(scratch), floor=stage.output_budget
+        )
+    if not isinstance(budget, int):
+        budget = stage.output_budget
+    if (budget, effort) == (stage.output_budget, stage.reasoning_effort):
+        return stage
+    metrics.observe(f"stage.{stage.name}.tuned_output_budget", budget)
+    logger.info(
+        "usage[%s]: output_budget %d → %d, effort %s → %s",
+        stage.name,
+        stage.output_budget,
+        budget,
+        stage.reasoning_effort,
+        effort,
+    )
+    return _with(stage, output_budget=budget, reasoning_effort=effort)
+
+
+def _with(stage: Stage, **changes: Any) -> Stage:
+    changed = copy.copy(stage)
+    for name, value in changes.items():
+        setattr(changed, name, value)
+    return changed
+
+
+def record_usage(stage: Stage, scratch: Scratch, response: str, metas: list[dict]) -> None:
+    """Record one finished stage call (all its continuations) from the runner's `meta`s."""
+    usages = [m.get("usage") for m in metas]
+    reasoning: int | None = None
+    if usages and all(isinstance(u, dict) for u in usages):
+        completion = sum(int(u.get("completion_tokens") or 0) for u in usages)
+        reasoning = sum(
+            int((u.get("completion_tokens_details") or {}).get("reasoning_tokens") or 0)
+            for u in usages
+        )
+        output = max(1, completion - reasoning)
+    else:
+        output = count_tokens(response)
+    units = max(1, stage.usage_units(scratch))
+    usage_stats().record(_key(stage.name, stage.reasoning_effort), output / units, reasoning)
+    metrics.observe(f"stage.{stage.name}.output_tokens", output)
+    if reasoning is not None:
+        metrics.observe(f"stage.{stage.name}.reasoning_tokens", reasoning)
+
+
+__all__ = [
+    "UsageStats",
+    "autobudget_enabled",
+    "budget_overrides",
+    "record_usage",
+    "tuned",
+    "usage_stats",
+]
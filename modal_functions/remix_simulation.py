@@ -9,30 +9,28 @@ frontend can re-call /generate.
 
 Wire format on the response stream (extends the /generate format):
 
+    data: {"type":"run","run_id":"<id>"}\n\n
     data: {"type":"progress","stage":"router|objects|controls|graphs|outputs","status":"started|done","label":"..."}\n\n
     data: {"type":"plan","fills":[...],"total_stages":N}\n\n           # NEW — once, after router
     data: {"type":"fallback","reason":"..."}\n\n                       # NEW — instead of plan/content for skeleton edits
+    data: {"type":"stage_failed","stage":"<id>","error":"...","run_id":"<id>"}\n\n   # keeps the parent's slice
     data: {"type":"content","content":"<stringified SimulationConfig JSON>"}\n\n
     data: {"type":"done"}\n\n
 
-On failure, a single `{"type":"error","error":"..."}` event closes the stream.
+On failure, a single `{"type":"error","error":"..."}` event closes the stream;
+posting again (same parent_json) with `"resume_run_id": "<id>"` re-runs only
+the stages that had not finished.
 """
 
 import logging
 import os
 
 import modal
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
 
+# Only `modal` is imported at module load: this file is also imported locally by
+# `modal deploy`, and inside the container everything else is imported (and
+# snapshotted) by the `@modal.enter` hook below, before the first request.
 
-# Configure root logging once at import time so every module's `logging.getLogger(__name__)`
-# inherits a useful format. Modal captures stdout/stderr — INFO+ goes to the function logs.
-logging.basicConfig(
-    level=os.environ.get("LOG_LEVEL", "INFO"),
-    format="%(asctime)s %(levelname)s %(name)s :: %(message)s",
-)
 logger = logging.getLogger("remix_simulation")
 
 
@@ -50,89 +48,144 @@ _sim_pipeline_remix_local_dir = os.path.join(_current_dir, "sim_pipeline_remix")
 
 image = (
     modal.Image.debian_slim()
-    .pip_install("openai", "aiohttp", "fastapi[standard]")
-    .add_local_file(local_path=_schema_local_path, remote_path="/root/simulation_schema.json")
-    .add_local_file(local_path=_instructions_local_path, remote_path="/root/gist_instructions.py")
+    .pip_install("openai", "aiohttp", "fastapi[standard]", "fastjsonschema", "numpy")
+    .add_local_file(
+        local_path=_schema_local_path, remote_path="/root/simulation_schema.json", copy=True
+    )
+    .add_local_file(
+        local_path=_instructions_local_path, remote_path="/root/gist_instructions.py", copy=True
+    )
     .add_local_file(
         local_path=_renderables_manifest_local_path,
         remote_path="/root/renderables_manifest.json",
+        copy=True,
+    )
+    .add_local_dir(local_path=_pipeline_local_dir, remote_path="/root/pipeline", copy=True)
+    .add_local_dir(
+        local_path=_sim_pipeline_local_dir, remote_path="/root/sim_pipeline", copy=True
     )
-    .add_local_dir(local_path=_pipeline_local_dir, remote_path="/root/pipeline")
-    .add_local_dir(local_path=_sim_pipeline_local_dir, remote_path="/root/sim_pipeline")
     .add_local_dir(
         local_path=_sim_pipeline_remix_local_dir,
         remote_path="/root/sim_pipeline_remix",
+        copy=True,
+    )
+    # Sources are copied into the image (copy=True) rather than mounted so this
+    # build step can see them: it renders every static prompt block once, at
+    # build time, into an importable module (see sim_pipeline/prompt_artifacts.py).
+    .run_commands(
+        "cd /root && python -m sim_pipeline.prompt_artifacts --out /root/_prompt_artifacts.py"
     )
 )
 
 
-web_app = FastAPI()
-web_app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=False,
-    allow_methods=["POST", "OPTIONS"],
-    allow_headers=["*"],
-    expose_headers=["Content-Type"],
-)
-
+def _configure_logging() -> None:
+    # Root logging for the container, so every module's `logging.getLogger(__name__)`
+    # inherits a useful format. Modal captures stdout/stderr — INFO+ goes to the function logs.
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO"),
+        format="%(asctime)s %(levelname)s %(name)s :: %(message)s",
+    )
 
-@web_app.post("/")
-async def remix_endpoint(request: dict):
-    """
-    Expected payload:
-    {
-        "messages":    [{"role": "user", "content": "<edit prompt>"}],
-        "parent_json": {<full SimulationConfig of the parent simulation>},
-        "model":       "gpt-5-mini" | "skolegpt-v3" | ...,
-        "provider":    "openai" | "skolegpt"   // optional; auto-detected from model when omitted
-    }
 
-    Returns: text/event-stream of SSE events (see module docstring).
-    """
+def create_web_app():
+    """Build the FastAPI app. Called once per container from the enter hook."""
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, StreamingResponse
     from sim_pipeline_remix import run_remix_pipeline_sse
 
-    messages = request.get("messages", [])
-    parent_json = request.get("parent_json")
-    model = request.get("model")
-    provider = request.get("provider")
+    web_app = FastAPI()
+    web_app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=False,
+        allow_methods=["POST", "OPTIONS"],
+        allow_headers=["*"],
+        expose_headers=["Content-Type"],
+    )
 
-    if not messages:
-        return JSONResponse(content={"error": "No messages provided"}, status_code=400)
-    if not isinstance(parent_json, dict):
-        return JSONResponse(
-            content={"error": "parent_json (object) is required"}, status_code=400
+    @web_app.post("/")
+    async def remix_endpoint(request: dict):
+        """
+        Expected payload:
+        {
+            "messages":    [{"role": "user", "content": "<edit prompt>"}],
+            "parent_json": {<full SimulationConfig of the parent simulation>},
+            "model":       "gpt-5-mini" | "skolegpt-v3" | ...,
+            "provider":    "openai" | "skolegpt",  // optional; auto-detected from model when omitted
+            "resume_run_id": "<id>"                // optional; the `run` event of a failed stream
+        }
+
+        Returns: text/event-stream of SSE events (see module docstring).
+        """
+        messages = request.get("messages", [])
+        parent_json = request.get("parent_json")
+        model = request.get("model")
+        provider = request.get("provider")
+        resume_run_id = request.get("resume_run_id")
+
+        if not messages:
+            return JSONResponse(content={"error": "No messages provided"}, status_code=400)
+        if not isinstance(parent_json, dict):
+            return JSONResponse(
+                content={"error": "parent_json (object) is required"}, status_code=400
+            )
+        if not model:
+            return JSONResponse(content={"error": "model is required"}, status_code=400)
+
+        logger.info(
+            "remix.endpoint: incoming (provider=%s model=%s n_messages=%d parent_objects=%d last_user_chars=%d)",
+            provider,
+            model,
+            len(messages),
+            len(parent_json.get("objects") or []),
+            len((messages[-1] or {}).get("content", "")),
         )
-    if not model:
-        return JSONResponse(content={"error": "model is required"}, status_code=400)
-
-    logger.info(
-        "remix.endpoint: incoming (provider=%s model=%s n_messages=%d parent_objects=%d last_user_chars=%d)",
-        provider,
-        model,
-        len(messages),
-        len(parent_json.get("objects") or []),
-        len((messages[-1] or {}).get("content", "")),
-    )
 
-    return StreamingResponse(
-        run_remix_pipeline_sse(messages, parent_json, model=model, provider=provider),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",  # disable proxy buffering so events flush in real time
-        },
-    )
+        return StreamingResponse(
+            run_remix_pipeline_sse(
+                messages,
+                parent_json,
+                model=model,
+                provider=provider,
+                resume_run_id=str(resume_run_id) if resume_run_id else None,
+            ),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",  # disable proxy buffering so events flush in real time
+            },
+        )
+
+    return web_app
 
 
-@app.function(
+@app.cls(
     image=image,
     secrets=[
         modal.Secret.from_name("gist-openai-key"),
         modal.Secret.from_name("gist-skolegpt-key"),
     ],
     timeout=600,
+    enable_memory_snapshot=True,
 )
-@modal.asgi_app()
-def fastapi_app():
-    return web_app
+class RemixSimulation:
+    @modal.enter(snap=True)
+    def prewarm(self):
+        """Pay import and cache-loading costs at container start, not on the first request.
+
+        Runs before the memory snapshot is taken, so restored containers start
+        with openai/aiohttp imported and the schema/manifest prompt blocks built.
+        """
+        _configure_logging()
+        from pipeline.llm import prewarm
+        from sim_pipeline._context import warm_caches
+
+        prewarm()
+        warm_caches()
+        self.web_app = create_web_app()
+
+    # The label keeps the pre-existing `...--gist-remix-simulation-fastapi-app.modal.run` URL.
+    @modal.asgi_app(label="gist-remix-simulation-fastapi-app")
+    def fastapi_app(self):
+        return self.web_app
@@ -4,43 +4,85 @@ Two public entry points:
 
 - `run_sim_pipeline(messages, model)` — non-streaming. Drains the pipeline
   internally and returns the assembled SimulationConfig dict. Useful for tests
-  and any one-shot caller.
+  and any one-shot caller. Raises `PipelineRunError` (with the `run_id` to
+  resume) on failure.
 
 - `run_sim_pipeline_sse(messages, model)` — async generator yielding SSE-shaped
   strings. Emits a `progress` event (status="started") at the top of each stage
   and (status="done") when each stage finishes, then a single `content` event
-  containing the assembled config JSON, then a `done` event. The four detail
-  stages run concurrently and emit `done` events in completion order.
+  containing the assembled config JSON, then a `done` event. The detail
+  stages run concurrently and emit `done` events in completion order; for
+  small scenes the ones that need the LLM are fused into a single call
+  (`details_fill`), which emits each slice's events when it finishes. For
+  large scenes the objects and controls fills are split into concurrent
+  shards and merged by id (`sharding`); their events are unchanged.
+
+Long chats are condensed once per request before the stages run: turns
+before the request past `PIPELINE_HISTORY_SUMMARY_TOKENS` are rolled into a
+summary that is cached across requests and extended incrementally (see
+`pipeline.history`). Each stage then sends that history trimmed to its own
+`input_budget`.
+
+Both take `resume_run_id`: every finished stage is checkpointed under the
+run id announced by the first (`run`) event, and a resumed run re-executes
+only the stages whose artifacts are missing (see `pipeline.checkpoint`).
+
+Fill stages first run on a cheaper model configuration and escalate to the
+requested one only when their slice fails local checks (`cascade`). Every
+stage is retried within its retry budget (`run_stage_with_retries`). A
+detail stage that still fails doesn't sink the request: it gets a
+`stage_failed` event instead of `done`, the config ships with that slice
+empty, and the run's checkpoint is kept so resuming it fills in just that
+slice. Skeleton or objects failing still fails the request.
 
 Wire-format envelope downstream callers can rely on:
+    run      → {type: "run", run_id}
     progress → {type: "progress", stage, status, label?}
     content  → {type: "content", content: <stringified SimulationConfig JSON>}
     done     → {type: "done"}
     error    → {type: "error", error: <message>}
+    stage_failed → {type: "stage_failed", stage, error, run_id}
 """
 
 import asyncio
 import json
 import logging
+import os
 import time
 from typing import AsyncIterator
 
 from pipeline import (
+    Checkpointer,
+    PipelineRunError,
     Scratch,
     Stage,
     call_llm,
+    cancel_pending,
     content_event,
     done_event,
     error_event,
+    metrics,
     progress_event,
+    run_event,
+    stage_failed_event,
 )
+from pipeline.budget import fit
+from pipeline.history import condense
+
+from gist_instructions import history_summary_prompt  # type: ignore[import-not-found]
 
 from .assemble import assemble_simulation_config
 from .controls_fill import ControlsFillStage
+from .details_fill import DetailsFillStage, detail_shape, scene_size
 from .graphs_fill import GraphsFillStage
+from .manifest_index import correct_objects
 from .objects_fill import ObjectsFillStage
 from .outputs_fill import OutputsFillStage
+from .overlap import separate_objects
+from .presim import refine_config
+from .sharding import run_sharded
 from .skeleton import SkeletonStage
+from .validate import errors_by_stage, repair_rounds, repair_slices, validate_config
 
 logger = logging.getLogger(__name__)
 
@@ -66,62 +108,93 @@ def _build_stages(
         OutputsFillStage(),
     ]
     for s in (*sequential, *parallel):
-        if model:
-            s.model = model
-        if provider:
-            s.provider = provider
+        _configure(s, model, provider)
     return sequential, parallel
 
 
-async def _run_stage(stage: Stage, scratch: Scratch) -> None:
-    """Build messages, call the LLM, parse the response into scratch.artifacts."""
-    started = time.monotonic()
-    logger.info(
-        "stage[%s]: building messages (provider=%s model=%s output_budget=%d)",
-        stage.name,
-        stage.provider,
-        stage.model,
-        stage.output_budget,
-    )
-    messages = stage.build_messages(scratch)
-    logger.info(
-        "stage[%s]: dispatching to LLM (n_messages=%d, system_chars=%d)",
-        stage.name,
-        len(messages),
-        len(messages[0]["content"]) if messages else 0,
-    )
-    llm_kwargs: dict = {
-        "max_tokens": stage.output_budget,
-        "model": stage.model,
-        "provider": stage.provider,
-    }
-    if stage.reasoning_effort is not None:
-        llm_kwargs["reasoning_effort"] = stage.reasoning_effort
-    response = await call_llm(messages, **llm_kwargs)
-    logger.info(
-        "stage[%s]: LLM returned %d chars in %.2fs",
-        stage.name,
-        len(response),
-        time.monotonic() - started,
+def _configure(stage: Stage, model: str | None, provider: str | None) -> Stage:
+    if model:
+        stage.model = model
+    if provider:
+        stage.provider = provider
+    return stage
+
+
+def _history_threshold() -> int:
+    return int(os.environ.get("PIPELINE_HISTORY_SUMMARY_TOKENS", "1500"))
+
+
+# Most of a transcript the summarizer is shown; older turns are dropped first.
+_SUMMARY_INPUT_BUDGET = 12000
+
+
+async def _condense_history(scratch: Scratch, model: str | None, provider: str | None) -> None:
+    """Store the condensed conversation the stages project from in scratch.meta["history"]."""
+
+    async def summarize(turns: list[dict]) -> str:
+        transcript = "\n\n".join(
+            f"{m.get('role')}: {m.get('content')}" for m in fit(turns, _SUMMARY_INPUT_BUDGET)
+        )
+        return await call_llm(
+            [
+                {"role": "system", "content": history_summary_prompt.strip()},
+                {"role": "user", "content": transcript},
+            ],
+            max_tokens=400,
+            model=model,
+            provider=provider,
+            reasoning_effort="minimal",
+        )
+
+    scratch.meta["history"] = await condense(
+        scratch.history, threshold=_history_threshold(), summarize=summarize
     )
-    scratch.artifacts[stage.name] = stage.parse(response)
+
+
+def _record_detail_shape(shape: str, units: list[Stage], scratch: Scratch, wall_s: float) -> None:
+    """What the detail phase cost in this shape, for tuning `detail_shape`."""
+    prompt_chars = scratch.meta.get("prompt_chars") or {}
+    llm_units = [s.name for s in units if s.name in prompt_chars]
+    chars = sum(prompt_chars[name] for name in llm_units)
+    metrics.incr(f"pipeline.sim.details.{shape}")
+    metrics.observe(f"pipeline.sim.details.{shape}.wall_s", wall_s)
+    metrics.observe(f"pipeline.sim.details.{shape}.llm_calls", len(llm_units))
+    metrics.observe(f"pipeline.sim.details.{shape}.prompt_chars", chars)
     logger.info(
-        "stage[%s]: complete in %.2fs total",
-        stage.name,
-        time.monotonic() - started,
+        "sim_pipeline: details shape=%s took %.2fs, llm_calls=%d prompt_chars=%d",
+        shape,
+        wall_s,
+        len(llm_units),
+        chars,
     )
 
 
+def _assemble(artifacts: dict) -> dict:
+    with metrics.cpu_section("assemble"):
+        config = assemble_simulation_config(artifacts)
+    # Repaired objects come back unchecked; correct_objects is idempotent.
+    correct_objects(config.get("objects"), config.get("environment") or {})
+    # Push apart objects that would spawn overlapping or off the canvas.
+    separate_objects(config)
+    # Fit graph ranges and slider bounds to a quick headless run of the scene.
+    refine_config(config)
+    return config
+
+
 async def run_sim_pipeline(
     messages: list[dict],
     model: str | None = None,
     *,
     provider: str | None = None,
+    resume_run_id: str | None = None,
 ) -> dict:
     """Non-streaming convenience wrapper: drain the SSE generator and return the config dict."""
     config: dict | None = None
     error: str | None = None
-    async for event in run_sim_pipeline_sse(messages, model=model, provider=provider):
+    run_id: str | None = None
+    async for event in run_sim_pipeline_sse(
+        messages, model=model, provider=provider, resume_run_id=resume_run_id
+    ):
         # Pull the assembled config out of the content event when we see it.
         # Each event is a `data: {...}\n\n` SSE frame.
         if event.startswith("data: "):
@@ -135,12 +208,14 @@ async def run_sim_pipeline(
                     config = json.loads(obj.get("content", ""))
                 except json.JSONDecodeError:
                     config = None
+            elif obj.get("type") == "run":
+                run_id = obj.get("run_id")
             elif obj.get("type") == "error":
                 error = obj.get("error", "unknown error")
     if error:
-        raise RuntimeError(error)
+        raise PipelineRunError(error, run_id)
     if config is None:
-        raise RuntimeError("sim_pipeline: pipeline finished without emitting a config")
+        raise PipelineRunError("sim_pipeline: pipeline finished without emitting a config", run_id)
     return config
 
 
@@ -149,15 +224,20 @@ async def run_sim_pipeline_sse(
     model: str | None = None,
     *,
     provider: str | None = None,
+    resume_run_id: str | None = None,
 ) -> AsyncIterator[str]:
     """Yield SSE events while the pipeline runs.
 
     Detail stages run concurrently; their `done` events are emitted in
-    completion order via asyncio.as_completed.
+    completion order via asyncio.as_completed. With `resume_run_id`, stages
+    checkpointed by that run are skipped (their progress events still fire).
     """
     sequential, parallel = _build_stages(model, provider=provider)
-    scratch = Scratch()
-    scratch.history = list(messages)
+    checkpoints = Checkpointer("sim")
+    scratch = await checkpoints.restore(resume_run_id)
+    if scratch is None:
+        scratch = Scratch()
+        scratch.history = list(messages)
 
     pipeline_started = time.monotonic()
     logger.info(
@@ -170,50 +250,121 @@ async def run_sim_pipeline_sse(
     )
 
     try:
+        yield run_event(checkpoints.run_id)
+        await _condense_history(scratch, model, provider)
+
         # ---- Sequential stages: skeleton, then objects ----
         for stage in sequential:
             label = STAGE_LABELS.get(stage.name, stage.name)
+            if stage.name in scratch.artifacts:
+                logger.info("sim_pipeline: stage %s restored from checkpoint", stage.name)
+                yield progress_event(stage.name, status="done", label=label)
+                continue
             logger.info("sim_pipeline: → entering stage %s (%s)", stage.name, label)
             yield progress_event(stage.name, status="started", label=label)
-            await _run_stage(stage, scratch)
+            await run_sharded(stage, scratch)
+            if stage.name == "objects":
+                # Before the detail stages read them: sprites and sizes the client can use.
+                objects = (scratch.artifacts.get("objects") or {}).get("objects")
+                skeleton = scratch.artifacts.get("skeleton") or {}
+                correct_objects(objects, skeleton.get("environment") or {})
+            await checkpoints.save(scratch)
             yield progress_event(stage.name, status="done", label=label)
             logger.info("sim_pipeline: ← exited stage %s", stage.name)
 
         # ---- Parallel detail stages: emit started for all, then done in completion order ----
+        to_run = [s for s in parallel if s.name not in scratch.artifacts]
+        for stage in parallel:
+            if stage not in to_run:
+                logger.info("sim_pipeline: stage %s restored from checkpoint", stage.name)
+                yield progress_event(
+                    stage.name, status="done", label=STAGE_LABELS.get(stage.name, stage.name)
+                )
+        # Small scenes fill the slices that need the LLM in one fused call.
+        shape, fused = detail_shape(to_run, scratch)
+        units: list[Stage] = [s for s in to_run if s not in fused]
+        slices_of: dict[str, list[str]] = {s.name: [s.name] for s in units}
+        if fused:
+            details = _configure(DetailsFillStage([s.name for s in fused]), model, provider)
+            units.append(details)
+            slices_of[details.name] = details.slices
+        n_objects, n_intents = scene_size(scratch)
         logger.info(
-            "sim_pipeline: launching %d detail stages in parallel: %s",
-            len(parallel),
-            [s.name for s in parallel],
+            "sim_pipeline: launching %d detail stages in parallel: %s (shape=%s objects=%d intents=%d)",
+            len(units),
+            [s.name for s in units],
+            shape,
+            n_objects,
+            n_intents,
         )
-        for stage in parallel:
+        for stage in to_run:
             label = STAGE_LABELS.get(stage.name, stage.name)
             yield progress_event(stage.name, status="started", label=label)
 
-        async def run_named(stage: Stage) -> str:
-            await _run_stage(stage, scratch)
-            return stage.name
+        async def run_named(stage: Stage) -> tuple[str, Exception | None]:
+            try:
+                await run_sharded(stage, scratch)
+            except Exception as e:
+                return stage.name, e
+            if isinstance(stage, DetailsFillStage):
+                stage.distribute(scratch)
+            await checkpoints.save(scratch)
+            return stage.name, None
 
-        pending = {asyncio.create_task(run_named(s)): s for s in parallel}
+        failed: set[str] = set()
+        details_started = time.monotonic()
+        pending = {asyncio.create_task(run_named(s)): s for s in units}
         try:
             for fut in asyncio.as_completed(list(pending.keys())):
-                name = await fut
-                logger.info("sim_pipeline: parallel stage %s finished", name)
-                yield progress_event(
-                    name, status="done", label=STAGE_LABELS.get(name, name)
-                )
-        except Exception:
-            # Cancel any still-pending detail tasks so they don't keep running.
-            for t in pending:
-                if not t.done():
-                    t.cancel()
-            raise
+                unit, exc = await fut
+                for name in slices_of[unit]:
+                    if exc is not None:
+                        logger.error(
+                            "sim_pipeline: parallel stage %s failed, shipping without it: %s",
+                            name,
+                            exc,
+                        )
+                        failed.add(name)
+                        yield stage_failed_event(name, str(exc), checkpoints.run_id)
+                        continue
+                    logger.info("sim_pipeline: parallel stage %s finished", name)
+                    yield progress_event(
+                        name, status="done", label=STAGE_LABELS.get(name, name)
+                    )
+        finally:
+            # Not just on Exception: a client disconnect arrives here as
+            # GeneratorExit/CancelledError and must stop the siblings too.
+            await cancel_pending(pending)
+        if units:
+            _record_detail_shape(shape, units, scratch, time.monotonic() - details_started)
 
         # ---- Assemble & emit final config ----
         logger.info(
             "sim_pipeline: all stages complete in %.2fs, assembling SimulationConfig",
             time.monotonic() - pipeline_started,
         )
-        config = assemble_simulation_config(scratch.artifacts)
+        config = _assemble(scratch.artifacts)
+
+        # ---- Validate; re-run only the stages whose slices fail the schema ----
+        # Failed stages have no slice to repair; resuming the run retries them.
+        fill_stages = {s.name: s for s in (*sequential, *parallel) if s.name not in failed}
+        errors = validate_config(config)
+        for _ in range(repair_rounds()):
+            owned = errors_by_stage(errors)
+            to_repair = [fill_stages[name] for name in owned if name in fill_stages]
+            if not to_repair:
+                break
+            logger.warning("sim_pipeline: schema errors, repairing %s: %s", list(errors), errors)
+            for stage in to_repair:
+                yield progress_event(stage.name, status="started", label=f"Fixing {stage.name}")
+            await repair_slices(to_repair, scratch, owned)
+            await checkpoints.save(scratch)
+            for stage in to_repair:
+                yield progress_event(stage.name, status="done", label=f"Fixing {stage.name}")
+            config = _assemble(scratch.artifacts)
+            errors = validate_config(config)
+        if errors:
+            logger.warning("sim_pipeline: shipping config with schema errors: %s", errors)
         logger.info(
             "sim_pipeline: assembled config: title=%r objects=%d controls=%d graphs=%d outputs=%d",
             config.get("title"),
@@ -222,14 +373,35 @@ async def run_sim_pipeline_sse(
             len(config.get("graphs", [])),
             len(config.get("outputs", [])),
         )
-        yield content_event(json.dumps(config))
+        with metrics.cpu_section("json_dumps"):
+            config_json = json.dumps(config)
+        yield content_event(config_json)
         yield done_event()
+        if failed:
+            metrics.incr("pipeline.sim.partial")
+            logger.warning(
+                "sim_pipeline: shipped without %s; resume run_id=%s to fill them in",
+                sorted(failed),
+                checkpoints.run_id,
+            )
+        else:
+            await checkpoints.discard()
+        metrics.observe("pipeline.sim.wall_s", time.monotonic() - pipeline_started)
         logger.info(
             "sim_pipeline: done in %.2fs total", time.monotonic() - pipeline_started
         )
+    except (GeneratorExit, asyncio.CancelledError):
+        metrics.incr("pipeline.sim.cancelled")
+        logger.info(
+            "sim_pipeline: client went away after %.2fs, cancelled in-flight stages",
+            time.monotonic() - pipeline_started,
+        )
+        raise
     except Exception as e:
         logger.exception(
-            "sim_pipeline: failed after %.2fs", time.monotonic() - pipeline_started
+            "sim_pipeline: failed after %.2fs (resume with run_id=%s)",
+            time.monotonic() - pipeline_started,
+            checkpoints.run_id,
         )
         yield error_event(str(e))
 
@@ -239,9 +411,11 @@ __all__ = [
     "run_sim_pipeline_sse",
     "assemble_simulation_config",
     "STAGE_LABELS",
+    "validate_config",
     "SkeletonStage",
     "ObjectsFillStage",
     "ControlsFillStage",
+    "DetailsFillStage",
     "GraphsFillStage",
     "OutputsFillStage",
 ]
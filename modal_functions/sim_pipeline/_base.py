@@ -8,13 +8,15 @@ so we tolerate the same kinds of stray prose / code fences.
 
 import json
 import logging
+import os
 import re
 from typing import Any
 
-from pipeline import Scratch, Stage
+from pipeline import Scratch, Stage, metrics
+from pipeline.history import project
 
 from gist_instructions import shared_preamble  # type: ignore[import-not-found]
-from ._context import schema_block
+from ._context import precomputed_system_prompt, schema_block, slice_schema
 
 logger = logging.getLogger(__name__)
 
@@ -76,6 +78,80 @@ def extract_json(text: str) -> Any:
     )
 
 
+class JsonObjectTracker:
+    """Incremental twin of `extract_json` for streamed responses.
+
+    `feed` each chunk as it arrives. It returns True once the text so far holds
+    a balanced top-level {...} block that parses — the object `extract_json`
+    would pick from the full response — so the caller can stop reading and
+    hand `text` (everything up to and including the closing brace) to `parse`.
+    Uses the same string/escape rules as `extract_json`; a balanced block that
+    doesn't parse is skipped, as there.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[str] = []
+        self._offset = 0  # absolute index of the next char to scan
+        self._start = -1  # absolute index of the current candidate's "{"
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.end: int | None = None  # absolute index of the closing "}" once found
+
+    @property
+    def done(self) -> bool:
+        return self.end is not None
+
+    @property
+    def text(self) -> str:
+        full = "".join(self._chunks)
+        return full if self.end is None else full[: self.end + 1]
+
+    def feed(self, chunk: str) -> bool:
+        if self.end is not None:
+            return True
+        base = self._offset
+        self._chunks.append(chunk)
+        self._offset += len(chunk)
+        for k, ch in enumerate(chunk):
+            if self._start < 0:
+                if ch == "{":
+                    self._start = base + k
+                    self._depth = 1
+                continue
+            if self._escape:
+                self._escape = False
+                continue
+            if ch == "\\":
+                self._escape = True
+                continue
+            if ch == '"':
+                self._in_string = not self._in_string
+                continue
+            if self._in_string:
+                continue
+            if ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    end = base + k
+                    candidate = "".join(self._chunks)[self._start : end + 1]
+                    self._start = -1
+                    try:
+                        json.loads(candidate)
+                    except json.JSONDecodeError:
+                        continue
+                    self.end = end
+                    return True
+        return False
+
+
+def structured_output_enabled() -> bool:
+    """Opt-in provider-enforced JSON (`PIPELINE_STRUCTURED_OUTPUT=1`)."""
+    return os.environ.get("PIPELINE_STRUCTURED_OUTPUT", "0").lower() in ("1", "true", "on")
+
+
 class JsonStage(Stage):
     """A pipeline Stage whose response is parsed as JSON.
 
@@ -84,14 +160,55 @@ class JsonStage(Stage):
     `build_user_messages(scratch)` to return the per-stage user/assistant turns.
 
     The system prompt is composed as: shared_preamble + stage_fragment +
-    schema_block + (optional `extra_blocks(scratch)` — used by the renderables
-    stage to attach the manifest).
+    schema_block (together `static_system_prompt`, precomputed at image build
+    time) + (optional `extra_blocks(scratch)` — used by the skeleton and objects
+    stages to attach the svg names relevant to the request).
+
+    Responses are streamed through a `JsonObjectTracker` and the upstream
+    request is ended at the first complete object (`early_stop`).
+
+    With `PIPELINE_STRUCTURED_OUTPUT=1` the request also carries a
+    `response_format`: a JSON Schema cut from the SimulationConfig schema for
+    stages that emit one top-level slice (`schema_slice_key`), plain JSON mode
+    otherwise. `parse` tries a direct `json.loads` first either way and falls
+    back to `extract_json`.
     """
 
     stage_fragment: str = ""
+    # Top-level SimulationConfig key this stage emits as `{ "<key>": [...] }`;
+    # None for stages whose output shape isn't part of the schema.
+    schema_slice_key: str | None = None
+    # Skeleton lists whose combined length is the stage's `usage_units` (one
+    # output entry per item); empty for a stage whose output doesn't scale.
+    usage_keys: tuple[str, ...] = ()
+    # Everything after the first parseable object is discarded by `parse`, so
+    # stop the request there. No `stop` sequence: a fence sequence also matches
+    # the opening fence of "Here is the JSON:\n```json\n{...}" and would end the
+    # response before the object; the tracker stops after it instead.
+    early_stop = True
+
+    def usage_units(self, scratch: Scratch) -> int:
+        skeleton = scratch.artifacts.get("skeleton")
+        if not self.usage_keys or not isinstance(skeleton, dict):
+            return 1
+        return max(1, sum(len(skeleton.get(key) or []) for key in self.usage_keys))
+
+    def static_system_prompt(self) -> str:
+        """The request-independent part of the system prompt.
+
+        Served from the build-time artifacts when present (see
+        `prompt_artifacts.py`), so overrides must not depend on instance state.
+        """
+        cls = type(self)
+        precomputed = precomputed_system_prompt(f"{cls.__module__}.{cls.__qualname__}")
+        if precomputed is not None:
+            return precomputed
+        return "\n\n".join(
+            [shared_preamble.strip(), self.stage_fragment.strip(), schema_block()]
+        )
 
     def system_prompt(self, scratch: Scratch) -> str:
-        parts = [shared_preamble.strip(), self.stage_fragment.strip(), schema_block()]
+        parts = [self.static_system_prompt()]
         extra = self.extra_blocks(scratch)
         if extra:
             parts.append(extra)
@@ -100,27 +217,63 @@ class JsonStage(Stage):
     def extra_blocks(self, scratch: Scratch) -> str:
         return ""
 
+    def history(self, scratch: Scratch) -> list[dict]:
+        """The conversation for this stage: condensed by the pipeline, fit to `input_budget`."""
+        return project(scratch.meta.get("history") or scratch.history, self.input_budget)
+
     def build_user_messages(self, scratch: Scratch) -> list[dict]:
-        # Default: pass through whatever the caller stored on scratch.history.
-        return list(scratch.history)
+        # Default: pass through the conversation the caller stored on scratch.
+        return self.history(scratch)
+
+    def response_format(self) -> dict | None:
+        if not structured_output_enabled():
+            return None
+        if self.schema_slice_key is None:
+            return {"type": "json_object"}
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": f"{self.schema_slice_key}_slice",
+                "schema": slice_schema(self.schema_slice_key),
+                # Strict mode requires every property to be required and
+                # rejects oneOf; the schema uses both, so enforce shape only.
+                "strict": False,
+            },
+        }
 
     def build_messages(self, scratch: Scratch) -> list[dict]:
-        return [
+        messages = [
             {"role": "system", "content": self.system_prompt(scratch)},
             *self.build_user_messages(scratch),
         ]
+        repair = (scratch.meta.get("repair") or {}).get(self.name)
+        if repair:
+            messages.extend(self.repair_turns(repair["previous"], repair["errors"]))
+        return messages
+
+    def repair_turns(self, previous: str, errors: list[str]) -> list[dict]:
+        """Correction turns for a slice that failed schema validation (see validate.py)."""
+        key = self.schema_slice_key or self.name
+        listed = "\n".join(f"- {e}" for e in errors)
+        return [
+            {"role": "assistant", "content": previous},
+            {
+                "role": "user",
+                "content": (
+                    f"That output failed schema validation:\n{listed}\n\n"
+                    f"Return the full corrected {{ \"{key}\": [...] }} object. Fix "
+                    "only what the errors point at and keep everything else as it was."
+                ),
+            },
+        ]
 
     def parse(self, response: str) -> Any:
-        try:
-            value = extract_json(response)
-        except ValueError:
-            logger.exception(
-                "%s.parse: extract_json failed (response %d chars, preview=%r)",
-                self.name,
-                len(response),
-                response[:300],
-            )
-            raise
+        value = _loads_object(response)
+        if value is not None:
+            metrics.incr("parse.fast_path")
+        else:
+            metrics.incr("parse.extract_fallback")
+            value = self._extract(response)
         size_summary: str
         if isinstance(value, dict):
             size_summary = f"dict keys={list(value.keys())}"
@@ -130,3 +283,30 @@ class JsonStage(Stage):
             size_summary = f"{type(value).__name__}"
         logger.info("%s.parse: extracted %s", self.name, size_summary)
         return value
+
+    def _extract(self, response: str) -> Any:
+        try:
+            with metrics.cpu_section("extract_json"):
+                return extract_json(response)
+        except ValueError:
+            logger.exception(
+                "%s.parse: extract_json failed (response %d chars, preview=%r)",
+                self.name,
+                len(response),
+                response[:300],
+            )
+            raise
+
+
+def _loads_object(response: str) -> dict | None:
+    """Fast path: the whole response is one JSON object (structured output, or a
+    model that followed the "ONLY valid JSON" instruction). None otherwise."""
+    text = response.strip()
+    if not text.startswith("{"):
+        return None
+    try:
+        with metrics.cpu_section("json_loads"):
+            value = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
@@ -2,6 +2,13 @@
 
 Both files ship into the Modal container under /root via add_local_file. When
 running locally (e.g. for unit tests), fall back to repo-relative paths.
+
+In the container the rendered blocks come precomputed from `_prompt_artifacts`
+(written at image build time by `prompt_artifacts.py`); locally they are
+rendered from the files on first use. The precomputed module is only trusted
+when its `CONTENT_HASH` matches the files actually shipped — an image rebuilt
+with a new schema or manifest but a stale `_prompt_artifacts` falls back to
+rendering at runtime, with a warning.
 """
 
 import json
@@ -46,6 +53,92 @@ def _manifest_path() -> str:
     return path
 
 
+# Generated by `python -m sim_pipeline.prompt_artifacts` during the image build.
+# `False` means "looked, not there or stale" (local runs), so we only try once.
+_artifacts_module = None
+_prompt_asset_hash_cache: str | None = None
+
+
+def _artifacts():
+    global _artifacts_module, _prompt_asset_hash_cache
+    if _artifacts_module is None:
+        try:
+            import _prompt_artifacts  # type: ignore[import-not-found]
+        except ImportError:
+            _artifacts_module = False
+            return None
+        from .prompt_artifacts import content_hash
+
+        current = content_hash()
+        _prompt_asset_hash_cache = current
+        if _prompt_artifacts.CONTENT_HASH != current:
+            logger.warning(
+                "context: precomputed prompt artifacts are stale (hash=%s, files=%s); rendering at runtime",
+                _prompt_artifacts.CONTENT_HASH[:12],
+                current[:12],
+            )
+            _artifacts_module = False
+        else:
+            _artifacts_module = _prompt_artifacts
+            logger.info("context: using precomputed prompt artifacts (hash=%s)", current[:12])
+    return _artifacts_module or None
+
+
+def render_schema_block() -> str:
+    """Read and format the schema. Minified: the indentation was ~25% of its tokens."""
+    with open(_schema_path()) as f:
+        schema = json.load(f)
+    return (
+        "## JSON SCHEMA (full SimulationConfig — your output is a slice of this)\n\n"
+        "```json\n"
+        + json.dumps(schema, separators=(",", ":"), ensure_ascii=False)
+        + "\n```"
+    )
+
+
+def render_manifest_names_block() -> str:
+    from .manifest_index import manifest_index
+
+    lines = [f"- {e.name} — {e.display_name}" for e in manifest_index()]
+    return (
+        "## AVAILABLE SVGs\n\n"
+        "Pick the object's `svg` field verbatim from the left-hand identifier. "
+        "Do not invent names. Each entry's collider shape and visual sprite "
+        "are bundled together — choose by real-world resemblance to the user's "
+        "request (e.g. `soccer_ball`, `brick_block`, `boat`).\n\n"
+        + "\n".join(lines)
+    )
+
+
+_schema_cache: dict | None = None
+
+
+def load_schema() -> dict:
+    """The parsed SimulationConfig schema (loaded once per process)."""
+    global _schema_cache
+    if _schema_cache is None:
+        with open(_schema_path()) as f:
+            _schema_cache = json.load(f)
+    return _schema_cache
+
+
+_slice_schema_cache: dict[str, dict] = {}
+
+
+def slice_schema(key: str) -> dict:
+    """JSON Schema for a stage's `{ "<key>": [...] }` output, cut from the full schema."""
+    cached = _slice_schema_cache.get(key)
+    if cached is None:
+        cached = {
+            "type": "object",
+            "properties": {key: load_schema()["properties"][key]},
+            "required": [key],
+            "additionalProperties": False,
+        }
+        _slice_schema_cache[key] = cached
+    return cached
+
+
 _schema_block_cache: str | None = None
 _manifest_names_block_cache: str | None = None
 
@@ -54,11 +147,9 @@ def schema_block() -> str:
     """Return the SimulationConfig JSON Schema, formatted for inclusion in a system prompt."""
     global _schema_block_cache
     if _schema_block_cache is None:
-        with open(_schema_path()) as f:
-            schema = json.load(f)
+        artifacts = _artifacts()
         _schema_block_cache = (
-            "## JSON SCHEMA (full SimulationConfig — your output is a slice of this)\n\n"
-            "```json\n" + json.dumps(schema, indent=2) + "\n```"
+            artifacts.SCHEMA_BLOCK if artifacts else render_schema_block()
         )
     return _schema_block_cache
 
@@ -72,23 +163,50 @@ def manifest_names_block() -> str:
     """
     global _manifest_names_block_cache
     if _manifest_names_block_cache is None:
-        with open(_manifest_path()) as f:
-            manifest = json.load(f)
-        lines = []
-        for item in manifest.get("items", []):
-            if item.get("status") != "approved":
-                continue
-            name = item.get("name")
-            display = item.get("display_name", name)
-            if not name:
-                continue
-            lines.append(f"- {name} — {display}")
+        artifacts = _artifacts()
         _manifest_names_block_cache = (
-            "## AVAILABLE SVGs\n\n"
-            "Pick the object's `svg` field verbatim from the left-hand identifier. "
-            "Do not invent names. Each entry's collider shape and visual sprite "
-            "are bundled together — choose by real-world resemblance to the user's "
-            "request (e.g. `soccer_ball`, `brick_block`, `boat`).\n\n"
-            + "\n".join(lines)
+            artifacts.MANIFEST_NAMES_BLOCK
+            if artifacts
+            else render_manifest_names_block()
         )
     return _manifest_names_block_cache
+
+
+def precomputed_system_prompt(stage_key: str) -> str | None:
+    """Build-time static system prompt for a stage (`module.QualName`), if any."""
+    artifacts = _artifacts()
+    if not artifacts:
+        return None
+    return artifacts.SYSTEM_PROMPTS.get(stage_key)
+
+
+def prompt_asset_hash() -> str:
+    """Content hash of the schema, manifest and prompt fragments.
+
+    Hashed from the files once (also when checking the precomputed artifacts).
+    """
+    global _prompt_asset_hash_cache
+    if _prompt_asset_hash_cache is None:
+        _artifacts()
+        if _prompt_asset_hash_cache is None:
+            from .prompt_artifacts import content_hash
+
+            _prompt_asset_hash_cache = content_hash()
+    return _prompt_asset_hash_cache
+
+
+def warm_caches() -> None:
+    """Populate the prompt-block caches (and compile the schema validators)
+    ahead of the first request.
+
+    Meant for container startup hooks; otherwise the first request on every
+    container pays for loading the blocks.
+    """
+    schema_block()
+    manifest_names_block()
+    prompt_asset_hash()
+    from .svg_retrieval import svg_retriever
+    from .validate import compiled_validators
+
+    compiled_validators()
+    svg_retriever()
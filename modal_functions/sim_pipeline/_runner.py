@@ -0,0 +1,339 @@
+"""Stage runner shared by the sim and remix pipelines.
+
+`run_stage` builds a stage's messages, calls the LLM, and parses the response
+into `scratch.artifacts[stage.name]`. Stages with `early_stop` set (every
+JsonStage) are run over `stream_llm` through a `JsonObjectTracker`: the
+upstream request is closed as soon as the first complete, parseable object has
+arrived, so trailing prose or a second block is never generated. The output
+tokens left unspent are logged and recorded per stage.
+
+`PIPELINE_EARLY_STOP=0` falls back to plain `call_llm`. Early stop is also off
+in `PIPELINE_LLM_MODE=record`, so fixtures hold complete responses (replays
+still stop early).
+
+Truncation: when a response ends with finish_reason "length" before the object
+is complete, the runner sends a continuation request (the partial output as an
+assistant turn plus an instruction to carry on) and stitches the result onto
+the partial, trimming any text the model repeats. At most
+`PIPELINE_MAX_CONTINUATIONS` (default 2) are sent per stage; the count per run
+is observed as `stage.<name>.continuations`.
+
+Stages whose `compile` returns an artifact (graphs and outputs, see
+`compile_slices`) skip the LLM entirely, except when being repaired.
+
+Budgets: before each LLM call the stage's `output_budget` (and a pinned
+`reasoning_effort`) come from `pipeline.usage.tuned`, and the call's token
+usage is recorded afterwards, so budgets follow what each stage actually
+spends.
+
+Retries: `run_stage_with_retries` re-runs a stage that raised, up to
+`stage.max_retries` (default `PIPELINE_STAGE_RETRIES`, 1) extra attempts with
+a doubling `PIPELINE_STAGE_RETRY_BACKOFF_S` pause, then re-raises. The
+pipelines use it for every stage; a detail stage that still fails is reported
+with a `stage_failed` event and its slice ships empty.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from contextlib import aclosing
+
+from pipeline import Scratch, Stage, call_llm, count_tokens, metrics, stream_llm
+from pipeline.replay import llm_mode
+from pipeline.usage import record_usage, tuned
+
+from ._base import JsonObjectTracker
+
+logger = logging.getLogger(__name__)
+
+CONTINUE_PROMPT = (
+    "Your previous reply was cut off at the output limit. Continue it from "
+    "exactly the next character: no repetition, no preamble, no code fences."
+)
+
+# How much of a continuation is buffered before aligning it with the partial
+# output, and the shortest repeated run treated as overlap rather than chance.
+_OVERLAP_WINDOW = 200
+_MIN_OVERLAP = 8
+_LEADING_FENCE = re.compile(r"^\s*```(?:json)?[ \t]*\n?", re.IGNORECASE)
+
+
+def _max_continuations() -> int:
+    return int(os.environ.get("PIPELINE_MAX_CONTINUATIONS", "2"))
+
+
+def _stage_retries(stage: Stage) -> int:
+    if stage.max_retries is not None:
+        return stage.max_retries
+    return int(os.environ.get("PIPELINE_STAGE_RETRIES", "1"))
+
+
+def _retry_backoff_s() -> float:
+    return float(os.environ.get("PIPELINE_STAGE_RETRY_BACKOFF_S", "0.5"))
+
+
+def _early_stop_enabled(stage: Stage) -> bool:
+    if not stage.early_stop:
+        return False
+    if os.environ.get("PIPELINE_EARLY_STOP", "1").lower() in ("0", "false", "off"):
+        return False
+    return llm_mode() != "record"
+
+
+def stitch_continuation(partial: str, continuation: str) -> tuple[str, bool]:
+    """Align a continuation with the partial output it resumes.
+
+    Returns (text_to_append, restarted). Drops a re-opened code fence and the
+    longest run the model repeated from the end of `partial`. `restarted` is
+    True when the model ignored the instruction and started the object over;
+    the continuation then replaces the partial instead of extending it.
+    """
+    text = _LEADING_FENCE.sub("", continuation, count=1)
+    head = _LEADING_FENCE.sub("", partial, count=1).lstrip()[:_OVERLAP_WINDOW]
+    if head.startswith("{") and text.lstrip().startswith(head[: max(_MIN_OVERLAP, 40)]):
+        return text.lstrip(), True
+    for k in range(min(len(partial), len(text), _OVERLAP_WINDOW), _MIN_OVERLAP - 1, -1):
+        if partial.endswith(text[:k]):
+            return text[k:], False
+    return text, False
+
+
+def _continuation_messages(messages: list[dict], partial: str) -> list[dict]:
+    if not partial:
+        # Reasoning ate the whole budget before any output: just ask again.
+        return messages
+    return [
+        *messages,
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUE_PROMPT},
+    ]
+
+
+async def _stream_into(
+    tracker: JsonObjectTracker, messages: list[dict], llm_kwargs: dict, meta: dict
+) -> JsonObjectTracker:
+    """Stream one request into `tracker`, stopping once it holds a complete object.
+
+    A continuation is buffered until it can be aligned with the tracker's text
+    (see `stitch_continuation`); on a restart a fresh tracker is returned.
+    """
+    partial = tracker.text
+    buffered: str | None = "" if partial else None
+    # aclosing: breaking out closes stream_llm, which closes the HTTP response.
+    async with aclosing(stream_llm(messages, **llm_kwargs, meta=meta)) as tokens:
+        async for token in tokens:
+            if buffered is not None:
+                buffered += token
+                if len(buffered) < _OVERLAP_WINDOW:
+                    continue
+                token, restarted = stitch_continuation(partial, buffered)
+                buffered = None
+                if restarted:
+                    tracker = JsonObjectTracker()
+            if tracker.feed(token):
+                return tracker
+    if buffered:
+        token, restarted = stitch_continuation(partial, buffered)
+        if restarted:
+            tracker = JsonObjectTracker()
+        tracker.feed(token)
+    return tracker
+
+
+async def _stream_until_complete(
+    stage: Stage, messages: list[dict], llm_kwargs: dict, log_prefix: str, metas: list[dict]
+) -> str:
+    tracker = JsonObjectTracker()
+    continuations = 0
+    request = messages
+    while True:
+        meta: dict = {}
+        metas.append(meta)
+        tracker = await _stream_into(tracker, request, llm_kwargs, meta)
+        if tracker.done or not _should_continue(stage, meta, continuations, log_prefix):
+            break
+        continuations += 1
+        request = _continuation_messages(messages, tracker.text)
+    _record_continuations(stage, continuations)
+    response = tracker.text
+    if tracker.done:
+        emitted = count_tokens(response)
+        unspent = max(0, stage.output_budget - emitted)
+        metrics.incr("stage.early_stops")
+        metrics.observe(f"stage.{stage.name}.unspent_output_tokens", unspent)
+        logger.info(
+            "%s[%s]: early stop at %d chars (~%d tokens); up to %d of %d output tokens not generated",
+            log_prefix,
+            stage.name,
+            len(response),
+            emitted,
+            unspent,
+            stage.output_budget,
+        )
+    return response
+
+
+async def _call_with_continuations(
+    stage: Stage, messages: list[dict], llm_kwargs: dict, log_prefix: str, metas: list[dict]
+) -> str:
+    continuations = 0
+    request = messages
+    response = ""
+    while True:
+        meta: dict = {}
+        metas.append(meta)
+        piece = await call_llm(request, **llm_kwargs, meta=meta)
+        if continuations == 0:
+            response = piece
+        else:
+            tail, restarted = stitch_continuation(response, piece)
+            response = tail if restarted else response + tail
+        if not _should_continue(stage, meta, continuations, log_prefix):
+            break
+        continuations += 1
+        request = _continuation_messages(messages, response)
+    _record_continuations(stage, continuations)
+    return response
+
+
+def _should_continue(stage: Stage, meta: dict, continuations: int, log_prefix: str) -> bool:
+    if meta.get("finish_reason") != "length":
+        return False
+    if continuations >= _max_continuations():
+        logger.warning(
+            "%s[%s]: still truncated after %d continuation(s), giving up",
+            log_prefix,
+            stage.name,
+            continuations,
+        )
+        return False
+    logger.warning(
+        "%s[%s]: hit output_budget=%d (finish_reason=length), requesting continuation %d",
+        log_prefix,
+        stage.name,
+        stage.output_budget,
+        continuations + 1,
+    )
+    return True
+
+
+def _record_continuations(stage: Stage, continuations: int) -> None:
+    metrics.observe(f"stage.{stage.name}.continuations", continuations)
+    if continuations:
+        metrics.incr("stage.continuations", continuations)
+
+
+async def run_stage(stage: Stage, scratch: Scratch, *, log_prefix: str = "stage") -> None:
+    """Build messages, call the LLM, parse the response into scratch.artifacts."""
+    started = time.monotonic()
+    # A repair means the compiled slice failed validation: let the LLM fix it.
+    if not scratch.meta.get("repair", {}).get(stage.name):
+        with metrics.cpu_section("compile"):
+            compiled = stage.compile(scratch)
+        if compiled is not None:
+            scratch.artifacts[stage.name] = compiled
+            metrics.incr("stage.compiled")
+            metrics.incr(f"stage.{stage.name}.compiled")
+            logger.info(
+                "%s[%s]: compiled locally in %.1fms, no LLM call",
+                log_prefix,
+                stage.name,
+                (time.monotonic() - started) * 1000,
+            )
+            return
+    stage = tuned(stage, scratch)
+    logger.info(
+        "%s[%s]: building messages (provider=%s model=%s output_budget=%d effort=%s)",
+        log_prefix,
+        stage.name,
+        stage.provider,
+        stage.model,
+        stage.output_budget,
+        stage.reasoning_effort,
+    )
+    with metrics.cpu_section("prompt_build"):
+        messages = stage.build_messages(scratch)
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+    scratch.meta.setdefault("prompt_chars", {})[stage.name] = prompt_chars
+    metrics.observe(f"stage.{stage.name}.prompt_chars", prompt_chars)
+    logger.info(
+        "%s[%s]: dispatching to LLM (n_messages=%d, system_chars=%d)",
+        log_prefix,
+        stage.name,
+        len(messages),
+        len(messages[0]["content"]) if messages else 0,
+    )
+    llm_kwargs: dict = {
+        "max_tokens": stage.output_budget,
+        "model": stage.model,
+        "provider": stage.provider,
+    }
+    if stage.reasoning_effort is not None:
+        llm_kwargs["reasoning_effort"] = stage.reasoning_effort
+    if stage.stop_sequences:
+        llm_kwargs["stop"] = list(stage.stop_sequences)
+    response_format = stage.response_format()
+    if response_format is not None:
+        llm_kwargs["response_format"] = response_format
+    metas: list[dict] = []
+    try:
+        if _early_stop_enabled(stage):
+            response = await _stream_until_complete(stage, messages, llm_kwargs, log_prefix, metas)
+        else:
+            response = await _call_with_continuations(stage, messages, llm_kwargs, log_prefix, metas)
+    except asyncio.CancelledError:
+        metrics.incr(f"stage.{stage.name}.cancelled")
+        logger.info(
+            "%s[%s]: cancelled after %.2fs",
+            log_prefix,
+            stage.name,
+            time.monotonic() - started,
+        )
+        raise
+    logger.info(
+        "%s[%s]: LLM returned %d chars in %.2fs",
+        log_prefix,
+        stage.name,
+        len(response),
+        time.monotonic() - started,
+    )
+    record_usage(stage, scratch, response, metas)
+    with metrics.cpu_section("parse"):
+        scratch.artifacts[stage.name] = stage.parse(response)
+    metrics.observe(f"stage.{stage.name}.wall_s", time.monotonic() - started)
+    logger.info(
+        "%s[%s]: complete in %.2fs total",
+        log_prefix,
+        stage.name,
+        time.monotonic() - started,
+    )
+
+
+async def run_stage_with_retries(
+    stage: Stage, scratch: Scratch, *, log_prefix: str = "stage"
+) -> None:
+    """`run_stage`, retried on failure within the stage's retry budget."""
+    retries = max(0, _stage_retries(stage))
+    for attempt in range(retries + 1):
+        try:
+            await run_stage(stage, scratch, log_prefix=log_prefix)
+            return
+        except Exception as e:
+            if attempt == retries:
+                metrics.incr(f"stage.{stage.name}.failed")
+                raise
+            delay = _retry_backoff_s() * 2**attempt
+            metrics.incr(f"stage.{stage.name}.retries")
+            logger.warning(
+                "%s[%s]: attempt %d/%d failed (%s: %s), retrying in %.1fs",
+                log_prefix,
+                stage.name,
+                attempt + 1,
+                retries + 1,
+                type(e).__name__,
+                e,
+                delay,
+            )
+            await asyncio.sleep(delay)
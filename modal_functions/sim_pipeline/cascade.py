@@ -0,0 +1,196 @@
+"""Model cascade: try a cheaper configuration first, escalate when its slice is bad.
+
+Most fill stages are routine for the request's model at low effort, and many
+would come out just as well at minimal effort or on a smaller model.
+`run_cascaded` runs a stage once with its cascade tier — a `model` and/or
+`reasoning_effort` override — checks the parsed slice locally with
+`slice_problems`, and only re-runs it with the stage's own configuration
+(and its full retry budget) when the check fails or the cheap call raised:
+
+- every slice the stage owns must pass its schema (`validate_slice`);
+- objects must match the skeleton's ids one-to-one and name an svg the
+  manifest has, or one `correct_objects` can map to a close match;
+- controls, graphs and outputs must cover every intent and only target
+  objects that exist.
+
+`PIPELINE_CASCADE` sets the tiers as `stage=model:effort` pairs separated by
+`;`; either side of the colon may be empty to keep the stage's own value.
+The default, `objects=:minimal;controls=:minimal;graphs=:minimal;outputs=:minimal;details=:minimal`,
+keeps every model and lowers effort; the skeleton always runs as configured.
+`PIPELINE_CASCADE=0` turns the cascade off. Outcomes are counted per stage as
+`cascade.<stage>.accepted` / `.escalated`, so the escalation rate is
+escalated / (accepted + escalated).
+
+Stages compiled locally, repairs, and tiers that would change nothing (an
+effort-only tier on a model that never gets the effort: SkoleGPT, or an
+OpenAI model such as gpt-4o that rejects it) run as configured.
+"""
+
+import copy
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from pipeline import Scratch, Stage, metrics
+from pipeline.llm import accepts_reasoning_effort
+
+from ._runner import run_stage, run_stage_with_retries
+from .details_fill import INTENT_KEYS
+from .manifest_index import manifest_index
+from .validate import validate_slice
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_POLICY = "objects=:minimal;controls=:minimal;graphs=:minimal;outputs=:minimal;details=:minimal"
+
+# Problems kept per check; the log only needs enough to see why it escalated.
+_MAX_PROBLEMS = 8
+
+
+@dataclass(frozen=True)
+class Tier:
+    model: str | None = None
+    reasoning_effort: str | None = None
+
+
+_policy: tuple[str, dict[str, Tier]] | None = None
+
+
+def parse_policy(spec: str) -> dict[str, Tier]:
+    """`stage=model:effort;...` → {stage: Tier}. Malformed entries are skipped."""
+    if spec.strip().lower() in ("0", "false", "off", ""):
+        return {}
+    tiers: dict[str, Tier] = {}
+    for entry in spec.split(";"):
+        stage, sep, value = entry.partition("=")
+        if not sep or not stage.strip():
+            if entry.strip():
+                logger.warning("cascade: ignoring malformed entry %r", entry)
+            continue
+        model, _, effort = value.partition(":")
+        tiers[stage.strip()] = Tier(model=model.strip() or None, reasoning_effort=effort.strip() or None)
+    return tiers
+
+
+def cascade_policy() -> dict[str, Tier]:
+    """The parsed `PIPELINE_CASCADE` (re-parsed only when the variable changes)."""
+    global _policy
+    spec = os.environ.get("PIPELINE_CASCADE", _DEFAULT_POLICY)
+    if _policy is None or _policy[0] != spec:
+        _policy = (spec, parse_policy(spec))
+    return _policy[1]
+
+
+def _cheap_stage(stage: Stage) -> Stage | None:
+    """A copy of `stage` configured with its tier, or None when there's nothing to try."""
+    tier = cascade_policy().get(stage.name)
+    if tier is None:
+        return None
+    cheap = copy.copy(stage)
+    if tier.model:
+        cheap.model = tier.model
+    if tier.reasoning_effort and accepts_reasoning_effort(cheap.provider, cheap.model):
+        cheap.reasoning_effort = tier.reasoning_effort
+    if (cheap.model, cheap.reasoning_effort) == (stage.model, stage.reasoning_effort):
+        return None
+    return cheap
+
+
+def _object_ids(scratch: Scratch) -> set:
+    objects = (scratch.artifacts.get("objects") or {}).get("objects") or []
+    return {o.get("id") for o in objects if isinstance(o, dict)}
+
+
+def _targets(key: str, entry: dict) -> list:
+    if key == "controls":
+        return [entry.get("targetObj")]
+    nested = entry.get("lines" if key == "graphs" else "values") or []
+    return [item.get("targetObj") for item in nested if isinstance(item, dict)]
+
+
+def _object_problems(objects: list, scratch: Scratch) -> list[str]:
+    skeleton = scratch.artifacts.get("skeleton") or {}
+    expected = [o.get("id") for o in skeleton.get("object_skeletons") or [] if isinstance(o, dict)]
+    ids = [o.get("id") for o in objects if isinstance(o, dict)]
+    problems = []
+    if sorted(map(str, ids)) != sorted(map(str, expected)):
+        problems.append(f"objects: ids {ids} don't match the skeleton's {expected}")
+    index = manifest_index()
+    if len(index):
+        for obj in objects:
+            svg = obj.get("svg") if isinstance(obj, dict) else None
+            if svg not in index and (not isinstance(svg, str) or index.closest(svg) is None):
+                problems.append(f"objects: {obj.get('id')!r} has unknown svg {svg!r}")
+    return problems
+
+
+def _detail_problems(key: str, entries: list, scratch: Scratch) -> list[str]:
+    problems = []
+    skeleton = scratch.artifacts.get("skeleton") or {}
+    intents = skeleton.get(INTENT_KEYS[key]) or []
+    if len(entries) < len(intents):
+        problems.append(f"{key}: {len(entries)} entries for {len(intents)} intents")
+    ids = _object_ids(scratch)
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            continue
+        for target in _targets(key, entry):
+            if target not in ids:
+                problems.append(f"{key}[{i}] targets unknown object {target!r}")
+    return problems
+
+
+def slice_problems(stage: Stage, scratch: Scratch) -> list[str]:
+    """Local checks on `stage`'s fresh artifact (see the module docstring); empty when it passes."""
+    artifact: Any = scratch.artifacts.get(stage.name)
+    if not isinstance(artifact, dict):
+        return [f"{stage.name}: no artifact"]
+    problems: list[str] = []
+    for key in ("objects", *INTENT_KEYS):
+        if key not in artifact:
+            continue
+        value = artifact[key]
+        problems.extend(validate_slice(key, value))
+        if not isinstance(value, list):
+            continue
+        if key == "objects":
+            problems.extend(_object_problems(value, scratch))
+        else:
+            problems.extend(_detail_problems(key, value, scratch))
+    return problems[:_MAX_PROBLEMS]
+
+
+async def run_cascaded(stage: Stage, scratch: Scratch, *, log_prefix: str = "stage") -> None:
+    """Run `stage` on its cheap tier first, escalating to its own configuration on a bad slice."""
+    cheap = _cheap_stage(stage)
+    if (
+        cheap is None
+        or scratch.meta.get("repair", {}).get(stage.name)
+        or stage.compile(scratch) is not None
+    ):
+        await run_stage_with_retries(stage, scratch, log_prefix=log_prefix)
+        return
+    try:
+        # No retries here: escalating is the retry.
+        await run_stage(cheap, scratch, log_prefix=log_prefix)
+        problems = slice_problems(stage, scratch)
+    except Exception as e:
+        problems = [f"{type(e).__name__}: {e}"]
+    if not problems:
+        metrics.incr(f"cascade.{stage.name}.accepted")
+        return
+    metrics.incr(f"cascade.{stage.name}.escalated")
+    logger.warning(
+        "%s[%s]: cheap tier (model=%s effort=%s) rejected, escalating: %s",
+        log_prefix,
+        stage.name,
+        cheap.model,
+        cheap.reasoning_effort,
+        problems,
+    )
+    scratch.artifacts.pop(stage.name, None)
+    await run_stage_with_retries(stage, scratch, log_prefix=log_prefix)
+
+
+__all__ = ["Tier", "cascade_policy", "parse_policy", "run_cascaded", "slice_problems"]
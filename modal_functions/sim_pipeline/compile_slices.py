@@ -0,0 +1,250 @@
+"""Deterministic compiler for the `outputs` and `graphs` slices.
+
+Both fill stages mostly re-shape the skeleton's intents: each output value is a
+(target_id, property) pair and each graph track maps straight onto a line. The
+compiler does that locally:
+
+- labels and units come from `PROPERTIES` (property → label, quantity, unit),
+  with units written in the environment's configured unit;
+- line colors come from the tracked object's svg (`color_tag` in the
+  renderables manifest), falling back to a fixed palette so lines in one
+  graph never share a color;
+- `yAxisRange` is sized from the canvas, gravity and the initial velocities
+  (a first guess; `presim` fits it to a headless run after assembly).
+
+It declines (returns None, and the stage calls the LLM as before) when an intent
+uses a property outside the table, targets an unknown object, or plots
+quantities with different units on one graph. `PIPELINE_COMPILE_SLICES=0`
+turns it off.
+"""
+
+import logging
+import math
+import os
+from typing import Any
+
+from ._context import SIMULATION_HEIGHT_PX, SIMULATION_WIDTH_PX
+from .manifest_index import manifest_index
+
+logger = logging.getLogger(__name__)
+
+# property → (label, quantity, unit template; "{u}" is the environment unit).
+PROPERTIES: dict[str, tuple[str, str, str]] = {
+    "position.x": ("Horizontal position", "Position", "{u}"),
+    "position.y": ("Height", "Position", "{u}"),
+    "velocity.x": ("Horizontal velocity", "Velocity", "{u}/s"),
+    "velocity.y": ("Vertical velocity", "Velocity", "{u}/s"),
+    "acceleration.x": ("Horizontal acceleration", "Acceleration", "{u}/s²"),
+    "acceleration.y": ("Vertical acceleration", "Acceleration", "{u}/s²"),
+    "mass": ("Mass", "Mass", "kg"),
+    "angle": ("Angle", "Angle", "rad"),
+    "angularVelocity": ("Angular velocity", "Angular velocity", "rad/s"),
+    "restitution": ("Restitution", "Restitution", ""),
+}
+
+# GraphLineConfig.property only documents the vector components.
+GRAPH_PROPERTIES = frozenset(p for p in PROPERTIES if "." in p)
+
+# Manifest color_tag → line color.
+TAG_COLORS: dict[str, str] = {
+    "red": "#ff6b6b",
+    "amber": "#ffa94d",
+    "green": "#51cf66",
+    "teal": "#4ecdc4",
+    "blue": "#4dabf7",
+    "purple": "#9775fa",
+    "pink": "#ff6bff",
+    "gray": "#868e96",
+}
+
+# Used for untagged svgs and when a tag color is already taken in the graph.
+PALETTE = ("#ff6bff", "#4ecdc4", "#ffa94d", "#4dabf7", "#51cf66", "#9775fa", "#ff6b6b")
+
+DEFAULT_PIXELS_PER_UNIT = 100.0
+
+
+class _Decline(Exception):
+    """The intents need something the compiler doesn't handle."""
+
+
+def compile_enabled() -> bool:
+    return os.environ.get("PIPELINE_COMPILE_SLICES", "1").lower() not in ("0", "false", "off")
+
+
+def _property(prop: Any, allowed) -> tuple[str, str, str]:
+    if not isinstance(prop, str) or prop not in allowed:
+        raise _Decline(f"property {prop!r}")
+    return PROPERTIES[prop]
+
+
+def _unit(template: str, env: dict) -> str:
+    return template.format(u=env.get("unit") or "m")
+
+
+def _title(intent: dict, fallback: str) -> str:
+    text = intent.get("intent")
+    if isinstance(text, str) and text.strip():
+        text = text.strip()
+        return text[0].upper() + text[1:]
+    return fallback
+
+
+def _object_label(obj_id: str) -> str:
+    text = obj_id.replace("_", " ").strip()
+    return text[:1].upper() + text[1:]
+
+
+def _pairs(intent: Any, key: str, object_ids: set[str]) -> list[tuple[str, str]]:
+    if not isinstance(intent, dict):
+        raise _Decline("intent is not an object")
+    entries = intent.get(key)
+    if not isinstance(entries, list) or not entries:
+        raise _Decline(f"intent {intent.get('name')!r} has no {key}")
+    pairs = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise _Decline(f"{key} entry is not an object")
+        target = entry.get("target_id")
+        if target not in object_ids:
+            raise _Decline(f"unknown target {target!r}")
+        pairs.append((target, entry.get("property")))
+    return pairs
+
+
+def _intents(skeleton: dict, key: str) -> list:
+    intents = skeleton.get(key, [])
+    if not isinstance(intents, list):
+        raise _Decline(f"{key} is not a list")
+    return intents
+
+
+def compile_outputs(skeleton: dict, objects: list[dict]) -> dict | None:
+    """`{"outputs": [...]}` from `skeleton["output_intents"]`, or None to use the LLM."""
+    env = skeleton.get("environment") or {}
+    object_ids = {o.get("id") for o in objects if isinstance(o, dict)}
+    try:
+        groups = []
+        for intent in _intents(skeleton, "output_intents"):
+            pairs = _pairs(intent, "values", object_ids)
+            several = len({target for target, _ in pairs}) > 1
+            values = []
+            for target, prop in pairs:
+                label, _, unit = _property(prop, PROPERTIES)
+                if several:
+                    label = f"{_object_label(target)} {label[0].lower()}{label[1:]}"
+                value = {"label": label, "targetObj": target, "property": prop}
+                if unit:
+                    value["unit"] = _unit(unit, env)
+                values.append(value)
+            fallback = "Outputs" if several else f"{_object_label(pairs[0][0])} outputs"
+            groups.append({"title": _title(intent, fallback), "values": values})
+    except _Decline as e:
+        logger.info("compile: outputs need the LLM (%s)", e)
+        return None
+    return {"outputs": groups}
+
+
+def _nice_ceil(value: float) -> float:
+    """Smallest 1/2/2.5/5 × 10^k at or above `value` (1 for non-positive input)."""
+    if value <= 0:
+        return 1.0
+    exp = 10 ** math.floor(math.log10(value))
+    for step in (1, 2, 2.5, 5, 10):
+        if step * exp >= value * (1 - 1e-9):
+            return step * exp
+    return 10 * exp
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _y_range(prop: str, env: dict, objects: list[dict]) -> tuple[float, float]:
+    ppu = _number(env.get("pixelsPerUnit")) or DEFAULT_PIXELS_PER_UNIT
+    width = SIMULATION_WIDTH_PX / ppu
+    height = SIMULATION_HEIGHT_PX / ppu
+    gravity = abs(_number(env.get("gravity", 9.8)))
+    quantity, axis = prop.split(".")
+    if quantity == "position":
+        return 0.0, _nice_ceil(width if axis == "x" else height)
+    if quantity == "velocity":
+        # Collisions hand speed between objects, so size for the fastest one;
+        # vertically add what falling the full canvas height can reach.
+        speed = max(
+            (
+                math.hypot(_number(v.get("x")), _number(v.get("y")))
+                for o in objects
+                if isinstance(v := o.get("velocity"), dict)
+            ),
+            default=0.0,
+        )
+        if axis == "y":
+            speed = math.sqrt(speed**2 + 2 * gravity * height)
+        bound = _nice_ceil(1.1 * speed)
+        return -bound, bound
+    bound = _nice_ceil(2 * gravity)
+    return -bound, bound
+
+
+def _line_colors(targets: list[str], objects: list[dict]) -> list[str]:
+    index = manifest_index()
+    svg_of = {o.get("id"): o.get("svg") for o in objects if isinstance(o, dict)}
+    colors: list[str] = []
+    for target in targets:
+        entry = index.get(svg_of.get(target))
+        color = TAG_COLORS.get(entry.color_tag or "") if entry else None
+        if color is None or color in colors:
+            color = next((c for c in PALETTE if c not in colors), PALETTE[len(colors) % len(PALETTE)])
+        colors.append(color)
+    return colors
+
+
+def compile_graphs(skeleton: dict, objects: list[dict]) -> dict | None:
+    """`{"graphs": [...]}` from `skeleton["graph_intents"]`, or None to use the LLM."""
+    env = skeleton.get("environment") or {}
+    object_ids = {o.get("id") for o in objects if isinstance(o, dict)}
+    try:
+        graphs = []
+        for intent in _intents(skeleton, "graph_intents"):
+            pairs = _pairs(intent, "tracks", object_ids)
+            specs = [_property(prop, GRAPH_PROPERTIES) for _, prop in pairs]
+            quantities = {quantity for _, quantity, _ in specs}
+            if len(quantities) > 1:
+                raise _Decline(f"graph {intent.get('name')!r} mixes {sorted(quantities)}")
+            quantity = quantities.pop()
+            unit = _unit(specs[0][2], env)
+            several = len({target for target, _ in pairs}) > 1
+            low, high = math.inf, -math.inf
+            for _, prop in pairs:
+                lo, hi = _y_range(prop, env, objects)
+                low, high = min(low, lo), max(high, hi)
+            colors = _line_colors([target for target, _ in pairs], objects)
+            lines = []
+            for (target, prop), (label, _, _), color in zip(pairs, specs, colors):
+                if several:
+                    label = f"{_object_label(target)} {label[0].lower()}{label[1:]}"
+                lines.append({"label": label, "color": color, "targetObj": target, "property": prop})
+            graphs.append(
+                {
+                    "type": "line",
+                    "title": _title(intent, f"{quantity} over time"),
+                    "yAxisRange": {"min": low, "max": high},
+                    "yAxisLabel": f"{quantity} ({unit})",
+                    "lines": lines,
+                }
+            )
+    except _Decline as e:
+        logger.info("compile: graphs need the LLM (%s)", e)
+        return None
+    return {"graphs": graphs}
+
+
+__all__ = [
+    "PROPERTIES",
+    "compile_enabled",
+    "compile_graphs",
+    "compile_outputs",
+]
@@ -11,11 +11,14 @@ from ._base import JsonStage
 
 class ControlsFillStage(JsonStage):
     name = "controls"
+    schema_slice_key = "controls"
+    usage_keys = ("control_intents",)
     # Bumped from 1500 after a production run where reasoning_tokens=1500 ate
     # the whole budget and left zero output. With `reasoning_effort=low` set
     # in pipeline/llm.py reasoning should stay under ~400 tokens; the headroom
     # here is defense-in-depth against any single prompt that needs more.
     output_budget = 2500
+    input_budget = 2000
     stage_fragment = controls_fill_fragment
 
     def build_user_messages(self, scratch: Scratch) -> list[dict]:
@@ -33,4 +36,4 @@ class ControlsFillStage(JsonStage):
                 f"objects:\n```json\n{json.dumps(objects, indent=2)}\n```"
             ),
         }
-        return [*scratch.history, ctx]
+        return [*self.history(scratch), ctx]
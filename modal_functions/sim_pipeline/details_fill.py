@@ -0,0 +1,128 @@
+"""Fused details stage: controls, graphs and outputs from one LLM call.
+
+Each detail fill pays for the shared preamble and the schema in its system
+prompt. For a small scene — a couple of objects, a handful of intents — that
+overhead dwarfs the work, so the pipeline fills every detail slice that still
+needs the LLM (the ones `compile_slices` declined) with one `DetailsFillStage`
+call instead. `detail_shape` picks the shape per request:
+
+- "fused" when at least two slices need the LLM and the scene has at most
+  `PIPELINE_FUSE_MAX_OBJECTS` (2) objects and `PIPELINE_FUSE_MAX_INTENTS` (4)
+  detail intents;
+- "fanout" (one stage per slice, in parallel) otherwise.
+
+`PIPELINE_FUSE_DETAILS=0` always fans out. The pipeline records which shape
+ran with its wall time and prompt size (`pipeline.sim.details.<shape>.*`) so
+the thresholds can be tuned from data.
+"""
+
+import json
+import os
+from typing import Any
+
+from pipeline import Scratch, Stage
+
+from gist_instructions import details_fill_fragment  # type: ignore[import-not-found]
+
+from ._base import JsonStage
+
+# Slice key → the skeleton's intents for it.
+INTENT_KEYS = {
+    "controls": "control_intents",
+    "graphs": "graph_intents",
+    "outputs": "output_intents",
+}
+
+_INSTRUCTIONS = {
+    "controls": (
+        "`controls`: one ControlConfig per control intent. Use each intent's "
+        "`target_id` as `targetObj` and match `defaultValue` to the object's "
+        "initial state."
+    ),
+    "graphs": (
+        "`graphs`: one GraphConfig per graph intent; each intent's `tracks` map "
+        "directly to that graph's `lines`."
+    ),
+    "outputs": (
+        "`outputs`: one OutputGroupConfig per output intent; each intent's "
+        "`values` map directly to that group's `values`."
+    ),
+}
+
+
+def _fuse_enabled() -> bool:
+    return os.environ.get("PIPELINE_FUSE_DETAILS", "1").lower() not in ("0", "false", "off")
+
+
+def _max_objects() -> int:
+    return int(os.environ.get("PIPELINE_FUSE_MAX_OBJECTS", "2"))
+
+
+def _max_intents() -> int:
+    return int(os.environ.get("PIPELINE_FUSE_MAX_INTENTS", "4"))
+
+
+def scene_size(scratch: Scratch) -> tuple[int, int]:
+    """(object count, detail intent count) for the current skeleton."""
+    skeleton = scratch.artifacts.get("skeleton") or {}
+    objects = (scratch.artifacts.get("objects") or {}).get("objects") or []
+    intents = sum(len(skeleton.get(key) or []) for key in INTENT_KEYS.values())
+    return len(objects), intents
+
+
+def detail_shape(stages: list[Stage], scratch: Scratch) -> tuple[str, list[Stage]]:
+    """("fused", the stages to fuse) or ("fanout", []) for this request."""
+    if not _fuse_enabled():
+        return "fanout", []
+    n_objects, n_intents = scene_size(scratch)
+    if n_objects > _max_objects() or n_intents > _max_intents():
+        return "fanout", []
+    # Compiled slices cost no call; only fuse the ones that need the LLM.
+    needs_llm = [s for s in stages if s.name in INTENT_KEYS and s.compile(scratch) is None]
+    if len(needs_llm) < 2:
+        return "fanout", []
+    return "fused", needs_llm
+
+
+class DetailsFillStage(JsonStage):
+    name = "details"
+    output_budget = 4500
+    input_budget = 2000
+    stage_fragment = details_fill_fragment
+
+    def __init__(self, slices: list[str] | None = None) -> None:
+        self.slices = [key for key in INTENT_KEYS if key in (slices or INTENT_KEYS)]
+        self.usage_keys = tuple(INTENT_KEYS[key] for key in self.slices)
+
+    def build_user_messages(self, scratch: Scratch) -> list[dict]:
+        skeleton = scratch.artifacts.get("skeleton", {})
+        objects = scratch.artifacts.get("objects", {}).get("objects", [])
+        wanted = ", ".join(f"`{key}`" for key in self.slices)
+        parts = [
+            f"Produce {wanted} in one object with exactly those keys.",
+            *(f"- {_INSTRUCTIONS[key]}" for key in self.slices),
+        ]
+        for key in self.slices:
+            intent_key = INTENT_KEYS[key]
+            parts.append(
+                f"{intent_key}:\n```json\n{json.dumps(skeleton.get(intent_key, []), indent=2)}\n```"
+            )
+        parts.append(f"objects:\n```json\n{json.dumps(objects, indent=2)}\n```")
+        return [*self.history(scratch), {"role": "user", "content": "\n\n".join(parts)}]
+
+    def parse(self, response: str) -> Any:
+        value = super().parse(response)
+        missing = [key for key in self.slices if not isinstance((value or {}).get(key), list)]
+        if missing:
+            # Raising makes the runner retry the call rather than ship half of it.
+            raise ValueError(f"details: response is missing {missing}")
+        return value
+
+    def distribute(self, scratch: Scratch) -> None:
+        """Move the fused artifact into the per-slice artifacts the rest of the pipeline reads."""
+        value = scratch.artifacts.pop(self.name, None) or {}
+        for key in self.slices:
+            scratch.artifacts[key] = {key: value[key]}
+
+
+__all__ = ["DetailsFillStage", "INTENT_KEYS", "detail_shape", "scene_size"]
@@ -1,4 +1,7 @@
-"""Graphs fill stage: full GraphConfig[] from the skeleton's graph_intents."""
+"""Graphs fill stage: full GraphConfig[] from the skeleton's graph_intents.
+
+Compiled locally (see compile_slices) unless an intent needs the LLM.
+"""
 
 import json
 
@@ -7,13 +10,23 @@ from pipeline import Scratch
 from gist_instructions import graphs_fill_fragment  # type: ignore[import-not-found]
 
 from ._base import JsonStage
+from .compile_slices import compile_enabled, compile_graphs
 
 
 class GraphsFillStage(JsonStage):
     name = "graphs"
+    schema_slice_key = "graphs"
+    usage_keys = ("graph_intents",)
     output_budget = 2000
+    input_budget = 2000
     stage_fragment = graphs_fill_fragment
 
+    def compile(self, scratch: Scratch) -> dict | None:
+        if not compile_enabled():
+            return None
+        objects = scratch.artifacts.get("objects", {}).get("objects", [])
+        return compile_graphs(scratch.artifacts.get("skeleton", {}), objects)
+
     def build_user_messages(self, scratch: Scratch) -> list[dict]:
         skeleton = scratch.artifacts.get("skeleton", {})
         objects = scratch.artifacts.get("objects", {}).get("objects", [])
@@ -28,4 +41,4 @@ class GraphsFillStage(JsonStage):
                 f"objects:\n```json\n{json.dumps(objects, indent=2)}\n```"
             ),
         }
-        return [*scratch.history, ctx]
+        return [*self.history(scratch), ctx]
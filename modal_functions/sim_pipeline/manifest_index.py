@@ -0,0 +1,367 @@
+"""Indexed view of the renderables manifest, with precomputed collider geometry.
+
+`manifest_index()` loads the manifest once per process. Each approved item
+becomes a `ManifestEntry` (O(1) lookup by svg name) carrying its collider's
+AABB, aspect ratio, area and centroid in the 64×64 sprite viewBox — computed
+for all convex colliders at once with NumPy when it is installed.
+
+`correct_objects` uses the index to check ObjectsFillStage output locally:
+
+- an unknown `svg` is replaced by the closest approved name (or `box`), so the
+  client never gets a sprite/collider it can't load;
+- the frontend scales the 64×64 viewBox (sprite and collider) over
+  `width × height`. Rectangular sprites (box colliders, blocks, planks, ...)
+  stretch cleanly, and static floors, ramps and platforms rely on that, so
+  those boxes are left as given. Round and convex sprites must not stretch:
+  a non-square box for one is made square, keeping the dimension along the
+  collider's longer axis (the one the model sized), and a missing dimension
+  is filled in from the other, keeping the collider's bottom edge in place;
+- a box more than `_SIZE_TOLERANCE`× off the typical real-world size for the
+  svg (`TYPICAL_SIZES_M`) — usually a unit slip — is rescaled to it.
+
+Sizes follow one convention throughout: `width`/`height` and
+`TYPICAL_SIZES_M` both describe the sprite's box, which is what the model is
+asked for. Every correction is idempotent — the pipelines run it after the
+objects stage and again at assembly, and remixes re-run it on configs that
+were already corrected. `isStatic` bodies are never resized.
+"""
+
+import difflib
+import json
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+
+from pipeline import metrics
+
+from ._context import _manifest_path
+
+logger = logging.getLogger(__name__)
+
+VIEWBOX = 64.0
+
+FALLBACK_SVG = "box"
+
+# Largest real-world dimension, in meters, of the things the sprites depict.
+# Colored variants inherit through `parent`; numbered sets share a prefix.
+TYPICAL_SIZES_M: dict[str, float] = {
+    "acoustic_guitar": 1.0,
+    "airplane": 35.0,
+    "apple": 0.08,
+    "arrow": 0.75,
+    "autumn_leaf": 0.1,
+    "balloon": 0.3,
+    "barrel": 0.9,
+    "baseball": 0.074,
+    "basketball": 0.24,
+    "bell": 0.3,
+    "bicycle": 1.7,
+    "billiard_ball": 0.057,
+    "bird": 0.25,
+    "boat": 5.0,
+    "bowling_ball": 0.22,
+    "brick_block": 0.5,
+    "bus": 12.0,
+    "cannonball": 0.15,
+    "car": 4.5,
+    "cat": 0.5,
+    "coin": 0.025,
+    "crate": 1.0,
+    "cue_ball": 0.057,
+    "duck": 0.4,
+    "dynamics_cart": 0.17,
+    "feather": 0.2,
+    "fish": 0.3,
+    "football": 0.28,
+    "frisbee": 0.27,
+    "frog": 0.1,
+    "golf_ball": 0.043,
+    "hammer": 0.33,
+    "hay_bale": 1.0,
+    "helicopter": 12.0,
+    "hockey_puck": 0.076,
+    "kite": 1.0,
+    "marble": 0.016,
+    "milk_carton": 0.25,
+    "parachute": 8.0,
+    "person_walking": 1.8,
+    "pumpkin": 0.4,
+    "rabbit": 0.4,
+    "rocket": 50.0,
+    "runner": 1.8,
+    "skateboard": 0.8,
+    "sled": 1.2,
+    "soap_bubble": 0.05,
+    "soccer_ball": 0.22,
+    "tennis_ball": 0.067,
+    "train": 25.0,
+    "truck": 8.0,
+    "wagon": 1.0,
+    "wooden_bucket": 0.35,
+}
+
+UNIT_METERS = {"m": 1.0, "cm": 0.01, "km": 1000.0, "ft": 0.3048, "in": 0.0254}
+
+# How far a size may stray from the typical one before it's treated as a slip.
+_SIZE_TOLERANCE = 10.0
+# Boxes closer to square than this are left alone.
+_SQUARE_TOLERANCE = 1.05
+# Sprites that read as rectangles and may be stretched to any box.
+_RECTANGULAR = re.compile(
+    r"box|block|brick|crate|plank|board|beam|platform|ramp|wall|floor|ground|rect|bar|slab|table|shelf"
+)
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    name: str
+    display_name: str
+    color_tag: str | None
+    parent: str | None
+    collider_type: str
+    # The manifest's collider as-is (viewBox units).
+    collider: dict = field(default_factory=dict, compare=False)
+    # Collider geometry in viewBox units (Y down, like the SVG). None for
+    # convex colliders when numpy isn't installed.
+    aabb: tuple[float, float, float, float] | None = None  # (min_x, min_y, max_x, max_y)
+    area: float | None = None
+    centroid: tuple[float, float] | None = None
+
+    @property
+    def extent(self) -> tuple[float, float] | None:
+        """Collider AABB size as a fraction of the viewBox, (fx, fy)."""
+        if self.aabb is None:
+            return None
+        x0, y0, x1, y1 = self.aabb
+        return (x1 - x0) / VIEWBOX, (y1 - y0) / VIEWBOX
+
+    @property
+    def aspect(self) -> float | None:
+        """Collider AABB width / height."""
+        if self.aabb is None:
+            return None
+        x0, y0, x1, y1 = self.aabb
+        return (x1 - x0) / (y1 - y0) if y1 > y0 else None
+
+    @property
+    def typical_size_m(self) -> float | None:
+        for key in (self.name, self.parent, re.sub(r"_\d+$", "", self.name)):
+            if key and key in TYPICAL_SIZES_M:
+                return TYPICAL_SIZES_M[key]
+        return None
+
+
+class ManifestIndex:
+    """Approved manifest items by name. Build with `manifest_index()`."""
+
+    def __init__(self, entries: list[ManifestEntry]) -> None:
+        self._entries = {e.name: e for e in entries}
+        self.names = [e.name for e in entries]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    def get(self, name: str | None) -> ManifestEntry | None:
+        return self._entries.get(name) if isinstance(name, str) else None
+
+    def closest(self, name: str) -> str | None:
+        """Nearest approved name to an unknown one (e.g. "soccerball" → "soccer_ball")."""
+        key = re.sub(r"[\s\-]+", "_", name.strip().lower())
+        if key in self._entries:
+            return key
+        matches = difflib.get_close_matches(key, self.names, n=1, cutoff=0.6)
+        return matches[0] if matches else None
+
+    @classmethod
+    def from_manifest(cls, manifest: dict) -> "ManifestIndex":
+        items = [
+            item
+            for item in manifest.get("items", [])
+            if item.get("status") == "approved" and item.get("name")
+        ]
+        colliders = [(item.get("physical_properties") or {}).get("collider") or {} for item in items]
+        entries = [
+            ManifestEntry(
+                name=item["name"],
+                display_name=item.get("display_name") or item["name"],
+                color_tag=item.get("color_tag"),
+                parent=item.get("parent"),
+                collider_type=collider.get("type", ""),
+                collider=collider,
+                **geo,
+            )
+            for item, collider, geo in zip(items, colliders, _collider_geometry(colliders))
+        ]
+        return cls(entries)
+
+
+def _collider_geometry(colliders: list[dict]) -> list[dict]:
+    """aabb/area/centroid per collider. Convex hulls are done in one batch."""
+    from .presim import load_numpy
+
+    out: list[dict] = [{} for _ in colliders]
+    polygons = [
+        (i, c["vertices"])
+        for i, c in enumerate(colliders)
+        if c.get("type") == "convex" and len(c.get("vertices") or []) >= 3
+    ]
+    # Without numpy convex colliders have no geometry (and aren't corrected).
+    np = load_numpy() if polygons else None
+    if np is not None:
+        # Pad to a common length by repeating each polygon's last vertex: the
+        # repeated points add zero-length edges, which leave the shoelace sums unchanged.
+        longest = max(len(v) for _, v in polygons)
+        pts = np.array([v + [v[-1]] * (longest - len(v)) for _, v in polygons], dtype=np.float64)
+        x, y = pts[..., 0], pts[..., 1]
+        xn, yn = np.roll(x, -1, axis=1), np.roll(y, -1, axis=1)
+        cross = x * yn - xn * y
+        signed = cross.sum(axis=1) / 2
+        safe = np.where(np.abs(signed) > 1e-12, signed, 1.0)
+        cx = ((x + xn) * cross).sum(axis=1) / (6 * safe)
+        cy = ((y + yn) * cross).sum(axis=1) / (6 * safe)
+        lo, hi = pts.min(axis=1), pts.max(axis=1)
+        for k, (i, _) in enumerate(polygons):
+            out[i] = {
+                "aabb": (float(lo[k, 0]), float(lo[k, 1]), float(hi[k, 0]), float(hi[k, 1])),
+                "area": float(abs(signed[k])),
+                "centroid": (float(cx[k]), float(cy[k])),
+            }
+
+    for i, c in enumerate(colliders):
+        center = c.get("center") or [VIEWBOX / 2, VIEWBOX / 2]
+        if c.get("type") == "circle" and c.get("radius"):
+            r = float(c["radius"])
+            out[i] = {
+                "aabb": (center[0] - r, center[1] - r, center[0] + r, center[1] + r),
+                "area": math.pi * r * r,
+                "centroid": (float(center[0]), float(center[1])),
+            }
+        elif c.get("type") == "box" and c.get("width") and c.get("height"):
+            w, h = float(c["width"]), float(c["height"])
+            out[i] = {
+                "aabb": (center[0] - w / 2, center[1] - h / 2, center[0] + w / 2, center[1] + h / 2),
+                "area": w * h,
+                "centroid": (float(center[0]), float(center[1])),
+            }
+    return out
+
+
+_index: ManifestIndex | None = None
+
+
+def manifest_index() -> ManifestIndex:
+    """The approved manifest items, indexed (built once per process)."""
+    global _index
+    if _index is None:
+        with open(_manifest_path()) as f:
+            _index = ManifestIndex.from_manifest(json.load(f))
+    return _index
+
+
+def _number(value) -> float | None:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return None
+    return result if math.isfinite(result) and result > 0 else None
+
+
+def _fix_svg(obj: dict, index: ManifestIndex) -> bool:
+    svg = obj.get("svg")
+    if svg in index:
+        return False
+    replacement = (index.closest(svg) if isinstance(svg, str) else None) or FALLBACK_SVG
+    logger.warning("objects: %r has unknown svg %r, using %r", obj.get("id"), svg, replacement)
+    metrics.incr("objects.unknown_svg")
+    obj["svg"] = replacement
+    return True
+
+
+def _stretchable(entry: ManifestEntry) -> bool:
+    if entry.collider_type not in ("circle", "convex"):
+        return True
+    return any(_RECTANGULAR.search(name) for name in (entry.name, entry.parent) if name)
+
+
+def _fix_box(obj: dict, entry: ManifestEntry, unit: str) -> bool:
+    if obj.get("isStatic") is True:
+        return False
+    width, height = _number(obj.get("width")), _number(obj.get("height"))
+    if width is None and height is None:
+        return False
+    extent = entry.extent
+    fx, fy = extent if extent is not None else (1.0, 1.0)
+    new_w, new_h = width or height, height or width
+    if not _stretchable(entry) and max(new_w, new_h) / min(new_w, new_h) > _SQUARE_TOLERANCE:
+        # Square box, sized by the dimension along the collider's longer axis.
+        side = new_w if fx >= fy else new_h
+        new_w = new_h = side
+    typical = entry.typical_size_m
+    meters = UNIT_METERS.get(unit)
+    if typical and meters:
+        ratio = max(new_w, new_h) * meters / typical
+        if ratio > _SIZE_TOLERANCE or ratio < 1 / _SIZE_TOLERANCE:
+            metrics.incr("objects.rescaled")
+            logger.warning(
+                "objects: %r (%s) is %.3g m across, typical is %.3g m; rescaling",
+                obj.get("id"),
+                entry.name,
+                max(new_w, new_h) * meters,
+                typical,
+            )
+            new_w, new_h = new_w / ratio, new_h / ratio
+    new_w, new_h = round(new_w, 4), round(new_h, 4)
+    if (new_w, new_h) == (width, height):
+        return False
+    new = {"width": new_w, "height": new_h}
+    y = obj.get("y")
+    if isinstance(y, (int, float)) and width is not None and height is not None:
+        # Keep the collider's bottom edge (viewBox max y, Y down) where it was.
+        below = (entry.aabb[3] - VIEWBOX / 2) / VIEWBOX if entry.aabb is not None else 0.5
+        new["y"] = round(y - below * height + below * new_h, 4)
+    logger.info(
+        "objects: %r (%s) box %sx%s -> %sx%s",
+        obj.get("id"),
+        entry.name,
+        obj.get("width"),
+        obj.get("height"),
+        new_w,
+        new_h,
+    )
+    metrics.incr("objects.box_corrected")
+    obj.update(new)
+    return True
+
+
+def correct_objects(objects: list, environment: dict) -> int:
+    """Fix unknown svgs and distorted/implausible sizes in place. Returns the number of objects changed."""
+    if not isinstance(objects, list):
+        return 0
+    index = manifest_index()
+    unit = (environment or {}).get("unit") or "m"
+    changed = 0
+    for obj in objects:
+        if not isinstance(obj, dict):
+            continue
+        fixed = _fix_svg(obj, index)
+        entry = index.get(obj.get("svg"))
+        if entry is not None and _fix_box(obj, entry, unit):
+            fixed = True
+        changed += fixed
+    return changed
+
+
+__all__ = [
+    "ManifestEntry",
+    "ManifestIndex",
+    "TYPICAL_SIZES_M",
+    "correct_objects",
+    "manifest_index",
+]
@@ -13,20 +13,27 @@ from pipeline import Scratch
 from gist_instructions import objects_fill_fragment  # type: ignore[import-not-found]
 
 from ._base import JsonStage
-from ._context import (
-    SIMULATION_HEIGHT_PX,
-    SIMULATION_WIDTH_PX,
-    manifest_names_block,
-)
+from ._context import SIMULATION_HEIGHT_PX, SIMULATION_WIDTH_PX
+from .svg_retrieval import request_text, svg_candidates_block
 
 
 class ObjectsFillStage(JsonStage):
     name = "objects"
+    schema_slice_key = "objects"
+    usage_keys = ("object_skeletons",)
     output_budget = 3000
+    # The skeleton already carries the request; fills need little history.
+    input_budget = 2000
     stage_fragment = objects_fill_fragment
 
     def extra_blocks(self, scratch: Scratch) -> str:
-        return manifest_names_block()
+        skeleton = scratch.artifacts.get("skeleton", {})
+        chosen = [
+            o.get("svg")
+            for o in (skeleton.get("object_skeletons") or [] if isinstance(skeleton, dict) else [])
+            if isinstance(o, dict)
+        ]
+        return svg_candidates_block(request_text(scratch), include=chosen)
 
     def build_user_messages(self, scratch: Scratch) -> list[dict]:
         skeleton = scratch.artifacts.get("skeleton", {})
@@ -59,4 +66,4 @@ class ObjectsFillStage(JsonStage):
                 f"```json\n{json.dumps(skeleton, indent=2)}\n```"
             ),
         }
-        return [*scratch.history, skeleton_msg]
+        return [*self.history(scratch), skeleton_msg]
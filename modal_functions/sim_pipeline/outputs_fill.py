@@ -1,4 +1,7 @@
-"""Outputs fill stage: full OutputGroupConfig[] from the skeleton's output_intents."""
+"""Outputs fill stage: full OutputGroupConfig[] from the skeleton's output_intents.
+
+Compiled locally (see compile_slices) unless an intent needs the LLM.
+"""
 
 import json
 
@@ -7,13 +10,23 @@ from pipeline import Scratch
 from gist_instructions import outputs_fill_fragment  # type: ignore[import-not-found]
 
 from ._base import JsonStage
+from .compile_slices import compile_enabled, compile_outputs
 
 
 class OutputsFillStage(JsonStage):
     name = "outputs"
+    schema_slice_key = "outputs"
+    usage_keys = ("output_intents",)
     output_budget = 1500
+    input_budget = 2000
     stage_fragment = outputs_fill_fragment
 
+    def compile(self, scratch: Scratch) -> dict | None:
+        if not compile_enabled():
+            return None
+        objects = scratch.artifacts.get("objects", {}).get("objects", [])
+        return compile_outputs(scratch.artifacts.get("skeleton", {}), objects)
+
     def build_user_messages(self, scratch: Scratch) -> list[dict]:
         skeleton = scratch.artifacts.get("skeleton", {})
         intents = skeleton.get("output_intents", [])
@@ -25,4 +38,4 @@ class OutputsFillStage(JsonStage):
                 f"output_intents:\n```json\n{json.dumps(intents, indent=2)}\n```"
             ),
         }
-        return [*scratch.history, ctx]
+        return [*self.history(scratch), ctx]
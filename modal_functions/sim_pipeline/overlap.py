@@ -0,0 +1,247 @@
+"""Initial-overlap and out-of-bounds fixing for generated scenes.
+
+Generated objects sometimes spawn overlapping each other or hanging off the
+canvas, and the physics engine then blows them apart on the first frame.
+`separate_objects` finds and removes both locally, before the config ships:
+
+- each object's collider is built like the frontend does it
+  (`scaleManifestColliderToShape`): the manifest collider scaled from the
+  64×64 viewBox into width × height, rotated by `angle`. Convex colliders use
+  their hull, circles a 16-gon;
+- all pairs are tested at once with the separating-axis theorem (NumPy); an
+  overlapping pair is pushed apart along its minimum-translation axis. Static
+  bodies never move, so a dynamic body is pushed fully off a static one and two
+  dynamic bodies split the push;
+- a dynamic body sticking out of the canvas is shifted back in.
+
+Positions are those the scene loads with: the frontend applies slider defaults
+on reset, so a `position.x`/`position.y` slider's default is the position that
+counts, and it is updated along with the object. The push is repeated a few
+rounds and is deterministic. `PIPELINE_FIX_OVERLAPS=0` turns it off.
+"""
+
+import logging
+import math
+import os
+
+from pipeline import metrics
+
+from ._context import SIMULATION_HEIGHT_PX, SIMULATION_WIDTH_PX
+from .manifest_index import VIEWBOX, ManifestEntry, manifest_index
+from .presim import load_numpy
+
+logger = logging.getLogger(__name__)
+
+_CIRCLE_SIDES = 16
+_MAX_ROUNDS = 8
+# Overlaps shallower than this fraction of the smaller body count as touching
+# (e.g. resting on the floor), and pushes leave this much clearance.
+_CONTACT_SLOP = 0.005
+
+
+def fix_overlaps_enabled() -> bool:
+    return os.environ.get("PIPELINE_FIX_OVERLAPS", "1").lower() not in ("0", "false", "off")
+
+
+def _hull(points: list[tuple[float, float]]) -> list[tuple[float, float]]:
+    """Convex hull, counter-clockwise (Andrew's monotone chain)."""
+    pts = sorted(set(points))
+    if len(pts) < 3:
+        return pts
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower: list[tuple[float, float]] = []
+    for p in pts:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    upper: list[tuple[float, float]] = []
+    for p in reversed(pts):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return lower[:-1] + upper[:-1]
+
+
+def collider_polygon(collider: dict, width: float, height: float) -> list[tuple[float, float]] | None:
+    """Collider outline centered on the object, Y up, in the configured unit."""
+    sx, sy = width / VIEWBOX, height / VIEWBOX
+    half = VIEWBOX / 2
+
+    def to_world(vx: float, vy: float) -> tuple[float, float]:
+        return (vx - half) * sx, (half - vy) * sy
+
+    kind = collider.get("type")
+    if kind == "circle" and collider.get("radius"):
+        r = float(collider["radius"]) * min(sx, sy)
+        return [
+            (r * math.cos(2 * math.pi * k / _CIRCLE_SIDES), r * math.sin(2 * math.pi * k / _CIRCLE_SIDES))
+            for k in range(_CIRCLE_SIDES)
+        ]
+    if kind == "box" and collider.get("width") and collider.get("height"):
+        cx, cy = to_world(*(collider.get("center") or (half, half)))
+        w, h = float(collider["width"]) * sx / 2, float(collider["height"]) * sy / 2
+        return [(cx - w, cy - h), (cx + w, cy - h), (cx + w, cy + h), (cx - w, cy + h)]
+    if kind == "convex" and len(collider.get("vertices") or []) >= 3:
+        return _hull([to_world(vx, vy) for vx, vy in collider["vertices"]])
+    return None
+
+
+def _number(value) -> float | None:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return None
+    return result if math.isfinite(result) else None
+
+
+def _position_sliders(config: dict) -> dict[tuple[str, str], dict]:
+    return {
+        (c["targetObj"], c["property"]): c
+        for c in config.get("controls") or []
+        if isinstance(c, dict)
+        and c.get("type") == "slider"
+        and c.get("property") in ("position.x", "position.y")
+        and isinstance(c.get("targetObj"), str)
+    }
+
+
+def _sat(np, polys, centers, pairs):
+    """Penetration depth and push axis (unit, from first to second) per pair."""
+    i, j = pairs[:, 0], pairs[:, 1]
+    edges = np.roll(polys, -1, axis=1) - polys
+    normals = np.stack([-edges[..., 1], edges[..., 0]], axis=-1)
+    length = np.linalg.norm(normals, axis=-1)
+    valid = length > 1e-12
+    normals = normals / np.where(valid, length, 1.0)[..., None]
+
+    axes = np.concatenate([normals[i], normals[j]], axis=1)  # (P, 2V, 2)
+    axis_valid = np.concatenate([valid[i], valid[j]], axis=1)
+    proj_a = np.einsum("pvd,pad->pav", polys[i], axes)
+    proj_b = np.einsum("pvd,pad->pav", polys[j], axes)
+    overlap = np.minimum(proj_a.max(-1), proj_b.max(-1)) - np.maximum(proj_a.min(-1), proj_b.min(-1))
+    overlap = np.where(axis_valid, overlap, np.inf)
+    best = overlap.argmin(axis=1)
+    depth = overlap[np.arange(len(pairs)), best]
+    axis = axes[np.arange(len(pairs)), best]
+    flip = np.einsum("pd,pd->p", centers[j] - centers[i], axis) < 0
+    axis = np.where(flip[:, None], -axis, axis)
+    return depth, axis
+
+
+def separate_objects(config: dict) -> int:
+    """Push overlapping / out-of-canvas objects apart in place. Returns how many moved."""
+    if not fix_overlaps_enabled():
+        return 0
+    np = load_numpy()
+    if np is None:
+        return 0
+    env = config.get("environment") or {}
+    ppu = _number(env.get("pixelsPerUnit")) or 100.0
+    width, height = SIMULATION_WIDTH_PX / ppu, SIMULATION_HEIGHT_PX / ppu
+    index = manifest_index()
+    sliders = _position_sliders(config)
+
+    bodies: list[tuple[dict, list[tuple[float, float]]]] = []
+    positions: list[tuple[float, float]] = []
+    for obj in config.get("objects") or []:
+        if not isinstance(obj, dict):
+            continue
+        entry: ManifestEntry | None = index.get(obj.get("svg"))
+        w, h = _number(obj.get("width")), _number(obj.get("height"))
+        if entry is None or not w or not h or w <= 0 or h <= 0:
+            continue
+        outline = collider_polygon(entry.collider, w, h)
+        x = _number((sliders.get((obj.get("id"), "position.x")) or {}).get("defaultValue"))
+        y = _number((sliders.get((obj.get("id"), "position.y")) or {}).get("defaultValue"))
+        x = x if x is not None else _number(obj.get("x"))
+        y = y if y is not None else _number(obj.get("y"))
+        if outline is None or x is None or y is None:
+            continue
+        angle = _number(obj.get("angle")) or 0.0
+        c, s = math.cos(angle), math.sin(angle)
+        bodies.append((obj, [(px * c - py * s, px * s + py * c) for px, py in outline]))
+        positions.append((x, y))
+    if not bodies:
+        return 0
+
+    with metrics.cpu_section("overlap"):
+        longest = max(len(outline) for _, outline in bodies)
+        local = np.array(
+            [outline + [outline[-1]] * (longest - len(outline)) for _, outline in bodies],
+            dtype=np.float64,
+        )
+        pos = np.array(positions, dtype=np.float64)
+        start = pos.copy()
+        dynamic = np.array([not obj.get("isStatic") for obj, _ in bodies])
+        extent = local.max(axis=1) - local.min(axis=1)
+        size = extent.min(axis=1)
+        n = len(bodies)
+        pairs = np.array([(a, b) for a in range(n) for b in range(a + 1, n) if dynamic[a] or dynamic[b]])
+        overlaps = 0
+        for _ in range(_MAX_ROUNDS):
+            moved = False
+            if len(pairs):
+                depth, axis = _sat(np, local + pos[:, None, :], pos, pairs)
+                slop = _CONTACT_SLOP * np.minimum(size[pairs[:, 0]], size[pairs[:, 1]])
+                hit = depth > slop
+                if hit.any():
+                    overlaps += int(hit.sum())
+                    push = np.zeros_like(pos)
+                    for (a, b), d, ax, s in zip(pairs[hit], depth[hit], axis[hit], slop[hit]):
+                        step = (d + s) * ax
+                        if dynamic[a] and dynamic[b]:
+                            push[a] -= step / 2
+                            push[b] += step / 2
+                        elif dynamic[b]:
+                            push[b] += step
+                        else:
+                            push[a] -= step
+                    pos += push
+                    moved = True
+            # Keep dynamic bodies on the canvas (when they fit on it at all).
+            world = local + pos[:, None, :]
+            lo, hi = world.min(axis=1), world.max(axis=1)
+            fits = extent <= np.array([width, height])
+            shift = np.maximum(0.0, -lo) - np.maximum(0.0, hi - np.array([width, height]))
+            shift = np.where(fits & dynamic[:, None], shift, 0.0)
+            if np.abs(shift).max() > 1e-9:
+                pos += shift
+                moved = True
+            if not moved:
+                break
+
+    changed = 0
+    for (obj, _), (x0, y0), (x1, y1) in zip(bodies, start, pos):
+        if abs(x1 - x0) < 1e-9 and abs(y1 - y0) < 1e-9:
+            continue
+        new_x, new_y = round(float(x1), 4), round(float(y1), 4)
+        logger.info(
+            "overlap: moving %r from (%.4g, %.4g) to (%.4g, %.4g)",
+            obj.get("id"),
+            x0,
+            y0,
+            new_x,
+            new_y,
+        )
+        obj["x"], obj["y"] = new_x, new_y
+        for prop, value in (("position.x", new_x), ("position.y", new_y)):
+            slider = sliders.get((obj.get("id"), prop))
+            if slider is not None:
+                slider["defaultValue"] = value
+                lo, hi = _number(slider.get("min")), _number(slider.get("max"))
+                if lo is not None and value < lo:
+                    slider["min"] = value
+                if hi is not None and value > hi:
+                    slider["max"] = value
+        changed += 1
+    if overlaps:
+        metrics.incr("scene.overlaps_fixed", overlaps)
+    if changed:
+        metrics.incr("scene.objects_moved", changed)
+    return changed
+
+
+__all__ = ["collider_polygon", "fix_overlaps_enabled", "separate_objects"]
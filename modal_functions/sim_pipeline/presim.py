@@ -0,0 +1,374 @@
+"""Headless pre-simulation of a generated scene: graph ranges and slider bounds.
+
+A small vectorized 2D integrator (NumPy) runs the first `PIPELINE_PRESIM_SECONDS`
+(default 10, the frontend's default duration) of the assembled config: objects
+are axis-aligned boxes under gravity, with the environment's walls, restitution
+and air drag. `isStatic` bodies are fixed boxes the others land on and bounce
+off, so a scene built on a static ground needs no bottom wall; contacts between
+moving objects are not modelled, so ranges come out a little wide when they
+collide, never narrower than the free motion.
+
+All variants run as one batch: the scene as loaded (slider defaults applied,
+like the frontend does on reset) plus, per slider that drives motion, the scene
+with that slider at its min and at its max. From the batch:
+
+- every graph plotting position/velocity/acceleration gets a `yAxisRange`
+  covering all variants (acceleration as the per-frame Δv/dt the frontend
+  plots, bounces included), padded and rounded outward — unless a body it plots
+  leaves the canvas in some variant, where the approximation has broken down
+  (the body fell through something the integrator can't see), and the
+  generated range is kept;
+- sliders get sanity bounds: min <= max, position within the canvas,
+  restitution and frictionAir within [0, 1], the default inside the range.
+
+Sliders are corrected before simulating, so the extremes that are simulated are
+the ones the user can reach. `PIPELINE_PRESIM=0` turns it off; without numpy
+it is skipped with a warning.
+"""
+
+import logging
+import math
+import os
+from typing import Any
+
+from pipeline import metrics
+
+from ._context import SIMULATION_HEIGHT_PX, SIMULATION_WIDTH_PX
+
+logger = logging.getLogger(__name__)
+
+# The frontend precomputes at 60 Hz; matching it keeps bounces comparable.
+_DT = 1 / 60
+_RANGE_PADDING = 0.1
+
+# Slider properties the integrator responds to (everything else only gets bounds checks).
+_DRIVING = ("position.x", "position.y", "velocity.x", "velocity.y", "restitution", "frictionAir")
+
+_UNIT_INTERVAL = ("restitution", "frictionAir")
+
+_np = None
+
+
+def presim_enabled() -> bool:
+    return os.environ.get("PIPELINE_PRESIM", "1").lower() not in ("0", "false", "off")
+
+
+def _seconds() -> float:
+    return float(os.environ.get("PIPELINE_PRESIM_SECONDS", "10"))
+
+
+def load_numpy():
+    """numpy, imported on first use (None when it isn't installed)."""
+    global _np
+    if _np is None:
+        try:
+            import numpy
+
+            _np = numpy
+        except ImportError:
+            logger.warning("presim: numpy not installed — graph ranges and slider bounds left as generated")
+            _np = False
+    return _np or None
+
+
+def _number(value: Any, default: float = 0.0) -> float:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return default
+    return result if math.isfinite(result) else default
+
+
+def _nice_step(span: float) -> float:
+    exp = 10 ** math.floor(math.log10(span))
+    for step in (1, 2, 2.5, 5):
+        if step * exp >= span * (1 - 1e-9):
+            return step * exp
+    return 10 * exp
+
+
+def _clean(value: float) -> float | int:
+    value = round(value, 6)
+    return int(value) if value == int(value) else value
+
+
+def nice_range(low: float, high: float) -> tuple[float | int, float | int]:
+    """Pad [low, high] and round it outward to a step of 1/2/2.5/5 × 10^k."""
+    if high - low < 1e-9:
+        half = max(abs(low) * _RANGE_PADDING, 1.0)
+        low, high = low - half, high + half
+    pad = (high - low) * _RANGE_PADDING
+    low, high = low - pad, high + pad
+    step = _nice_step((high - low) / 10)
+    return _clean(math.floor(low / step) * step), _clean(math.ceil(high / step) * step)
+
+
+def _canvas(env: dict) -> tuple[float, float]:
+    ppu = _number(env.get("pixelsPerUnit")) or 100.0
+    return SIMULATION_WIDTH_PX / ppu, SIMULATION_HEIGHT_PX / ppu
+
+
+def _sliders(config: dict, objects: dict[str, dict]) -> list[dict]:
+    return [
+        c
+        for c in config.get("controls") or []
+        if isinstance(c, dict) and c.get("type") == "slider" and c.get("targetObj") in objects
+    ]
+
+
+def fix_slider_bounds(config: dict) -> int:
+    """Clamp slider min/max/default to values the scene can use. Returns how many changed."""
+    env = config.get("environment") or {}
+    width, height = _canvas(env)
+    objects = {o.get("id"): o for o in config.get("objects") or [] if isinstance(o, dict)}
+    changed = 0
+    for control in _sliders(config, objects):
+        obj = objects[control["targetObj"]]
+        prop = control.get("property")
+        lo = _number(control.get("min"))
+        hi = _number(control.get("max"))
+        default = _number(control.get("defaultValue"), lo)
+        if lo > hi:
+            lo, hi = hi, lo
+        if prop in ("position.x", "position.y"):
+            extent, size = (width, "width") if prop == "position.x" else (height, "height")
+            half = min(_number(obj.get(size)) / 2, extent / 2)
+            lo, hi = max(lo, half), min(hi, extent - half)
+        elif prop in _UNIT_INTERVAL:
+            lo, hi = max(lo, 0.0), min(hi, 1.0)
+        elif prop == "mass" and lo <= 0:
+            lo = min(hi, _number(control.get("step"), 0.1) or 0.1)
+        if lo >= hi:
+            continue  # nothing sensible to clamp to; leave it for validation/the user
+        default = min(max(default, lo), hi)
+        new = {"min": _clean(lo), "max": _clean(hi), "defaultValue": _clean(default)}
+        if any(control.get(k) != v for k, v in new.items()):
+            logger.info(
+                "presim: slider %r bounds [%s, %s] default %s -> [%s, %s] default %s",
+                control.get("label"),
+                control.get("min"),
+                control.get("max"),
+                control.get("defaultValue"),
+                new["min"],
+                new["max"],
+                new["defaultValue"],
+            )
+            control.update(new)
+            changed += 1
+    return changed
+
+
+def _initial_state(config: dict) -> tuple[list[str], dict[str, list[float]]]:
+    ids: list[str] = []
+    state: dict[str, list[float]] = {k: [] for k in ("x", "y", "vx", "vy", "ax", "ay", "hw", "hh", "e", "air", "static")}
+    for obj in config.get("objects") or []:
+        if not isinstance(obj, dict) or not obj.get("id"):
+            continue
+        vel = obj.get("velocity") if isinstance(obj.get("velocity"), dict) else {}
+        acc = obj.get("acceleration") if isinstance(obj.get("acceleration"), dict) else {}
+        ids.append(obj["id"])
+        state["x"].append(_number(obj.get("x")))
+        state["y"].append(_number(obj.get("y")))
+        state["vx"].append(_number(vel.get("x")))
+        state["vy"].append(_number(vel.get("y")))
+        state["ax"].append(_number(acc.get("x")))
+        state["ay"].append(_number(acc.get("y")))
+        state["hw"].append(_number(obj.get("width")) / 2)
+        state["hh"].append(_number(obj.get("height")) / 2)
+        state["e"].append(_number(obj.get("restitution"), 0.8))
+        state["air"].append(_number(obj.get("frictionAir")))
+        state["static"].append(1.0 if obj.get("isStatic") else 0.0)
+    return ids, state
+
+
+def _variants(config: dict, ids: list[str]) -> list[list[tuple[int, str, float]]]:
+    """Per variant, the (object index, property, value) overrides to apply."""
+    index = {obj_id: i for i, obj_id in enumerate(ids)}
+    defaults: list[tuple[int, str, float]] = []
+    extremes: list[list[tuple[int, str, float]]] = []
+    for control in config.get("controls") or []:
+        if not isinstance(control, dict) or control.get("targetObj") not in index:
+            continue
+        i = index[control["targetObj"]]
+        prop = control.get("property")
+        if control.get("type") == "toggle" and prop == "isStatic":
+            defaults.append((i, prop, 1.0 if control.get("defaultValue") else 0.0))
+        elif control.get("type") == "slider" and prop in _DRIVING:
+            defaults.append((i, prop, _number(control.get("defaultValue"))))
+            for bound in ("min", "max"):
+                extremes.append([(i, prop, _number(control.get(bound)))])
+    return [defaults] + [defaults + extreme for extreme in extremes]
+
+
+_OVERRIDE_FIELD = {
+    "position.x": "x",
+    "position.y": "y",
+    "velocity.x": "vx",
+    "velocity.y": "vy",
+    "restitution": "e",
+    "frictionAir": "air",
+    "isStatic": "static",
+}
+
+
+def _static_push(np, pos, half, pairs):
+    """(batch, objects, 2) displacement moving each body out of the static box it overlaps most.
+
+    The push is along the axis of least penetration; with several static boxes
+    the deepest one per axis wins, so adjacent floor tiles don't push twice.
+    """
+    offset = pos[:, :, None, :] - pos[:, None, :, :]
+    depth = half[:, :, None, :] + half[:, None, :, :] - np.abs(offset)
+    touching = (depth > 0).all(axis=-1) & pairs
+    if not touching.any():
+        return np.zeros_like(pos)
+    along_y = depth[..., 1] <= depth[..., 0]
+    axis = np.stack([~along_y, along_y], axis=-1) & touching[..., None]
+    push = np.where(axis, np.where(offset >= 0, depth, -depth), 0.0)
+    deepest = np.abs(push).argmax(axis=2)[:, :, None, :]
+    return np.take_along_axis(push, deepest, axis=2)[:, :, 0, :]
+
+
+def simulate(config: dict) -> dict[str, dict[str, tuple[float, float]]] | None:
+    """Run the batch; returns {object id: {property: (min, max)}} over all variants."""
+    np = load_numpy()
+    if np is None:
+        return None
+    ids, state = _initial_state(config)
+    if not ids:
+        return {}
+    env = config.get("environment") or {}
+    width, height = _canvas(env)
+    gravity = _number(env.get("gravity"), 9.8)
+    walls = set(env.get("walls") or [])
+
+    variants = _variants(config, ids)
+    batch = len(variants)
+    base = {k: np.tile(np.asarray(v, dtype=np.float64), (batch, 1)) for k, v in state.items()}
+    for b, overrides in enumerate(variants):
+        for i, prop, value in overrides:
+            base[_OVERRIDE_FIELD[prop]][b, i] = value
+
+    # (batch, objects, 2) state; static bodies never move.
+    moving = (base["static"] < 0.5)[..., None]
+    pos = np.stack([base["x"], base["y"]], axis=-1)
+    vel = np.stack([base["vx"], base["vy"]], axis=-1) * moving
+    acc = np.stack([base["ax"], base["ay"] - gravity], axis=-1) * moving
+    half = np.stack([base["hw"], base["hh"]], axis=-1)
+    restitution = np.clip(base["e"], 0.0, 1.0)[..., None]
+    # Matter-style per-tick drag at 60 Hz.
+    drag = ((1.0 - np.clip(base["air"], 0.0, 1.0)) ** (_DT * 60))[..., None]
+
+    # (batch, moving, static) pairs that can touch; toggles can change either side.
+    static = ~moving[..., 0]
+    pairs = moving[..., 0][:, :, None] & static[:, None, :]
+    any_pairs = bool(pairs.any())
+
+    inf = np.inf
+    lower = np.where([["left" in walls, "bottom" in walls]], half, -inf)
+    upper = np.where([["right" in walls, "top" in walls]], np.array([width, height]) - half, inf)
+    # Below this speed a bounce is resting contact, not a bounce.
+    rest_speed = abs(gravity) * _DT * 2
+
+    pos_lo, pos_hi = pos.copy(), pos.copy()
+    vel_lo, vel_hi = vel.copy(), vel.copy()
+    # The frontend plots acceleration as Δv/dt per frame (0 on the first), so
+    # resting contact reads 0 and a bounce reads as a spike; track the same.
+    acc_lo, acc_hi = np.zeros_like(vel), np.zeros_like(vel)
+    step_acc = acc * _DT
+    for _ in range(max(1, int(_seconds() / _DT))):
+        before = vel.copy()
+        vel += step_acc
+        vel *= drag
+        pos += vel * _DT
+        hit = ((pos < lower) | (pos > upper)) & moving
+        if hit.any():
+            pos = np.where(hit, np.clip(pos, lower, upper), pos)
+            bounced = -vel * restitution
+            bounced[np.abs(bounced) < rest_speed] = 0.0
+            vel = np.where(hit, bounced, vel)
+        if any_pairs:
+            push = _static_push(np, pos, half, pairs)
+            pos += push
+            blocked = (push != 0) & (vel * push < 0)
+            if blocked.any():
+                bounced = -vel * restitution
+                bounced[np.abs(bounced) < rest_speed] = 0.0
+                vel = np.where(blocked, bounced, vel)
+        np.minimum(pos_lo, pos, out=pos_lo)
+        np.maximum(pos_hi, pos, out=pos_hi)
+        np.minimum(vel_lo, vel, out=vel_lo)
+        np.maximum(vel_hi, vel, out=vel_hi)
+        step = (vel - before) / _DT
+        np.minimum(acc_lo, step, out=acc_lo)
+        np.maximum(acc_hi, step, out=acc_hi)
+
+    # A body entirely off the canvas in any variant.
+    escaped = ((pos_hi < -half) | (pos_lo > np.array([width, height]) + half)).any(axis=(0, 2))
+    pos_lo, pos_hi = pos_lo.min(axis=0), pos_hi.max(axis=0)
+    vel_lo, vel_hi = vel_lo.min(axis=0), vel_hi.max(axis=0)
+    acc_lo, acc_hi = acc_lo.min(axis=0), acc_hi.max(axis=0)
+    ranges: dict[str, dict[str, tuple[float, float]]] = {}
+    for i, obj_id in enumerate(ids):
+        if escaped[i]:
+            # No range beats one fitted to a body falling through the floor.
+            metrics.incr("presim.escaped")
+            logger.info("presim: %r leaves the canvas; keeping its generated graph ranges", obj_id)
+            continue
+        ranges[obj_id] = {
+            f"{name}.{axis}": (float(lo[i, a]), float(hi[i, a]))
+            for name, lo, hi in (
+                ("position", pos_lo, pos_hi),
+                ("velocity", vel_lo, vel_hi),
+                ("acceleration", acc_lo, acc_hi),
+            )
+            for a, axis in enumerate("xy")
+        }
+    return ranges
+
+
+def fit_graph_ranges(config: dict, ranges: dict[str, dict[str, tuple[float, float]]]) -> int:
+    """Set each graph's yAxisRange from simulated ranges. Returns how many changed."""
+    changed = 0
+    for graph in config.get("graphs") or []:
+        if not isinstance(graph, dict):
+            continue
+        spans = [
+            ranges.get(line.get("targetObj"), {}).get(line.get("property"))
+            for line in graph.get("lines") or []
+            if isinstance(line, dict)
+        ]
+        if not spans or any(span is None for span in spans):
+            continue  # a line we didn't simulate: keep the generated range
+        low, high = nice_range(min(s[0] for s in spans), max(s[1] for s in spans))
+        new = {"min": low, "max": high}
+        if graph.get("yAxisRange") != new:
+            logger.info("presim: graph %r yAxisRange %s -> %s", graph.get("title"), graph.get("yAxisRange"), new)
+            graph["yAxisRange"] = new
+            changed += 1
+    return changed
+
+
+def refine_config(config: dict) -> None:
+    """Fix slider bounds and fit graph ranges in place (no-op when disabled or numpy is missing)."""
+    if not presim_enabled() or load_numpy() is None:
+        return
+    with metrics.cpu_section("presim"):
+        sliders = fix_slider_bounds(config)
+        ranges = simulate(config)
+        graphs = fit_graph_ranges(config, ranges) if ranges else 0
+    if sliders:
+        metrics.incr("presim.sliders_adjusted", sliders)
+    if graphs:
+        metrics.incr("presim.graph_ranges_set", graphs)
+
+
+__all__ = [
+    "fit_graph_ranges",
+    "fix_slider_bounds",
+    "load_numpy",
+    "nice_range",
+    "presim_enabled",
+    "refine_config",
+    "simulate",
+]
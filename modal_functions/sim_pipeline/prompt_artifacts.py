@@ -0,0 +1,133 @@
+"""Build-time precomputation of every static prompt block.
+
+Run from the Modal image definition (see `generate_simulation.py`):
+
+    python -m sim_pipeline.prompt_artifacts --out /root/_prompt_artifacts.py
+
+It renders the schema block, the approved-SVG list, and each stage's static
+system prompt (preamble + fragment + schema), then writes them as string
+constants in an importable module together with a content hash of the inputs.
+`_context.py` imports that module when it exists, so a cold container serves
+its first request from the unmarshalled .pyc instead of reading and
+re-serializing the schema and manifest files.
+
+Stages are keyed by `module.QualName`. Remix stages are included when
+`sim_pipeline_remix` is importable (i.e. in the remix image).
+"""
+
+import argparse
+import hashlib
+import importlib
+import logging
+import os
+import py_compile
+
+from ._context import (
+    _manifest_path,
+    _schema_path,
+    render_manifest_names_block,
+    render_schema_block,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rendering changes in a way the input files don't capture.
+ARTIFACT_FORMAT_VERSION = 1
+
+_STAGE_MODULES = (
+    "sim_pipeline.skeleton",
+    "sim_pipeline.objects_fill",
+    "sim_pipeline.controls_fill",
+    "sim_pipeline.graphs_fill",
+    "sim_pipeline.outputs_fill",
+    "sim_pipeline.details_fill",
+    "sim_pipeline_remix.router",
+    "sim_pipeline_remix.objects_remix",
+    "sim_pipeline_remix.controls_remix",
+    "sim_pipeline_remix.graphs_remix",
+    "sim_pipeline_remix.outputs_remix",
+)
+
+
+def _instructions_path() -> str:
+    import gist_instructions  # type: ignore[import-not-found]
+
+    return os.path.abspath(gist_instructions.__file__)
+
+
+def content_hash() -> str:
+    """sha256 over every input that shapes the static prompts."""
+    digest = hashlib.sha256(f"format={ARTIFACT_FORMAT_VERSION}".encode())
+    for path in (_schema_path(), _manifest_path(), _instructions_path()):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def stage_key(cls: type) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def _stage_classes() -> list[type]:
+    from ._base import JsonStage
+
+    classes = []
+    for module_name in _STAGE_MODULES:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            logger.info("prompt_artifacts: %s not importable here, skipping", module_name)
+            continue
+        for value in vars(module).values():
+            if (
+                isinstance(value, type)
+                and issubclass(value, JsonStage)
+                and value.__module__ == module_name
+            ):
+                classes.append(value)
+    return classes
+
+
+def render() -> dict:
+    return {
+        "CONTENT_HASH": content_hash(),
+        "SCHEMA_BLOCK": render_schema_block(),
+        "MANIFEST_NAMES_BLOCK": render_manifest_names_block(),
+        "SYSTEM_PROMPTS": {
+            stage_key(cls): cls().static_system_prompt() for cls in _stage_classes()
+        },
+    }
+
+
+def write(out_path: str) -> dict:
+    artifacts = render()
+    lines = [
+        '"""Generated by sim_pipeline.prompt_artifacts — do not edit."""',
+        "",
+    ]
+    for name, value in artifacts.items():
+        lines.append(f"{name} = {value!r}")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp = f"{out_path}.tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, out_path)
+    # Compile now so the first import in a container is an unmarshal, not a parse.
+    py_compile.compile(out_path, doraise=True)
+    return artifacts
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute static prompt blocks.")
+    parser.add_argument("--out", default="/root/_prompt_artifacts.py")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    artifacts = write(args.out)
+    print(
+        f"wrote {args.out}: hash={artifacts['CONTENT_HASH'][:12]} "
+        f"stages={len(artifacts['SYSTEM_PROMPTS'])}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Sharded objects and controls fills for large multi-body scenes.
+
+One objects call for a twenty-body scene emits every ObjectConfig
+sequentially, and its latency grows with the object count. `run_sharded`
+splits the skeleton's `object_skeletons` (or `control_intents`) into batches
+of at most `PIPELINE_SHARD_SIZE` (default 6), runs the unchanged stage once
+per batch against a narrowed copy of the scratch — the skeleton lists only the
+batch; the controls stage also sees only the objects the batch targets — and
+merges the shards' slices back in skeleton order:
+
+- objects are keyed by `id`, controls by (`targetObj`, `property`);
+- an entry for an id outside its shard's batch, or one already claimed by an
+  earlier shard, is dropped (`shard.<stage>.unexpected` / `.duplicates`);
+- a batch id no shard produced is logged and counted (`shard.<stage>.missing`)
+  and left to schema validation and repair.
+
+Shards run concurrently; `pipeline.llm` bounds how many calls reach each
+provider at once. Spatial collisions between objects placed by different
+shards are resolved at assembly by `overlap.separate_objects`, as for any
+other scene. Each shard goes through the model cascade and the stage's retry
+budget (`cascade.run_cascaded`); if one still fails, the siblings are
+cancelled and the stage fails as a whole. Smaller scenes, and every other
+stage, go straight to `run_cascaded`.
+`PIPELINE_SHARD_SIZE=0` turns sharding off.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+
+from pipeline import Scratch, Stage, cancel_pending, metrics
+
+from .cascade import run_cascaded
+
+logger = logging.getLogger(__name__)
+
+
+def shard_size() -> int:
+    return int(os.environ.get("PIPELINE_SHARD_SIZE", "6"))
+
+
+@dataclass(frozen=True)
+class ShardSpec:
+    # Skeleton list that is split across shards.
+    items_key: str
+    # The batch ids an item covers, and the merge key of an output entry.
+    item_id: Callable[[dict], Any]
+    entry_id: Callable[[dict], Hashable]
+    entry_owner: Callable[[dict], Any]
+
+
+SHARD_SPECS: dict[str, ShardSpec] = {
+    "objects": ShardSpec(
+        items_key="object_skeletons",
+        item_id=lambda item: item.get("id"),
+        entry_id=lambda entry: entry.get("id"),
+        entry_owner=lambda entry: entry.get("id"),
+    ),
+    "controls": ShardSpec(
+        items_key="control_intents",
+        item_id=lambda item: item.get("target_id"),
+        entry_id=lambda entry: (entry.get("targetObj"), entry.get("property")),
+        entry_owner=lambda entry: entry.get("targetObj"),
+    ),
+}
+
+
+def _items(spec: ShardSpec, scratch: Scratch) -> list[dict]:
+    skeleton = scratch.artifacts.get("skeleton")
+    items = skeleton.get(spec.items_key) if isinstance(skeleton, dict) else None
+    return [item for item in items or [] if isinstance(item, dict)]
+
+
+def split(items: list, size: int) -> list[list]:
+    """`items` in order, as the fewest batches of at most `size`, balanced in length."""
+    n_shards = -(-len(items) // size)
+    base, extra = divmod(len(items), n_shards)
+    batches, start = [], 0
+    for i in range(n_shards):
+        end = start + base + (1 if i < extra else 0)
+        batches.append(items[start:end])
+        start = end
+    return batches
+
+
+def _shard_scratch(stage: Stage, spec: ShardSpec, scratch: Scratch, batch: list[dict]) -> Scratch:
+    artifacts = {**scratch.artifacts, "skeleton": {**scratch.artifacts["skeleton"], spec.items_key: batch}}
+    if stage.name == "controls":
+        targets = {spec.item_id(item) for item in batch}
+        objects = (scratch.artifacts.get("objects") or {}).get("objects") or []
+        artifacts["objects"] = {"objects": [o for o in objects if isinstance(o, dict) and o.get("id") in targets]}
+    # meta is shared so repair flags and prompt sizes still apply/record.
+    return Scratch(history=scratch.history, artifacts=artifacts, meta=scratch.meta)
+
+
+def merge_shards(stage: Stage, spec: ShardSpec, batches: list[list[dict]], slices: list[Any]) -> list[dict]:
+    """The shards' entries in batch order, deduplicated by id (see the module docstring)."""
+    merged: list[dict] = []
+    seen: set = set()
+    produced: set = set()
+    for batch, value in zip(batches, slices):
+        owned = {spec.item_id(item) for item in batch}
+        entries = (value or {}).get(stage.name) if isinstance(value, dict) else None
+        for entry in entries or []:
+            if not isinstance(entry, dict):
+                continue
+            if spec.entry_owner(entry) not in owned:
+                metrics.incr(f"shard.{stage.name}.unexpected")
+                logger.warning("sharding[%s]: dropping %r, not in its shard", stage.name, spec.entry_id(entry))
+                continue
+            key = spec.entry_id(entry)
+            if key in seen:
+                metrics.incr(f"shard.{stage.name}.duplicates")
+                logger.warning("sharding[%s]: dropping duplicate %r", stage.name, key)
+                continue
+            seen.add(key)
+            produced.add(spec.entry_owner(entry))
+            merged.append(entry)
+    missing = [spec.item_id(item) for batch in batches for item in batch if spec.item_id(item) not in produced]
+    if missing:
+        metrics.incr(f"shard.{stage.name}.missing", len(missing))
+        logger.warning("sharding[%s]: no entry for %s", stage.name, missing)
+    return merged
+
+
+async def run_sharded(stage: Stage, scratch: Scratch, *, log_prefix: str = "stage") -> None:
+    """Run `stage` into scratch.artifacts, split into concurrent shards when the scene is large."""
+    spec = SHARD_SPECS.get(stage.name)
+    size = shard_size()
+    items = _items(spec, scratch) if spec is not None else []
+    if spec is None or size <= 0 or len(items) <= size:
+        await run_cascaded(stage, scratch, log_prefix=log_prefix)
+        return
+    started = time.monotonic()
+    batches = split(items, size)
+    shards = [_shard_scratch(stage, spec, scratch, batch) for batch in batches]
+    logger.info(
+        "%s[%s]: %d %s in %d shards of <=%d",
+        log_prefix,
+        stage.name,
+        len(items),
+        spec.items_key,
+        len(batches),
+        size,
+    )
+    pending = {
+        asyncio.create_task(
+            run_cascaded(stage, shard, log_prefix=f"{log_prefix}#{i}")
+        ): i
+        for i, shard in enumerate(shards)
+    }
+    try:
+        await asyncio.gather(*pending)
+    finally:
+        await cancel_pending(pending)
+    merged = merge_shards(stage, spec, batches, [s.artifacts.get(stage.name) for s in shards])
+    scratch.artifacts[stage.name] = {stage.name: merged}
+    metrics.observe(f"shard.{stage.name}.shards", len(batches))
+    metrics.observe(f"shard.{stage.name}.wall_s", time.monotonic() - started)
+
+
+__all__ = ["SHARD_SPECS", "ShardSpec", "merge_shards", "run_sharded", "shard_size", "split"]
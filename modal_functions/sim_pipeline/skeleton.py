@@ -14,11 +14,8 @@ from pipeline import Scratch
 from gist_instructions import skeleton_fragment  # type: ignore[import-not-found]
 
 from ._base import JsonStage
-from ._context import (
-    SIMULATION_HEIGHT_PX,
-    SIMULATION_WIDTH_PX,
-    manifest_names_block,
-)
+from ._context import SIMULATION_HEIGHT_PX, SIMULATION_WIDTH_PX
+from .svg_retrieval import request_text, svg_candidates_block
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +28,24 @@ class SkeletonStage(JsonStage):
     stage_fragment = skeleton_fragment
 
     def extra_blocks(self, scratch: Scratch) -> str:
-        return manifest_names_block()
+        return svg_candidates_block(request_text(scratch))
+
+    def repair_turns(self, previous: str, errors: list[str]) -> list[dict]:
+        # Only title/description/environment are taken from a repair (see
+        # validate.SLICE_OWNERS); the object plan has already been filled in.
+        listed = "\n".join(f"- {e}" for e in errors)
+        return [
+            {"role": "assistant", "content": previous},
+            {
+                "role": "user",
+                "content": (
+                    f"The simulation built from that skeleton failed schema validation:\n{listed}\n\n"
+                    "Return the full corrected skeleton object. Fix only the title, "
+                    "description or environment fields the errors point at; keep "
+                    "scene_dimension and every other key exactly as it was."
+                ),
+            },
+        ]
 
     def parse(self, response: str) -> Any:
         value = super().parse(response)
@@ -0,0 +1,149 @@
+"""Prompt-relevant SVG candidates instead of the full manifest list.
+
+The skeleton and objects stages used to append every approved svg name to
+their system prompt. `svg_candidates_block` lists only the top
+`PIPELINE_SVG_TOP_K` (default 24) matches for the request, plus the svgs the
+caller already committed to and a few generic shapes, so the block stays the
+same size however large the manifest grows.
+
+Retrieval is Okapi BM25 over each item's name, display name and parent,
+indexed as words plus boundary-marked character trigrams — "ball" still finds
+`baseball` and `cannonball`, "boxes" finds `box`. The index is built from
+`manifest_index()` on first use (see `warm_caches`); no network, no models.
+
+`PIPELINE_SVG_TOP_K=0` restores the full list.
+"""
+
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Iterable
+
+from pipeline import Scratch, metrics
+
+from ._context import manifest_names_block
+from .manifest_index import manifest_index
+
+# Always offered: shapes that stand in for almost anything.
+GENERIC_SVGS = ("box", "sphere", "cylinder", "crate", "wooden_block", "soccer_ball")
+
+_K1 = 1.2
+_B = 0.75
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in into is it of on or show that the then this to "
+    "with its their make let over time what when where which while will would".split()
+)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def top_k() -> int:
+    return int(os.environ.get("PIPELINE_SVG_TOP_K", "24"))
+
+
+def text_terms(text: str) -> list[str]:
+    """Words (minus stopwords) plus their boundary-marked character trigrams."""
+    terms: list[str] = []
+    for word in _WORD.findall(text.lower()):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        terms.append(f"w:{word}")
+        marked = f"#{word}#"
+        terms.extend(marked[i : i + 3] for i in range(len(marked) - 2))
+    return terms
+
+
+class SvgRetriever:
+    """BM25 over approved manifest items. Build with `svg_retriever()`."""
+
+    def __init__(self, docs: dict[str, str]) -> None:
+        self.names = list(docs)
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for i, name in enumerate(self.names):
+            counts = Counter(text_terms(docs[name]))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((i, tf))
+        self._avg_len = sum(lengths) / max(1, len(lengths))
+        self._norm = [_K1 * (1 - _B + _B * n / self._avg_len) for n in lengths]
+        n_docs = len(self.names)
+        self._idf = {
+            term: math.log(1 + (n_docs - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self._postings.items()
+        }
+
+    def search(self, query: str, k: int) -> list[str]:
+        """Names of the `k` best-scoring items for `query` (fewer if fewer match)."""
+        scores: dict[int, float] = defaultdict(float)
+        for term, qtf in Counter(text_terms(query)).items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for doc, tf in postings:
+                scores[doc] += qtf * idf * tf * (_K1 + 1) / (tf + self._norm[doc])
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.names[item[0]]))
+        return [self.names[doc] for doc, _ in ranked[:k]]
+
+
+_retriever: SvgRetriever | None = None
+
+
+def svg_retriever() -> SvgRetriever:
+    """The retrieval index over the approved manifest (built once per process)."""
+    global _retriever
+    if _retriever is None:
+        _retriever = SvgRetriever(
+            {
+                e.name: " ".join(filter(None, (e.name.replace("_", " "), e.display_name, e.parent)))
+                for e in manifest_index()
+            }
+        )
+    return _retriever
+
+
+def request_text(scratch: Scratch) -> str:
+    """The user's side of the conversation — what the retrieval query is built from."""
+    return "\n".join(
+        str(m.get("content", "")) for m in scratch.history if m.get("role") == "user"
+    )
+
+
+def svg_candidates_block(query: str, include: Iterable[str] = ()) -> str:
+    """AVAILABLE SVGs block listing the best matches for `query`.
+
+    `include` names (e.g. svgs the skeleton already chose) are always listed.
+    Falls back to the full list when top-k is 0 or wouldn't save anything.
+    """
+    k = top_k()
+    index = manifest_index()
+    if k <= 0 or len(index) <= k + len(GENERIC_SVGS):
+        return manifest_names_block()
+    chosen: dict[str, None] = {}
+    for name in (*include, *svg_retriever().search(query, k), *GENERIC_SVGS):
+        if name in index:
+            chosen[name] = None
+    metrics.observe("svg_retrieval.candidates", len(chosen))
+    lines = [f"- {name} — {index.get(name).display_name}" for name in chosen]
+    return (
+        "## AVAILABLE SVGs\n\n"
+        "Pick the object's `svg` field verbatim from the left-hand identifier. "
+        "Do not invent names. Each entry's collider shape and visual sprite "
+        "are bundled together — choose by real-world resemblance to the user's "
+        f"request. These are the {len(chosen)} entries (of {len(index)}) that best "
+        "match this request; if none fits, use a generic shape such as `box` or "
+        "`sphere`.\n\n" + "\n".join(lines)
+    )
+
+
+__all__ = [
+    "GENERIC_SVGS",
+    "SvgRetriever",
+    "request_text",
+    "svg_candidates_block",
+    "svg_retriever",
+    "text_terms",
+]
@@ -0,0 +1,239 @@
+"""Nearest existing simulation for a new request, to remix instead of generating.
+
+Many requests are close variations of a simulation we already have ("toss a
+ball straight up" vs. the Toss Ball sim). For those, remixing the existing
+config touches one or two slices instead of running all five stages.
+
+`template_index()` indexes a directory of SimulationConfig JSON files — the
+bundled classics in `src/simulations` (copied to `/root/simulation_templates`
+in the image), plus any published, well-rated simulations exported there. A
+file is either a bare SimulationConfig or a record
+`{"config": {...}, "prompt": "...", "published": true, "endorsements": 3}`;
+unpublished records, records under `PIPELINE_TEMPLATE_MIN_ENDORSEMENTS`, and
+configs that fail the schema are skipped. `PIPELINE_TEMPLATES_DIR` points it
+somewhere else.
+
+Each template is embedded from its title, description, originating prompt and
+object svgs with a hashing vectorizer (the words and character trigrams of
+`svg_retrieval.text_terms`, signed-hashed into `_DIM` buckets, log-tf × idf,
+L2-normalised), so no vocabulary or model is stored. `nearest_template`
+returns the best cosine match for a new request when it clears
+`PIPELINE_TEMPLATE_THRESHOLD`; `PIPELINE_TEMPLATES=0` turns retrieval off.
+"""
+
+import copy
+import glob
+import json
+import logging
+import math
+import os
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+
+from pipeline import metrics
+
+from ._context import _HERE
+from .manifest_index import manifest_index
+from .presim import load_numpy
+from .svg_retrieval import text_terms
+
+logger = logging.getLogger(__name__)
+
+_DIM = 1 << 14
+
+# Field weights: the title and the prompt that produced a sim say the most
+# about what it is.
+_TITLE_WEIGHT = 2.0
+_PROMPT_WEIGHT = 2.0
+_DESCRIPTION_WEIGHT = 1.0
+_SVG_WEIGHT = 1.0
+
+
+def templates_enabled() -> bool:
+    return os.environ.get("PIPELINE_TEMPLATES", "1").lower() not in ("0", "false", "off")
+
+
+def template_threshold() -> float:
+    return float(os.environ.get("PIPELINE_TEMPLATE_THRESHOLD", "0.3"))
+
+
+def _min_endorsements() -> int:
+    return int(os.environ.get("PIPELINE_TEMPLATE_MIN_ENDORSEMENTS", "0"))
+
+
+def _templates_dir() -> str | None:
+    override = os.environ.get("PIPELINE_TEMPLATES_DIR")
+    if override:
+        return override if os.path.isdir(override) else None
+    for path in (
+        "/root/simulation_templates",
+        os.path.join(_HERE, "..", "..", "src", "simulations"),
+    ):
+        if os.path.isdir(path):
+            return path
+    return None
+
+
+@dataclass(frozen=True)
+class Template:
+    name: str
+    title: str
+    config: dict = field(compare=False)
+    # The text the template is embedded from.
+    text: tuple[tuple[str, float], ...] = field(default=(), compare=False)
+
+
+def _template_text(config: dict, prompt: str | None) -> tuple[tuple[str, float], ...]:
+    index = manifest_index()
+    svgs = []
+    for obj in config.get("objects") or []:
+        svg = obj.get("svg") if isinstance(obj, dict) else None
+        if isinstance(svg, str):
+            entry = index.get(svg)
+            svgs.append(svg.replace("_", " "))
+            if entry is not None and entry.display_name:
+                svgs.append(entry.display_name)
+    fields = (
+        (str(config.get("title") or ""), _TITLE_WEIGHT),
+        (str(prompt or ""), _PROMPT_WEIGHT),
+        (str(config.get("description") or ""), _DESCRIPTION_WEIGHT),
+        (" ".join(svgs), _SVG_WEIGHT),
+    )
+    return tuple((text, weight) for text, weight in fields if text)
+
+
+def _load_template(path: str) -> Template | None:
+    from .validate import validate_config
+
+    try:
+        with open(path) as f:
+            record = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning("templates: skipping %s (%s)", path, e)
+        return None
+    if not isinstance(record, dict):
+        return None
+    config = record.get("config") if "config" in record else record
+    if not isinstance(config, dict) or not config.get("objects"):
+        return None
+    if record.get("published") is False:
+        return None
+    endorsements = record.get("endorsements")
+    if isinstance(endorsements, int) and endorsements < _min_endorsements():
+        return None
+    errors = validate_config(config)
+    if errors:
+        logger.warning("templates: skipping %s, schema errors: %s", path, errors)
+        return None
+    name = os.path.splitext(os.path.basename(path))[0]
+    return Template(
+        name=name,
+        title=str(config.get("title") or name),
+        config=config,
+        text=_template_text(config, record.get("prompt")),
+    )
+
+
+def _hashed_counts(fields) -> Counter:
+    """Weighted, signed term counts per hash bucket."""
+    counts: Counter = Counter()
+    for text, weight in fields:
+        for term in text_terms(text):
+            h = zlib.crc32(term.encode())
+            counts[h % _DIM] += weight if h & 0x80000000 else -weight
+    return counts
+
+
+class TemplateIndex:
+    """Hashed tf-idf vectors over the template corpus. Build with `template_index()`."""
+
+    def __init__(self, np, templates: list[Template]) -> None:
+        self._np = np
+        self.templates = templates
+        matrix = np.zeros((len(templates), _DIM), dtype=np.float64)
+        for row, template in enumerate(templates):
+            for bucket, value in _hashed_counts(template.text).items():
+                matrix[row, bucket] = value
+        df = np.count_nonzero(matrix, axis=0)
+        self._idf = np.log((1 + len(templates)) / (1 + df)) + 1.0
+        self._matrix = self._normalise(matrix)
+
+    def _normalise(self, matrix):
+        np = self._np
+        weighted = np.sign(matrix) * np.log1p(np.abs(matrix)) * self._idf
+        norms = np.linalg.norm(weighted, axis=-1, keepdims=True)
+        return weighted / np.where(norms > 0, norms, 1.0)
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def nearest(self, query: str) -> tuple[Template, float] | None:
+        """Best-matching template and its cosine similarity (None when nothing overlaps)."""
+        if not self.templates:
+            return None
+        np = self._np
+        vector = np.zeros(_DIM, dtype=np.float64)
+        for bucket, value in _hashed_counts(((query, 1.0),)).items():
+            vector[bucket] = value
+        scores = self._matrix @ self._normalise(vector)
+        best = int(scores.argmax())
+        score = float(scores[best])
+        return (self.templates[best], score) if score > 0 else None
+
+
+_index: TemplateIndex | None = None
+
+
+def template_index() -> TemplateIndex | None:
+    """The template corpus, indexed (built once per process). None without numpy."""
+    global _index
+    if _index is None:
+        np = load_numpy()
+        if np is None:
+            return None
+        directory = _templates_dir()
+        paths = sorted(glob.glob(os.path.join(directory, "*.json"))) if directory else []
+        templates = [t for t in map(_load_template, paths) if t is not None]
+        _index = TemplateIndex(np, templates)
+        logger.info("templates: indexed %d of %d files from %s", len(templates), len(paths), directory)
+    return _index
+
+
+def nearest_template(messages: list[dict]) -> tuple[dict, float] | None:
+    """A copy of the template to remix for a new request, and its score.
+
+    Only fresh requests (a single user message) are matched; follow-ups carry
+    context the template doesn't. None when retrieval is off or nothing clears
+    the threshold.
+    """
+    if not templates_enabled():
+        return None
+    user = [m for m in messages if isinstance(m, dict) and m.get("role") == "user"]
+    if len(user) != 1 or not isinstance(user[0].get("content"), str):
+        return None
+    index = template_index()
+    if index is None or not len(index):
+        return None
+    with metrics.cpu_section("templates"):
+        match = index.nearest(user[0]["content"])
+    threshold = template_threshold()
+    if match is None or match[1] < threshold or math.isnan(match[1]):
+        metrics.incr("templates.miss")
+        if match is not None:
+            logger.info("templates: best %r scored %.3f < %.2f", match[0].name, match[1], threshold)
+        return None
+    template, score = match
+    metrics.incr("templates.hit")
+    logger.info("templates: remixing %r (score %.3f)", template.name, score)
+    return copy.deepcopy(template.config), score
+
+
+__all__ = [
+    "Template",
+    "TemplateIndex",
+    "nearest_template",
+    "template_index",
+    "template_threshold",
+    "templates_enabled",
+]
@@ -0,0 +1,216 @@
+"""Compiled schema validation of assembled SimulationConfigs, plus slice repair.
+
+`simulation_schema.json` is compiled with fastjsonschema (generated Python
+code, not an interpreting validator) once per process — `warm_caches()` does
+it at container start. Array slices are validated item by item so one bad
+control doesn't hide the next, and errors are reported per top-level key:
+
+    {"controls": ["controls[1].max must be number"], ...}
+
+Items that are a `oneOf` over a `type` discriminator (controls, graphs) are
+re-checked against the branch their `type` names, so the error points at the
+offending field instead of "must be valid exactly by one definition".
+
+`validate_slice` checks one slice on its own (the model cascade uses it on
+each fresh stage output). `repair_slices` re-runs only the stages that own failing slices, passing them
+their previous output and the errors (see `JsonStage.build_messages`).
+Most slices are owned by the stage of the same name; `SLICE_OWNERS` lists
+the rest (the skeleton writes title, description and environment), and
+`errors_by_stage` regroups `validate_config`'s errors accordingly. A stage
+repaired for keys in `SLICE_OWNERS` only changes those keys of its artifact,
+so a skeleton repair doesn't re-plan objects the later stages already filled.
+
+fastjsonschema is optional: without it validation is skipped with a warning.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Callable
+
+from pipeline import Scratch, Stage, cancel_pending, metrics
+
+from ._context import load_schema
+from ._runner import run_stage
+
+logger = logging.getLogger(__name__)
+
+# Errors kept per slice; enough for a targeted fix without flooding the prompt.
+_MAX_ERRORS_PER_SLICE = 8
+
+Validator = Callable[[Any], Any]
+
+# Top-level config keys not written by a stage of the same name.
+SLICE_OWNERS = {"title": "skeleton", "description": "skeleton", "environment": "skeleton"}
+
+# key -> (per_item, validator, {type discriminator: branch validator}).
+# None until compiled; {} when fastjsonschema is missing.
+_validators: dict[str, tuple[bool, Validator, dict[str, Validator]]] | None = None
+
+
+def repair_rounds() -> int:
+    """How many validate → repair rounds to run (`PIPELINE_REPAIR_ROUNDS`, default 1)."""
+    return int(os.environ.get("PIPELINE_REPAIR_ROUNDS", "1"))
+
+
+def _branch_validators(schema: dict, compile_fn) -> dict[str, Validator]:
+    branches: dict[str, Validator] = {}
+    for branch in schema.get("oneOf") or []:
+        type_prop = (branch.get("properties") or {}).get("type") or {}
+        for value in type_prop.get("enum") or []:
+            branches[value] = compile_fn(branch, use_default=False)
+    return branches
+
+
+def compiled_validators() -> dict[str, tuple[bool, Validator, dict[str, Validator]]]:
+    global _validators
+    if _validators is None:
+        try:
+            import fastjsonschema
+        except ImportError:
+            logger.warning("validate: fastjsonschema not installed — config validation disabled")
+            _validators = {}
+            return _validators
+        validators = {}
+        for key, prop in load_schema().get("properties", {}).items():
+            # use_default=False: validation must not fill defaults into the config.
+            if prop.get("type") == "array" and isinstance(prop.get("items"), dict):
+                items = prop["items"]
+                validators[key] = (
+                    True,
+                    fastjsonschema.compile(items, use_default=False),
+                    _branch_validators(items, fastjsonschema.compile),
+                )
+            else:
+                validators[key] = (False, fastjsonschema.compile(prop, use_default=False), {})
+        _validators = validators
+    return _validators
+
+
+def _describe(exc: Exception, path: str) -> str:
+    message = getattr(exc, "message", str(exc))
+    # fastjsonschema names the validated value "data"; point at the real path.
+    if message.startswith("data"):
+        message = path + message[len("data") :]
+    return message
+
+
+def _item_error(exc: Exception, item: Any, branches: dict[str, Validator], path: str) -> str:
+    if not branches:
+        return _describe(exc, path)
+    kind = item.get("type") if isinstance(item, dict) else None
+    branch = branches.get(kind) if isinstance(kind, str) else None
+    if branch is None:
+        return f"{path}.type must be one of {sorted(branches)}"
+    try:
+        branch(item)
+    except Exception as e:  # fastjsonschema.JsonSchemaException
+        return _describe(e, path)
+    return _describe(exc, path)
+
+
+def _slice_errors(key: str, value: Any, per_item: bool, validator: Validator, branches) -> list[str]:
+    import fastjsonschema
+
+    found: list[str] = []
+    if per_item and isinstance(value, list):
+        for i, item in enumerate(value):
+            try:
+                validator(item)
+            except fastjsonschema.JsonSchemaException as e:
+                found.append(_item_error(e, item, branches, f"{key}[{i}]"))
+                if len(found) >= _MAX_ERRORS_PER_SLICE:
+                    break
+    elif per_item:
+        found.append(f"{key}: must be array")
+    else:
+        try:
+            validator(value)
+        except fastjsonschema.JsonSchemaException as e:
+            found.append(_describe(e, key))
+    return found
+
+
+def validate_slice(key: str, value: Any) -> list[str]:
+    """Schema errors for one top-level slice on its own; empty when valid or unknown."""
+    validators = compiled_validators()
+    if key not in validators:
+        return []
+    with metrics.cpu_section("validate"):
+        return _slice_errors(key, value, *validators[key])
+
+
+def validate_config(config: dict) -> dict[str, list[str]]:
+    """Validate an assembled config. Returns {top-level key: [error, ...]}; empty when valid."""
+    validators = compiled_validators()
+    if not validators:
+        return {}
+
+    errors: dict[str, list[str]] = {}
+    with metrics.cpu_section("validate"):
+        for key in load_schema().get("required", []):
+            if key not in config:
+                errors.setdefault(key, []).append(f"{key}: missing required key")
+        for key, (per_item, validator, branches) in validators.items():
+            if key not in config:
+                continue
+            found = _slice_errors(key, config[key], per_item, validator, branches)
+            if found:
+                errors[key] = found
+    if errors:
+        metrics.incr("validate.invalid_configs")
+        for key in errors:
+            metrics.incr(f"validate.invalid_slice.{key}")
+    return errors
+
+
+def errors_by_stage(errors: dict[str, list[str]]) -> dict[str, list[str]]:
+    """`validate_config` errors regrouped under the name of the stage that owns each key."""
+    grouped: dict[str, list[str]] = {}
+    for key, found in errors.items():
+        grouped.setdefault(SLICE_OWNERS.get(key, key), []).extend(found)
+    return grouped
+
+
+async def repair_slices(
+    stages: list[Stage],
+    scratch: Scratch,
+    errors: dict[str, list[str]],
+    *,
+    log_prefix: str = "stage",
+) -> None:
+    """Re-run `stages` concurrently with their validation errors (keyed by stage name) attached.
+
+    Each stage's previous artifact and errors go into `scratch.meta["repair"]`,
+    which `JsonStage.build_messages` turns into a correction turn. The new
+    artifacts overwrite the old ones; a stage that fails again keeps its old one.
+    """
+    repair = scratch.meta.setdefault("repair", {})
+    for stage in stages:
+        repair[stage.name] = {
+            "previous": json.dumps(scratch.artifacts.get(stage.name)),
+            "errors": errors[stage.name],
+        }
+        metrics.incr(f"stage.{stage.name}.repairs")
+
+    async def run_one(stage: Stage) -> None:
+        previous = scratch.artifacts.get(stage.name)
+        try:
+            await run_stage(stage, scratch, log_prefix=log_prefix)
+        except Exception:
+            logger.exception("validate: repair of %s failed; keeping previous output", stage.name)
+            scratch.artifacts[stage.name] = previous
+            return
+        owned = [key for key, owner in SLICE_OWNERS.items() if owner == stage.name]
+        repaired = scratch.artifacts.get(stage.name)
+        if owned and isinstance(previous, dict) and isinstance(repaired, dict):
+            scratch.artifacts[stage.name] = {**previous, **{k: repaired[k] for k in owned if k in repaired}}
+
+    tasks = [asyncio.create_task(run_one(s)) for s in stages]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await cancel_pending(tasks)
+        for stage in stages:
+            repair.pop(stage.name, None)
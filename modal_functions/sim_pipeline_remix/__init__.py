@@ -1,6 +1,6 @@
 """Selective-remix simulation pipeline.
 
-Two public entry points:
+Three public entry points:
 
 - `run_remix_pipeline(messages, parent_json, model, provider)` — non-streaming.
   Drains the SSE generator and returns the assembled SimulationConfig dict.
@@ -15,13 +15,32 @@ Two public entry points:
         └─ otherwise: emit `plan`, fan out chosen fills in parallel,
                       assemble, emit `content` + `done`
 
+- `run_template_pipeline_sse(messages, template_json, model, provider)` — the
+  /generate path for requests close to an existing simulation (see
+  `sim_pipeline.templates`): remixes the template toward the request and, if
+  the router asks for a skeleton-level change (a different environment is
+  one) or any part of the remix fails, runs the full generation pipeline
+  instead. The router also writes the title and description for the new
+  simulation; without them it falls back too. The remix's events are held
+  back until it has produced its config, so a fallback leaves no trace (such
+  as a `plan` resizing the progress bar). Emits the /generate wire format
+  (plus `plan`), never `fallback`; only the full pipeline's `run` id is passed on.
+
+`run_remix_pipeline*` take `resume_run_id` like the /generate pipeline: the
+router verdict and each fill are checkpointed, and a resumed run (with the
+same `parent_json`) re-executes only what is missing. A fill that fails after
+its retries gets a `stage_failed` event and keeps the parent's slice; the
+checkpoint is kept so resuming retries just that fill.
+
 Wire-format envelope (extends the /generate format with two new event types):
+    run      → {type: "run", run_id}
     progress → {type: "progress", stage, status, label?}
     plan     → {type: "plan", fills: [...], total_stages: N}     (NEW — remix only)
     fallback → {type: "fallback", reason: "..."}                  (NEW — remix only)
     content  → {type: "content", content: <stringified SimulationConfig JSON>}
     done     → {type: "done"}
     error    → {type: "error", error: <message>}
+    stage_failed → {type: "stage_failed", stage, error, run_id}
 """
 
 import asyncio
@@ -31,15 +50,26 @@ import time
 from typing import AsyncIterator
 
 from pipeline import (
+    Checkpointer,
+    PipelineRunError,
     Scratch,
     Stage,
-    call_llm,
+    cancel_pending,
     content_event,
     done_event,
     error_event,
+    metrics,
     progress_event,
+    run_event,
+    stage_failed_event,
 )
 
+from sim_pipeline import run_sim_pipeline_sse
+from sim_pipeline._runner import run_stage_with_retries
+from sim_pipeline.manifest_index import correct_objects
+from sim_pipeline.overlap import separate_objects
+from sim_pipeline.validate import errors_by_stage, repair_rounds, repair_slices, validate_config
+
 from .assemble import assemble_remix_config
 from .controls_remix import ControlsRemixStage
 from .graphs_remix import GraphsRemixStage
@@ -89,49 +119,43 @@ def fallback_event(reason: str) -> str:
     return f"data: {json.dumps({'type': 'fallback', 'reason': reason})}\n\n"
 
 
-# ---------------------------------------------------------------------------
-# Stage runner — small variant of sim_pipeline._run_stage that also passes
-# stage.reasoning_effort. The main difference is logging context.
-# ---------------------------------------------------------------------------
+# How a new request is put to the router when remixing a template. The
+# template's title, description and environment are otherwise kept as-is.
+TEMPLATE_REQUEST = (
+    "Adapt this simulation to the request below. Keep whatever already fits "
+    "and change only what the request needs; if it asks for different objects "
+    "or a different setup, that is a skeleton-level change. So is any "
+    "environment other than this simulation's: different gravity (another "
+    "planet), units, scale or walls. Unless you set needs_skeleton, also "
+    'return "title" and "description" keys: a short title and a one-sentence '
+    "description of the adapted simulation, written for the request, not the "
+    "original.\n\nRequest: {request}"
+)
 
 
-async def _run_stage(stage: Stage, scratch: Scratch) -> None:
-    started = time.monotonic()
-    logger.info(
-        "remix.stage[%s]: building messages (provider=%s model=%s output_budget=%d effort=%s)",
-        stage.name,
-        stage.provider,
-        stage.model,
-        stage.output_budget,
-        stage.reasoning_effort,
-    )
-    messages = stage.build_messages(scratch)
-    logger.info(
-        "remix.stage[%s]: dispatching to LLM (n_messages=%d, system_chars=%d)",
-        stage.name,
-        len(messages),
-        len(messages[0]["content"]) if messages else 0,
-    )
-    llm_kwargs: dict = {
-        "max_tokens": stage.output_budget,
-        "model": stage.model,
-        "provider": stage.provider,
-    }
-    if stage.reasoning_effort is not None:
-        llm_kwargs["reasoning_effort"] = stage.reasoning_effort
-    response = await call_llm(messages, **llm_kwargs)
-    logger.info(
-        "remix.stage[%s]: LLM returned %d chars in %.2fs",
-        stage.name,
-        len(response),
-        time.monotonic() - started,
-    )
-    scratch.artifacts[stage.name] = stage.parse(response)
-    logger.info(
-        "remix.stage[%s]: complete in %.2fs total",
-        stage.name,
-        time.monotonic() - started,
-    )
+def _event_type(event: str) -> str | None:
+    if not event.startswith("data: "):
+        return None
+    try:
+        return json.loads(event[len("data: ") :]).get("type")
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+
+def _assemble(parent_json: dict, artifacts: dict, chosen: list[str]) -> dict:
+    with metrics.cpu_section("assemble"):
+        config = assemble_remix_config(parent_json, artifacts, chosen)
+    if "objects" in chosen:
+        correct_objects(config.get("objects"), config.get("environment") or {})
+    if "objects" in chosen or "controls" in chosen:
+        # Position slider defaults decide where objects spawn, so controls count too.
+        separate_objects(config)
+    return config
+
+
+def _retitle(config: dict, verdict: dict) -> dict:
+    """`config` with the router's title and description for a template remix."""
+    return {**config, "title": verdict["title"], "description": verdict["description"]}
 
 
 def _build_router(model: str | None, provider: str | None) -> RouterStage:
@@ -176,16 +200,19 @@ async def run_remix_pipeline(
     *,
     model: str | None = None,
     provider: str | None = None,
+    resume_run_id: str | None = None,
 ) -> dict:
     """Non-streaming convenience wrapper. Drains the SSE generator and returns
     the assembled config dict. Raises RemixFallback on a needs-skeleton verdict
-    and RuntimeError on any other failure.
+    and PipelineRunError (a RuntimeError carrying the `run_id` to resume) on
+    any other failure.
     """
     config: dict | None = None
     error: str | None = None
     fallback_reason: str | None = None
+    run_id: str | None = None
     async for event in run_remix_pipeline_sse(
-        messages, parent_json, model=model, provider=provider
+        messages, parent_json, model=model, provider=provider, resume_run_id=resume_run_id
     ):
         if not event.startswith("data: "):
             continue
@@ -202,15 +229,17 @@ async def run_remix_pipeline(
                 config = None
         elif kind == "fallback":
             fallback_reason = obj.get("reason") or "skeleton-level edit"
+        elif kind == "run":
+            run_id = obj.get("run_id")
         elif kind == "error":
             error = obj.get("error", "unknown error")
     if fallback_reason is not None:
         raise RemixFallback(fallback_reason)
     if error:
-        raise RuntimeError(error)
+        raise PipelineRunError(error, run_id)
     if config is None:
-        raise RuntimeError(
-            "sim_pipeline_remix: pipeline finished without emitting a config"
+        raise PipelineRunError(
+            "sim_pipeline_remix: pipeline finished without emitting a config", run_id
         )
     return config
 
@@ -221,10 +250,20 @@ async def run_remix_pipeline_sse(
     *,
     model: str | None = None,
     provider: str | None = None,
+    resume_run_id: str | None = None,
+    template: bool = False,
 ) -> AsyncIterator[str]:
-    """Yield SSE events while the remix pipeline runs."""
-    scratch = Scratch()
-    scratch.history = list(messages)
+    """Yield SSE events while the remix pipeline runs.
+
+    `template` marks a remix of a template toward a new request: the router's
+    title and description replace the template's, and a verdict without them
+    falls back.
+    """
+    checkpoints = Checkpointer("remix")
+    scratch = await checkpoints.restore(resume_run_id)
+    if scratch is None:
+        scratch = Scratch()
+        scratch.history = list(messages)
     scratch.meta["parent_json"] = parent_json
 
     pipeline_started = time.monotonic()
@@ -237,17 +276,24 @@ async def run_remix_pipeline_sse(
     )
 
     try:
+        yield run_event(checkpoints.run_id)
+
         # ---- Sequential router stage ----
         router = _build_router(model, provider)
         label = REMIX_STAGE_LABELS["router"]
-        yield progress_event(router.name, status="started", label=label)
-        await _run_stage(router, scratch)
+        if router.name not in scratch.artifacts:
+            yield progress_event(router.name, status="started", label=label)
+            await run_stage_with_retries(router, scratch, log_prefix="remix.stage")
+            await checkpoints.save(scratch)
         yield progress_event(router.name, status="done", label=label)
 
         verdict = scratch.artifacts.get("router") or {}
         needs_skeleton = bool(verdict.get("needs_skeleton"))
         chosen: list[str] = list(verdict.get("fills") or [])
         reason: str = verdict.get("reason") or ""
+        if template and not needs_skeleton and not (verdict.get("title") and verdict.get("description")):
+            needs_skeleton = True
+            reason = "Router gave no title/description for the adapted template."
         logger.info(
             "remix_pipeline: router verdict needs_skeleton=%s fills=%s reason=%r",
             needs_skeleton,
@@ -260,6 +306,7 @@ async def run_remix_pipeline_sse(
                 reason or "Router determined skeleton must change; falling back to full generation."
             )
             yield done_event()
+            await checkpoints.discard()
             return
 
         # ---- Plan event (drives the frontend progress denominator) ----
@@ -271,38 +318,79 @@ async def run_remix_pipeline_sse(
             # soft no-op (toast "no changes needed"), but emit a content event
             # anyway so any non-frontend caller sees a complete result.
             logger.info("remix_pipeline: no fills chosen — emitting parent unchanged")
-            yield content_event(json.dumps(parent_json))
+            yield content_event(json.dumps(_retitle(parent_json, verdict) if template else parent_json))
             yield done_event()
+            await checkpoints.discard()
             return
 
         # ---- Parallel fill stages ----
         fill_stages = _build_fills(chosen, model, provider)
+        to_run = [s for s in fill_stages if s.name not in scratch.artifacts]
         for stage in fill_stages:
             stage_label = REMIX_STAGE_LABELS.get(stage.name, stage.name)
-            yield progress_event(stage.name, status="started", label=stage_label)
-
-        async def run_named(stage: Stage) -> str:
-            await _run_stage(stage, scratch)
-            return stage.name
+            if stage in to_run:
+                yield progress_event(stage.name, status="started", label=stage_label)
+            else:
+                yield progress_event(stage.name, status="done", label=stage_label)
 
-        pending = {asyncio.create_task(run_named(s)): s for s in fill_stages}
+        async def run_named(stage: Stage) -> tuple[str, Exception | None]:
+            try:
+                await run_stage_with_retries(stage, scratch, log_prefix="remix.stage")
+            except Exception as e:
+                return stage.name, e
+            await checkpoints.save(scratch)
+            return stage.name, None
+
+        failed: set[str] = set()
+        pending = {asyncio.create_task(run_named(s)): s for s in to_run}
         try:
             for fut in asyncio.as_completed(list(pending.keys())):
-                name = await fut
+                name, exc = await fut
+                if exc is not None:
+                    logger.error(
+                        "remix_pipeline: fill %s failed, keeping the parent's slice: %s", name, exc
+                    )
+                    failed.add(name)
+                    yield stage_failed_event(name, str(exc), checkpoints.run_id)
+                    continue
                 logger.info("remix_pipeline: parallel fill %s finished", name)
                 yield progress_event(
                     name,
                     status="done",
                     label=REMIX_STAGE_LABELS.get(name, name),
                 )
-        except Exception:
-            for t in pending:
-                if not t.done():
-                    t.cancel()
-            raise
+        finally:
+            # Not just on Exception: a client disconnect arrives here as
+            # GeneratorExit/CancelledError and must stop the siblings too.
+            await cancel_pending(pending)
 
         # ---- Assemble & emit final config ----
-        config = assemble_remix_config(parent_json, scratch.artifacts, chosen)
+        config = _assemble(parent_json, scratch.artifacts, chosen)
+        if template:
+            config = _retitle(config, verdict)
+
+        # ---- Validate; re-run only chosen fills whose slices fail the schema ----
+        # Errors in slices the router didn't choose came from the parent as-is.
+        by_name = {s.name: s for s in fill_stages if s.name not in failed}
+        errors = validate_config(config)
+        for _ in range(repair_rounds()):
+            owned = errors_by_stage(errors)
+            to_repair = [by_name[name] for name in owned if name in by_name]
+            if not to_repair:
+                break
+            logger.warning("remix_pipeline: schema errors, repairing %s: %s", list(errors), errors)
+            for stage in to_repair:
+                yield progress_event(stage.name, status="started", label=f"Fixing {stage.name}")
+            await repair_slices(to_repair, scratch, owned, log_prefix="remix.stage")
+            await checkpoints.save(scratch)
+            for stage in to_repair:
+                yield progress_event(stage.name, status="done", label=f"Fixing {stage.name}")
+            config = _assemble(parent_json, scratch.artifacts, chosen)
+        if template:
+            config = _retitle(config, verdict)
+            errors = validate_config(config)
+        if errors:
+            logger.warning("remix_pipeline: shipping config with schema errors: %s", errors)
         logger.info(
             "remix_pipeline: assembled in %.2fs total — fills=%s objects=%d controls=%d graphs=%d outputs=%d",
             time.monotonic() - pipeline_started,
@@ -312,18 +400,92 @@ async def run_remix_pipeline_sse(
             len(config.get("graphs") or []),
             len(config.get("outputs") or []),
         )
-        yield content_event(json.dumps(config))
+        with metrics.cpu_section("json_dumps"):
+            config_json = json.dumps(config)
+        yield content_event(config_json)
         yield done_event()
+        if failed:
+            metrics.incr("pipeline.remix.partial")
+            logger.warning(
+                "remix_pipeline: shipped without %s; resume run_id=%s to fill them in",
+                sorted(failed),
+                checkpoints.run_id,
+            )
+        else:
+            await checkpoints.discard()
+        metrics.observe("pipeline.remix.wall_s", time.monotonic() - pipeline_started)
+    except (GeneratorExit, asyncio.CancelledError):
+        metrics.incr("pipeline.remix.cancelled")
+        logger.info(
+            "remix_pipeline: client went away after %.2fs, cancelled in-flight stages",
+            time.monotonic() - pipeline_started,
+        )
+        raise
     except Exception as e:
         logger.exception(
-            "remix_pipeline: failed after %.2fs", time.monotonic() - pipeline_started
+            "remix_pipeline: failed after %.2fs (resume with run_id=%s)",
+            time.monotonic() - pipeline_started,
+            checkpoints.run_id,
         )
         yield error_event(str(e))
 
 
+async def run_template_pipeline_sse(
+    messages: list[dict],
+    template_json: dict,
+    *,
+    model: str | None = None,
+    provider: str | None = None,
+) -> AsyncIterator[str]:
+    """Yield /generate SSE events for a new request, starting from `template_json`.
+
+    Falls back to `run_sim_pipeline_sse` on a `fallback` verdict, an error or
+    a failed fill. The remix's events are held until its `content` arrives:
+    after a fallback the client sees only the full pipeline's events.
+    """
+    request = str((messages[-1] or {}).get("content", ""))
+    adapted = list(messages[:-1]) + [
+        {"role": "user", "content": TEMPLATE_REQUEST.format(request=request)}
+    ]
+    fall_back = False
+    held: list[str] | None = []
+    remix = run_remix_pipeline_sse(
+        adapted, template_json, model=model, provider=provider, template=True
+    )
+    try:
+        async for event in remix:
+            kind = _event_type(event)
+            if kind in ("fallback", "error", "stage_failed"):
+                logger.info("template_pipeline: remix gave %s, running the full pipeline", kind)
+                fall_back = True
+                break
+            if kind == "run":
+                # /generate resumes the full pipeline, never the template remix.
+                continue
+            if held is None:
+                yield event
+                continue
+            held.append(event)
+            if kind == "content":
+                # Committed: release the remix's progress along with its result.
+                for pending_event in held:
+                    yield pending_event
+                held = None
+    finally:
+        await remix.aclose()
+    if not fall_back:
+        metrics.incr("templates.remixed")
+        return
+    metrics.incr("templates.fallback")
+    async for event in run_sim_pipeline_sse(messages, model=model, provider=provider):
+        yield event
+
+
 __all__ = [
     "run_remix_pipeline",
     "run_remix_pipeline_sse",
+    "run_template_pipeline_sse",
+    "TEMPLATE_REQUEST",
     "assemble_remix_config",
     "RemixFallback",
     "REMIX_STAGE_LABELS",
@@ -39,6 +39,10 @@ class RemixFillStage(JsonStage):
     # being edited IS the objects) and outputs (rarely needs full object detail).
     include_objects_context: bool = False
 
+    @property
+    def schema_slice_key(self) -> str:  # type: ignore[override]
+        return self.parent_slice_key
+
     @property
     def stage_fragment(self) -> str:  # type: ignore[override]
         return f"{self.fill_fragment.strip()}\n\n{self.remix_fragment.strip()}"
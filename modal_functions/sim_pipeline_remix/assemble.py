@@ -3,7 +3,8 @@
 Starts from a deep copy of the parent simulation and overwrites ONLY the
 slices the router chose to re-run. Title/description/environment are never
 touched in remix mode — those would be a skeleton-level change, which the
-router routes to the /generate fallback path instead.
+router routes to the /generate fallback path instead. (A template remix's new
+title and description come from the router and are set by the orchestrator.)
 
 A final sanity pass drops any control/graph/output entries whose `targetObj`
 no longer exists in the (possibly remixed) `objects` array. This is graceful
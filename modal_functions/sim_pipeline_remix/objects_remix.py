@@ -6,7 +6,7 @@ from gist_instructions import (  # type: ignore[import-not-found]
     objects_fill_fragment,
     objects_remix_fragment,
 )
-from sim_pipeline._context import manifest_names_block
+from sim_pipeline.svg_retrieval import request_text, svg_candidates_block
 
 from ._base import RemixFillStage
 
@@ -20,4 +20,6 @@ class ObjectsRemixStage(RemixFillStage):
     include_objects_context = False  # the slice IS the objects array
 
     def extra_blocks(self, scratch: Scratch) -> str:
-        return manifest_names_block()
+        parent = scratch.meta.get("parent_json", {}) or {}
+        current = [o.get("svg") for o in parent.get("objects") or [] if isinstance(o, dict)]
+        return svg_candidates_block(request_text(scratch), include=current)
@@ -5,6 +5,9 @@ from `scratch.history`, returns:
 
     {"needs_skeleton": bool, "fills": ["objects", "controls", ...], "reason": "..."}
 
+plus `title` and `description` when remixing a template toward a new request
+(see `TEMPLATE_REQUEST`).
+
 The orchestrator (`sim_pipeline_remix/__init__.py`) interprets the result:
 - needs_skeleton=True → emit a `fallback` SSE event so the frontend re-calls /generate
 - otherwise → run only the named fills, in parallel, then assemble.
@@ -37,7 +40,7 @@ class RouterStage(JsonStage):
     # Force minimal reasoning — the router is a classifier, not a writer.
     reasoning_effort = "minimal"
 
-    def system_prompt(self, scratch: Scratch) -> str:
+    def static_system_prompt(self) -> str:
         # Override the JsonStage default: router doesn't need the schema_block
         # (it's not emitting SimulationConfig fragments) and shouldn't get
         # `shared_preamble` either (different framing — it's not a writer).
@@ -66,8 +69,10 @@ class RouterStage(JsonStage):
 def _normalize_router_result(value: Any) -> dict:
     """Coerce the router's output into a strict {needs_skeleton, fills, reason} shape.
 
-    Tolerates extra keys, missing keys, and casing variants. Filters fills down
-    to the four valid slice names. If needs_skeleton is true, force fills=[].
+    Non-empty string `title`/`description` are kept (template remixes ask for
+    them); other extra keys are dropped. Tolerates missing keys and casing
+    variants. Filters fills down to the four valid slice names. If
+    needs_skeleton is true, force fills=[].
     """
     if not isinstance(value, dict):
         logger.warning("router.parse: non-dict response %r — defaulting to all fills", value)
@@ -98,4 +103,9 @@ def _normalize_router_result(value: Any) -> dict:
     if not isinstance(reason, str):
         reason = ""
 
-    return {"needs_skeleton": needs_skeleton, "fills": fills, "reason": reason}
+    result = {"needs_skeleton": needs_skeleton, "fills": fills, "reason": reason}
+    for key in ("title", "description"):
+        text = value.get(key)
+        if isinstance(text, str) and text.strip():
+            result[key] = text.strip()
+    return result